@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+"""
+Compares the serial loop of reads/writes against the batched get_many/set_many of PyFolder.
+
+Usage: python3 benchmarks/bench_batch.py [number_of_files] [max_workers] [folder]
+
+The gain depends on the latency of the filesystem: point [folder] to an NFS or overlayfs mount to measure it there.
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+
+from pyfolder import PyFolder
+
+__author__ = "Iván de Paz Centeno"
+
+
+def measure(name, func, operations):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+
+    print("{:<28} {:>9.1f} ms  {:>10.0f} ops/s".format(name, elapsed * 1000, operations / elapsed))
+
+
+def main():
+    number_of_files = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    folder_root = tempfile.mkdtemp(prefix="pyfolder_bench_", dir=sys.argv[3] if len(sys.argv) > 3 else None)
+
+    try:
+        pyfolder = PyFolder(folder_root, allow_override=True)
+        items = {"file{}.json".format(i): {"id": i, "payload": "x" * 256} for i in range(number_of_files)}
+        keys = list(items)
+
+        def serial_set():
+            for key, value in items.items():
+                pyfolder[key] = value
+
+        def serial_get():
+            for key in keys:
+                pyfolder[key]
+
+        measure("serial __setitem__", serial_set, number_of_files)
+        measure("set_many ({} workers)".format(max_workers),
+                lambda: pyfolder.set_many(items, max_workers=max_workers), number_of_files)
+        measure("serial __getitem__", serial_get, number_of_files)
+        measure("get_many ({} workers)".format(max_workers),
+                lambda: pyfolder.get_many(keys, max_workers=max_workers), number_of_files)
+    finally:
+        shutil.rmtree(folder_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
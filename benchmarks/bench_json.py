@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+"""
+Measures the encode/decode throughput and the size on disk of every JSON backend available to JSONInterpreter.
+
+Usage: python3 benchmarks/bench_json.py [number_of_documents]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pyfolder.interpreters import JSONInterpreter, orjson, ujson
+
+__author__ = "Iván de Paz Centeno"
+
+
+def main():
+    number_of_documents = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    folder_root = tempfile.mkdtemp(prefix="pyfolder_bench_")
+    document = {"values": [{"id": i, "name": "item{}".format(i), "tags": ["a", "b"], "score": i / 3}
+                           for i in range(200)]}
+
+    backends = ["json"] + [name for name, module in [("orjson", orjson), ("ujson", ujson)] if module is not None]
+
+    print("{:<8} {:<7} {:>12} {:>12} {:>12}".format("backend", "indent", "encode/s", "decode/s", "bytes"))
+
+    try:
+        for backend in backends:
+            for indent in [4, 2, None]:
+                interpreter = JSONInterpreter(indent=indent, backend=backend)
+                uris = [os.path.join(folder_root, "doc{}.json".format(i)) for i in range(number_of_documents)]
+
+                start = time.perf_counter()
+                for uri in uris:
+                    interpreter.save(uri, document)
+                encode_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for uri in uris:
+                    interpreter.load(uri)
+                decode_time = time.perf_counter() - start
+
+                print("{:<8} {:<7} {:>12.0f} {:>12.0f} {:>12}".format(
+                    backend, str(indent), number_of_documents / encode_time, number_of_documents / decode_time,
+                    os.path.getsize(uris[0])))
+    finally:
+        shutil.rmtree(folder_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+"""
+Compares the old listdir + isfile listing against the scandir-based listing of PyFolder.
+
+Usage: python3 benchmarks/bench_listing.py [number_of_files]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pyfolder import PyFolder
+
+__author__ = "Iván de Paz Centeno"
+
+
+class StatCounter(object):
+    """
+    Counts the calls to os.stat() made while it is active.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self._stat = os.stat
+
+    def __enter__(self):
+        def counted_stat(*args, **kwargs):
+            self.calls += 1
+            return self._stat(*args, **kwargs)
+
+        os.stat = counted_stat
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        os.stat = self._stat
+
+
+def listdir_files(folder_root):
+    return [name for name in os.listdir(folder_root) if os.path.isfile(os.path.join(folder_root, name))]
+
+
+def measure(name, func, entries):
+    with StatCounter() as counter:
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+
+    print("{:<22} {:>9.1f} ms  {:>6.2f} stat calls/entry  ({} files)".format(
+        name, elapsed * 1000, counter.calls / entries, len(result)))
+
+
+def main():
+    number_of_files = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    folder_root = tempfile.mkdtemp(prefix="pyfolder_bench_")
+
+    try:
+        pyfolder = PyFolder(folder_root)
+
+        for i in range(number_of_files):
+            with open(os.path.join(folder_root, "file{}".format(i)), "wb") as f:
+                f.write(b"x")
+
+        for i in range(number_of_files // 100):
+            os.mkdir(os.path.join(folder_root, "folder{}".format(i)))
+
+        entries = len(pyfolder)
+
+        measure("listdir + isfile", lambda: listdir_files(folder_root), entries)
+        measure("PyFolder.files()", lambda: list(pyfolder.files()), entries)
+    finally:
+        shutil.rmtree(folder_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+"""
+Compares the decoding throughput of files_items() against parallel_files_items() with threads and processes.
+
+Usage: python3 benchmarks/bench_parallel_items.py [number_of_files] [max_workers]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pyfolder import PyFolder
+
+__author__ = "Iván de Paz Centeno"
+
+
+def measure(name, iterator, number_of_files):
+    start = time.perf_counter()
+    count = sum(1 for _ in iterator)
+    elapsed = time.perf_counter() - start
+
+    assert count == number_of_files
+    print("{:<32} {:>9.1f} ms  {:>10.0f} files/s".format(name, elapsed * 1000, number_of_files / elapsed))
+
+
+def main():
+    number_of_files = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    folder_root = tempfile.mkdtemp(prefix="pyfolder_bench_")
+
+    try:
+        pyfolder = PyFolder(folder_root)
+        document = {"values": [{"id": i, "name": "item{}".format(i), "score": i / 3} for i in range(500)]}
+
+        for i in range(number_of_files):
+            pyfolder.interpreters.save(os.path.join(folder_root, "doc{}.json".format(i)), document)
+
+        measure("files_items()", pyfolder.files_items(), number_of_files)
+
+        for executor in ["thread", "process"]:
+            measure("parallel_files_items({}, {})".format(executor, max_workers),
+                    pyfolder.parallel_files_items(max_workers=max_workers, executor=executor, chunk_size=32),
+                    number_of_files)
+    finally:
+        shutil.rmtree(folder_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+"""
+Benchmark suite covering the hot paths of PyFolder: reads, writes, membership, listings, searches and the encoding
+and decoding of the interpreters.
+
+A synthetic tree is generated (see tree_generator.py), and every benchmark runs in a fresh process, so that its peak
+RSS is its own. For each one, the throughput (operations per second) and the latency percentiles are reported.
+Results can be saved and compared against a previous run:
+
+    python3 benchmarks/suite.py --files 100000 --output baseline.json
+    python3 benchmarks/suite.py --files 100000 --baseline baseline.json
+
+The comparison exits with status 1 if any benchmark is slower than the baseline beyond the tolerance.
+
+Usage: python3 benchmarks/suite.py [--files N] [--fan-out N] [--depth N] [--size SPEC] [--ops N] [--only NAMES]
+                                   [--tree PATH] [--output FILE] [--baseline FILE] [--tolerance RATIO]
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from pyfolder import PyFolder
+from pyfolder.interpreters import Interpreters, JSONInterpreter, TextInterpreter, BinaryInterpreter
+
+from tree_generator import SyntheticTree, add_arguments, tree_from_arguments, content, size_distribution
+
+__author__ = "Iván de Paz Centeno"
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    """
+    Registers a benchmark. It receives the tree, the amount of operations and a random.Random, and returns the list
+    of latencies (in seconds) of the operations it timed.
+    """
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+
+    return register
+
+
+def timed(operation, arguments):
+    latencies = []
+    clock = time.perf_counter
+
+    for argument in arguments:
+        start = clock()
+        operation(argument)
+        latencies.append(clock() - start)
+
+    return latencies
+
+
+def sample_keys(tree, operations, rng):
+    return [tree.key(rng.randrange(tree.files)) for _ in range(operations)]
+
+
+@benchmark("getitem")
+def bench_getitem(tree, operations, rng):
+    pyfolder = PyFolder(tree.root)
+    return timed(pyfolder.__getitem__, sample_keys(tree, operations, rng))
+
+
+@benchmark("getitem_cached")
+def bench_getitem_cached(tree, operations, rng):
+    pyfolder = PyFolder(tree.root, cache_size=256 * 1024 * 1024)
+    keys = sample_keys(tree, min(operations, 1000), rng)
+
+    for key in keys:
+        pyfolder[key]
+
+    return timed(pyfolder.__getitem__, [rng.choice(keys) for _ in range(operations)])
+
+
+@benchmark("setitem")
+def bench_setitem(tree, operations, rng):
+    folder_root = os.path.join(tree.root, "bench_writes")
+    pyfolder = PyFolder(folder_root, allow_override=True)
+    sizes = size_distribution(tree.size)
+    values = [content("bin", sizes(rng), rng) for _ in range(min(operations, 1000))]
+
+    try:
+        return timed(lambda i: pyfolder.__setitem__("d{}/file{}".format(i % 100, i), values[i % len(values)]),
+                     range(operations))
+    finally:
+        shutil.rmtree(folder_root, ignore_errors=True)
+
+
+@benchmark("contains")
+def bench_contains(tree, operations, rng):
+    pyfolder = PyFolder(tree.root)
+    keys = sample_keys(tree, operations // 2, rng) + ["missing{}".format(i) for i in range(operations // 2)]
+    rng.shuffle(keys)
+    return timed(pyfolder.__contains__, keys)
+
+
+@benchmark("listing")
+def bench_listing(tree, operations, rng):
+    # One operation is the listing of a whole folder
+    folders = [rng.choice(tree.folders) for _ in range(max(1, operations // 100))]
+    return timed(lambda folder: list(PyFolder(os.path.join(tree.root, folder)).files()), folders)
+
+
+@benchmark("items")
+def bench_items(tree, operations, rng):
+    # One operation is the listing and loading of a whole folder
+    folders = [rng.choice(tree.folders) for _ in range(max(1, operations // 1000))]
+    return timed(lambda folder: list(PyFolder(os.path.join(tree.root, folder)).files_items()), folders)
+
+
+@benchmark("index")
+def bench_index(tree, operations, rng):
+    # One operation is a search through the whole tree
+    pyfolder = PyFolder(tree.root)
+    names = [key.rpartition("/")[2] for key in sample_keys(tree, max(1, operations // 10000), rng)]
+    return timed(pyfolder.index, names)
+
+
+@benchmark("index_persistent")
+def bench_index_persistent(tree, operations, rng):
+    index_folder = tempfile.mkdtemp(prefix="pyfolder_bench_index_")
+    pyfolder = PyFolder(tree.root, index_file=os.path.join(index_folder, "index.db"))
+
+    try:
+        pyfolder.build_index()
+        names = [key.rpartition("/")[2] for key in sample_keys(tree, max(1, operations // 100), rng)]
+        return timed(lambda name: pyfolder.index(name, refresh=False), names)
+    finally:
+        shutil.rmtree(index_folder, ignore_errors=True)
+
+
+@benchmark("walk")
+def bench_walk(tree, operations, rng):
+    # One operation is a walk of the whole tree
+    pyfolder = PyFolder(tree.root)
+    return timed(lambda _: sum(1 for _ in pyfolder.walk(max_depth=tree.depth + 1)), range(3))
+
+
+def interpreters():
+    result = Interpreters()
+    result.register(JSONInterpreter())
+    result.register(TextInterpreter())
+    result.register(BinaryInterpreter())
+    return result
+
+
+def sample_values(tree, operations, rng):
+    sizes = size_distribution(tree.size)
+    values = []
+
+    for i in range(min(operations, 1000)):
+        key = tree.key(i)
+        raw = content(key.rpartition(".")[2], sizes(rng), rng)
+        values.append((key, raw, interpreters().read(io.BytesIO(raw), key)))
+
+    return values
+
+
+@benchmark("encode")
+def bench_encode(tree, operations, rng):
+    encoder = interpreters()
+    values = sample_values(tree, operations, rng)
+    return timed(lambda i: encoder.write(io.BytesIO(), values[i % len(values)][0], values[i % len(values)][2]),
+                 range(operations))
+
+
+@benchmark("decode")
+def bench_decode(tree, operations, rng):
+    decoder = interpreters()
+    values = sample_values(tree, operations, rng)
+    return timed(lambda i: decoder.read(io.BytesIO(values[i % len(values)][1]), values[i % len(values)][0]),
+                 range(operations))
+
+
+def percentile(sorted_values, ratio):
+    return sorted_values[min(len(sorted_values) - 1, int(ratio * len(sorted_values)))]
+
+
+def run_benchmark(name, tree_config, root, operations):
+    """
+    Runs a benchmark in the current process.
+    :return: dict with its measures.
+    """
+    tree = SyntheticTree(root, **tree_config)
+    latencies = BENCHMARKS[name](tree, operations, random.Random(tree.seed))
+    latencies.sort()
+    total = sum(latencies)
+
+    # Kilobytes on Linux, bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+
+    return {
+        "ops": len(latencies),
+        "ops_per_second": len(latencies) / total if total else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p90_ms": percentile(latencies, 0.90) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "peak_rss_mb": peak_rss_mb,
+    }
+
+
+def run_isolated(name, tree, operations):
+    # A fresh process per benchmark: the peak RSS (and the caches of the process) are not shared between them
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(run_benchmark, name, tree.config(), tree.root, operations).result()
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares the throughput of the results against the baseline.
+    :return: dict of name -> relative change, and list of names of the regressions.
+    """
+    changes = {}
+    regressions = []
+
+    for name, result in results.items():
+        reference = baseline.get(name)
+
+        if not reference or not reference["ops_per_second"]:
+            continue
+
+        changes[name] = result["ops_per_second"] / reference["ops_per_second"] - 1
+
+        if changes[name] < -tolerance:
+            regressions.append(name)
+
+    return changes, regressions
+
+
+def report(results, changes, regressions):
+    header = "{:<18} {:>8} {:>12} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+        "benchmark", "ops", "ops/s", "p50 ms", "p90 ms", "p99 ms", "max ms", "RSS MB")
+
+    if changes:
+        header += " {:>12}".format("vs baseline")
+
+    print(header)
+
+    for name, result in results.items():
+        line = "{:<18} {:>8} {:>12.1f} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.1f}".format(
+            name, result["ops"], result["ops_per_second"], result["p50_ms"], result["p90_ms"], result["p99_ms"],
+            result["max_ms"], result["peak_rss_mb"])
+
+        if name in changes:
+            line += " {:>+11.1f}%".format(changes[name] * 100)
+
+            if name in regressions:
+                line += "  REGRESSION"
+
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the hot paths of PyFolder.")
+    add_arguments(parser)
+    parser.add_argument("--ops", type=int, default=10000, help="operations per benchmark (default: %(default)s)")
+    parser.add_argument("--only", default=",".join(BENCHMARKS),
+                        help="comma-separated benchmarks to run (default: all)")
+    parser.add_argument("--tree", help="root of the synthetic tree, kept between runs. A temporary one by default")
+    parser.add_argument("--output", help="file where the results are saved, as JSON")
+    parser.add_argument("--baseline", help="results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="slowdown ratio allowed before reporting a regression (default: %(default)s)")
+    arguments = parser.parse_args()
+
+    names = arguments.only.split(",")
+    unknown = [name for name in names if name not in BENCHMARKS]
+
+    if unknown:
+        parser.error("unknown benchmarks: {}".format(", ".join(unknown)))
+
+    temporary_root = None if arguments.tree else tempfile.mkdtemp(prefix="pyfolder_bench_")
+    tree = tree_from_arguments(arguments.tree or os.path.join(temporary_root, "tree"), arguments)
+
+    try:
+        if not tree.exists():
+            print("Generating {} files in {} folders...".format(tree.files, len(tree.folders)))
+            tree.generate(progress=True)
+
+        results = OrderedDict()
+
+        for name in names:
+            results[name] = run_isolated(name, tree, arguments.ops)
+    finally:
+        if temporary_root is not None:
+            shutil.rmtree(temporary_root, ignore_errors=True)
+
+    changes, regressions = {}, []
+
+    if arguments.baseline:
+        with open(arguments.baseline) as f:
+            baseline = json.load(f)
+
+        if baseline["tree"] != tree.config() or baseline["ops"] != arguments.ops:
+            print("Warning: the baseline was run with a different configuration")
+
+        changes, regressions = compare(results, baseline["results"], arguments.tolerance)
+
+    report(results, changes, regressions)
+
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            json.dump({"tree": tree.config(), "ops": arguments.ops, "python": platform.python_version(),
+                       "platform": platform.platform(), "results": results}, f, indent=4)
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
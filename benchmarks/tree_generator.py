@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+"""
+Generates synthetic folder trees for the benchmarks.
+
+Files are spread evenly over the folders of the last level of a tree with the given fan-out and depth, cycling
+through the formats. The content is pseudo-random but reproducible for a given seed.
+
+Usage: python3 benchmarks/tree_generator.py destination [--files N] [--fan-out N] [--depth N] [--size SPEC]
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import time
+
+__author__ = "Iván de Paz Centeno"
+
+FORMATS = ("bin", "json", "txt")
+
+
+def size_distribution(spec):
+    """
+    Parses the specification of a distribution of file sizes:
+        "fixed:N"               all the files have N bytes.
+        "uniform:MIN:MAX"       sizes uniformly distributed between MIN and MAX bytes.
+        "lognormal:MEDIAN:SIGMA" sizes following a log-normal distribution (many small files, a few big ones).
+    :return: function that receives a random.Random and returns a size.
+    """
+    kind, _, parameters = spec.partition(":")
+    parameters = [float(value) for value in parameters.split(":")] if parameters else []
+
+    if kind == "fixed" and len(parameters) == 1:
+        return lambda rng: int(parameters[0])
+
+    if kind == "uniform" and len(parameters) == 2:
+        return lambda rng: rng.randint(int(parameters[0]), int(parameters[1]))
+
+    if kind == "lognormal" and len(parameters) == 2:
+        return lambda rng: max(1, int(rng.lognormvariate(math.log(parameters[0]), parameters[1])))
+
+    raise ValueError("Invalid size distribution \"{}\"".format(spec))
+
+
+def content(file_format, size, rng):
+    """
+    Builds the raw content of a file of approximately the given size.
+    """
+    if file_format == "bin":
+        return rng.getrandbits(8 * size).to_bytes(size, "little") if size else b""
+
+    if file_format == "json":
+        filler = max(0, size - 32)
+        return json.dumps({"id": rng.randint(0, 1 << 30), "data": "x" * filler}).encode("utf-8")
+
+    return ("lorem ipsum " * (size // 12 + 1))[:size].encode("utf-8")
+
+
+class SyntheticTree(object):
+    """
+    Description of a generated tree. The key of every file can be computed from its number, so no list of keys is
+    kept in memory, whatever the amount of files.
+    """
+
+    def __init__(self, root, files=10000, fan_out=10, depth=2, size="fixed:1024", formats=FORMATS, seed=0):
+        self.root = root
+        self.files = files
+        self.fan_out = fan_out
+        self.depth = depth
+        self.size = size
+        self.formats = tuple(formats)
+        self.seed = seed
+
+        self.folders = ["/".join(path) for path in itertools.product(
+            *[["d{}".format(i) for i in range(fan_out)]] * depth)] if depth > 0 else [""]
+
+    def config(self):
+        return {"files": self.files, "fan_out": self.fan_out, "depth": self.depth, "size": self.size,
+                "formats": list(self.formats), "seed": self.seed}
+
+    def key(self, number):
+        """
+        :return: relative URI of the file with the given number.
+        """
+        folder = self.folders[number % len(self.folders)]
+        name = "file{}.{}".format(number, self.formats[number % len(self.formats)])
+        return folder + "/" + name if folder else name
+
+    def generate(self, progress=False):
+        """
+        Writes the tree to disk with raw file operations, bypassing PyFolder.
+        """
+        rng = random.Random(self.seed)
+        sizes = size_distribution(self.size)
+        start = time.perf_counter()
+
+        for folder in self.folders:
+            os.makedirs(os.path.join(self.root, *folder.split("/")), exist_ok=True)
+
+        for number in range(self.files):
+            key = self.key(number)
+
+            with open(os.path.join(self.root, *key.split("/")), "wb") as f:
+                f.write(content(self.formats[number % len(self.formats)], sizes(rng), rng))
+
+            if progress and number and number % 100000 == 0:
+                print("  {} files written ({:.0f} s)".format(number, time.perf_counter() - start))
+
+        with open(self.root + ".json", "w") as f:
+            json.dump(self.config(), f)
+
+    def exists(self):
+        """
+        Checks if the tree was already generated in its root with the same configuration.
+        """
+        try:
+            with open(self.root + ".json") as f:
+                return json.load(f) == self.config()
+        except (OSError, ValueError):
+            return False
+
+
+def add_arguments(parser):
+    parser.add_argument("--files", type=int, default=10000, help="amount of files (default: %(default)s)")
+    parser.add_argument("--fan-out", type=int, default=10, help="subfolders per folder (default: %(default)s)")
+    parser.add_argument("--depth", type=int, default=2, help="levels of subfolders (default: %(default)s)")
+    parser.add_argument("--size", default="fixed:1024",
+                        help="size distribution: fixed:N, uniform:MIN:MAX or lognormal:MEDIAN:SIGMA "
+                             "(default: %(default)s)")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="file formats (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+
+
+def tree_from_arguments(root, arguments):
+    return SyntheticTree(root, files=arguments.files, fan_out=arguments.fan_out, depth=arguments.depth,
+                         size=arguments.size, formats=arguments.formats.split(","), seed=arguments.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates a synthetic folder tree.")
+    parser.add_argument("destination", help="root of the tree to generate")
+    add_arguments(parser)
+    arguments = parser.parse_args()
+
+    tree = tree_from_arguments(arguments.destination, arguments)
+    start = time.perf_counter()
+    tree.generate(progress=True)
+    print("{} files in {} folders generated in {:.1f} s".format(tree.files, len(tree.folders),
+                                                                 time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
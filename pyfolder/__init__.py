@@ -23,35 +23,127 @@
 #OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #SOFTWARE.
 
+import functools
+import itertools
+import hashlib
+import io
 import os
+import pickle
 import shutil
+import stat
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-from pyfolder.interpreters import Interpreters, BinaryInterpreter, JSONInterpreter, TextInterpreter
+from pyfolder.file_index import FileIndex
+from pyfolder.interpreters import Interpreters, BinaryInterpreter, JSONInterpreter, TextInterpreter, ContentCache, \
+    StreamInterpreter, GzipInterpreter, BZ2Interpreter, LZMAInterpreter, NumpyInterpreter, PickleInterpreter, map_file, \
+    map_open_file
+from pyfolder.pack import PackStore
+from pyfolder.descriptors import DirectoryDescriptors, dir_fd_supported
+from pyfolder import walker, transfer
+from pyfolder.parallel import map_ordered, imap_chunked
+from pyfolder.watcher import Watcher
+from pyfolder.stats import Instrumentation
+from pyfolder.views import FolderKeysView, FolderValuesView, FolderItemsView, LazyEntry
 
 __author__ = "Iván de Paz Centeno"
 
+# Maximum amount of child PyFolder handles kept for reuse by each tree
+CHILDREN_CACHE_SIZE = 256
+
+def _load_entry(interpreters, entry):
+    # Folders are not loaded by the workers: they are built in the calling process.
+    file_name, uri, is_file = entry
+    return file_name, is_file, interpreters.load(uri) if is_file else None
+
+
 class PyFolder(dict):
 
     def __init__(self, folder_root, auto_create_folder=True, interpret=True, allow_override=False,
-                 allow_remove_folders_with_content=False, interpreters=None):
+                 allow_remove_folders_with_content=False, interpreters=None, cache_size=0,
+                 index_file=None, use_mmap=False, transparent_compression=False, allow_pickle=False,
+                 pickle_classes=(), storage="files", pack_threshold=1024, shard_levels=0,
+                 use_dir_fd=False, instrument=False):
 
         self.folder_root = folder_root
         self.auto_create_folder = auto_create_folder
         self.interpret = interpret
         self.allow_override = allow_override
         self.allow_remove_folders_with_content = allow_remove_folders_with_content
+        self.use_mmap = use_mmap
+
+        if storage not in ("files", "pack"):
+            raise Exception("Unknown storage \"{}\"".format(storage))
+
+        # In "pack" storage, values smaller than pack_threshold (in bytes, once encoded) are appended to a pack file of
+        # their folder instead of being stored as individual files.
+        self.storage = storage
+        self.pack_threshold = pack_threshold
+
+        # With shard_levels > 0, each key is stored under subfolders named after the first bytes of its hash (like
+        # "ab/cd/key" for 2 levels), so that no folder grows too big. The keys are still exposed flat.
+        if shard_levels and storage != "files":
+            raise Exception("The sharded layout can't be combined with the \"{}\" storage".format(storage))
+
+        self.shard_levels = shard_levels
+
+        # Handles of the subfolders (and pack stores), shared by the whole tree. Reused instead of being built again
+        # on each access.
+        self._children = OrderedDict()
+        self._children_lock = threading.Lock()
+
+        self._pack_stores = OrderedDict()
+        self.pack = self.__pack_store(folder_root)
+
+        # With use_dir_fd, the files are accessed relative to open descriptors of their folders instead of by their
+        # full paths. The descriptor of the root is pinned, so the folder keeps working if its ancestors are renamed.
+        if use_dir_fd and not dir_fd_supported():
+            raise Exception("Operations relative to directory descriptors are not supported on this platform")
+
+        if use_dir_fd and use_mmap:
+            # NumPy can only map arrays by path
+            raise Exception("use_mmap can't be combined with use_dir_fd")
+
+        self.descriptors = DirectoryDescriptors(folder_root) if use_dir_fd else None
 
         if interpreters is None:
-            interpreters = Interpreters()
+            # A cache_size (in bytes) enables the caching of the loaded content between reads.
+            interpreters = Interpreters(cache=ContentCache(cache_size) if cache_size > 0 else None)
 
             if interpret:
                 interpreters.register(JSONInterpreter())
                 interpreters.register(TextInterpreter())
 
-            interpreters.register(BinaryInterpreter())
+            if interpret and NumpyInterpreter.available():
+                interpreters.register(NumpyInterpreter(mmap_mode="r" if use_mmap else None))
+
+            if interpret and allow_pickle:
+                # Any object can be stored in ".pkl" files. Only the pickle_classes (and harmless builtins) can be
+                # loaded back.
+                interpreters.register(PickleInterpreter(allowed_classes=pickle_classes))
+
+            if interpret and transparent_compression:
+                # Files like "data.json.gz" are (de)compressed on the fly
+                interpreters.register(GzipInterpreter())
+                interpreters.register(BZ2Interpreter())
+                interpreters.register(LZMAInterpreter())
+
+            interpreters.register(BinaryInterpreter(use_mmap=use_mmap))
+            interpreters.register(StreamInterpreter())
 
         self.interpreters = interpreters
 
+        # With instrument, the operations of the folder (and the loads and saves of its interpreters) are measured.
+        # See stats().
+        self.instrumentation = Instrumentation() if instrument else None
+
+        if instrument:
+            interpreters.instrumentation = self.instrumentation
+
+        # Persistent index of names to speed up index(). It must be built with build_index() before being used.
+        self.file_index = FileIndex(folder_root, index_file, self.descriptors) if index_file is not None else None
+
         if auto_create_folder:
             os.makedirs(folder_root, exist_ok=True)
 
@@ -59,37 +151,468 @@ class PyFolder(dict):
         return "{} ({} elements)".format(self.folder_root, len(self))
 
     def __len__(self):
-        return len(os.listdir(self.folder_root))
+        return sum(1 for _ in self.scan()) + (len(self.pack) if self.pack is not None else 0)
 
     def __repr__(self):
         return str(self)
 
     def __iter__(self):
-        for file_name in os.listdir(self.folder_root):
-            yield file_name
+        for entry in self.scan():
+            yield entry.name
+
+        if self.pack is not None:
+            for name in self.pack:
+                yield name
+
+    def scan(self):
+        """
+        Streams the entries of the folder as they are read from the filesystem.
+        The type and stat information cached by each entry is reused, so no extra stat is needed per entry.
+        Values stored in the pack file have no entry, and the files of the pack itself are skipped.
+        In the sharded layout, the entries of the files inside the shard folders are streamed instead.
+        :return: generator of os.DirEntry objects.
+        """
+        if self.instrumentation is not None:
+            return self.instrumentation.measure_iterator("listing", self.__scan())
+
+        return self.__scan()
+
+    def __scan(self):
+        if self.shard_levels:
+            for entry in self.__scan_shards(self.folder_root, 0):
+                yield entry
+            return
+
+        if self.descriptors is not None:
+            # The entries only know their names, their paths are relative to the descriptor
+            listing = self.descriptors.scandir(self.descriptors.relative(self.folder_root))
+        else:
+            listing = os.scandir(self.folder_root)
+
+        with listing as iterator:
+            for entry in iterator:
+                if self.pack is not None and PackStore.is_internal(entry.name):
+                    continue
+
+                yield entry
+
+    def __scan_shards(self, folder_root, level):
+        with os.scandir(folder_root) as iterator:
+            for entry in iterator:
+                if level == self.shard_levels:
+                    if entry.is_file():
+                        yield entry
+                elif self.__is_shard(entry.name) and entry.is_dir():
+                    for leaf_entry in self.__scan_shards(entry.path, level + 1):
+                        yield leaf_entry
+
+    @staticmethod
+    def __is_shard(name):
+        return len(name) == 2 and all(c in "0123456789abcdef" for c in name)
+
+    def __shard_folder(self, key):
+        if "/" in key:
+            raise KeyError("Nested keys are not allowed in a sharded folder: {}".format(key))
+
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.folder_root, *[digest[2 * i:2 * i + 2] for i in range(self.shard_levels)])
 
     def keys(self):
-        return list(os.listdir(self.folder_root))
+        """
+        :return: lazy view of the names of the folder. It is listed again on each iteration.
+        """
+        return FolderKeysView(self)
 
     def values(self):
-        return [value for _, value in self.items()]
+        """
+        :return: lazy view of the contents of the folder. They are loaded one by one, as they are consumed.
+        """
+        return FolderValuesView(self, self.__iter_items)
 
     def __contains__(self, item):
-        return item in self.keys()
+        if self.instrumentation is None:
+            return self.__contains(item)
+
+        with self.instrumentation.measure("contains"):
+            return self.__contains(item)
+
+    def __contains(self, item):
+        if not isinstance(item, str) or item in ("", ".") or ".." in item:
+            return False
+
+        if self.shard_levels and "/" in item:
+            return False
+
+        # Direct lookup of the entry instead of listing the whole folder. Nested URIs are resolved as paths.
+        path = self.__path(item)
+
+        if self.__exists(path):
+            return True
+
+        # Missing folders can't hold packed values: no store is created for them.
+        folder = os.path.dirname(path)
+        pack = self.__pack_store(folder, create=os.path.isdir(folder))
+        return pack is not None and os.path.basename(path) in pack
+
+    def __path(self, item):
+        if self.shard_levels:
+            return os.path.join(self.__shard_folder(item), item)
+
+        return os.path.join(self.folder_root, *item.split("/"))
+
+    def __entry_path(self, entry):
+        if self.descriptors is not None and not self.shard_levels:
+            return os.path.join(self.folder_root, entry.name)
+
+        return entry.path
+
+    def __locate(self, path):
+        folder, name = os.path.split(path)
+        return self.descriptors.relative(folder), name
+
+    def __stat(self, path, follow_symlinks=True):
+        if self.descriptors is None:
+            return os.stat(path, follow_symlinks=follow_symlinks)
+
+        relative, name = self.__locate(path)
+
+        with self.descriptors.folder(relative) as fd:
+            return os.stat(name, dir_fd=fd, follow_symlinks=follow_symlinks)
+
+    def __exists(self, path):
+        try:
+            self.__stat(path, follow_symlinks=False)
+        except (FileNotFoundError, NotADirectoryError):
+            return False
+
+        return True
+
+    def __open(self, path, mode):
+        if self.instrumentation is None:
+            return self.__open_file(path, mode)
+
+        with self.instrumentation.measure("open") as measure:
+            measure.files_opened = 1
+            return self.__open_file(path, mode)
+
+    def __open_file(self, path, mode):
+        if self.descriptors is None:
+            return open(path, mode)
+
+        relative, name = self.__locate(path)
+
+        # The descriptor of the file is independent from the one of its folder
+        with self.descriptors.folder(relative) as fd:
+            return open(name, mode, opener=functools.partial(os.open, dir_fd=fd))
+
+    def __load(self, path):
+        if self.descriptors is None:
+            return self.interpreters.load(path)
+
+        try:
+            with self.__open(path, "rb") as f:
+                return self.interpreters.read(f, path)
+        except Exception as ex:
+            raise Exception("Error loading file \"{}\": {}".format(path, ex))
+
+    def __save(self, path, value):
+        if self.descriptors is None:
+            self.interpreters.save(path, value)
+            return
+
+        self.interpreters.invalidate(path)
+
+        try:
+            with self.__open(path, "wb") as f:
+                self.interpreters.write(f, path, value)
+        except Exception as ex:
+            raise Exception("Error saving file \"{}\": {}".format(path, ex))
+
+    def __remove(self, path):
+        if self.descriptors is None:
+            os.remove(path)
+        else:
+            relative, name = self.__locate(path)
+
+            with self.descriptors.folder(relative) as fd:
+                os.unlink(name, dir_fd=fd)
+
+        self.interpreters.invalidate(path)
+
+    def close(self):
+        """
+        Closes the directory descriptors held with use_dir_fd. They are also closed when the folder is collected.
+        """
+        if self.descriptors is not None:
+            self.descriptors.close()
+
+    def __pack_store(self, folder_root, create=True):
+        # Stores are shared with the child folders, so that each pack file is indexed only once. Like the handles of
+        # the children, the least recently used ones are dropped beyond CHILDREN_CACHE_SIZE.
+        if self.storage != "pack":
+            return None
+
+        with self._children_lock:
+            pack = self._pack_stores.get(folder_root)
+
+            if pack is not None:
+                self._pack_stores.move_to_end(folder_root)
+            elif create:
+                pack = self._pack_stores[folder_root] = PackStore(folder_root)
+
+                while len(self._pack_stores) > CHILDREN_CACHE_SIZE:
+                    self._pack_stores.popitem(last=False)
+
+        return pack
+
+    def __forget_pack_stores(self, folder_root):
+        prefix = os.path.join(folder_root, "")
+
+        with self._children_lock:
+            for key in [key for key in self._pack_stores if key == folder_root or key.startswith(prefix)]:
+                del self._pack_stores[key]
+
+    def compact(self):
+        """
+        Reclaims the space left in the pack file of the folder by overwritten and deleted values.
+        Requires the "pack" storage.
+        """
+        if self.pack is None:
+            raise Exception("The folder {} does not use the pack storage".format(self.folder_root))
+
+        self.pack.compact()
+
+    def __unpack(self, item_name):
+        return self.__decode(item_name, self.__pack_get(self.pack, item_name))
+
+    def __pack_get(self, pack, item_name):
+        if self.instrumentation is None:
+            return pack.get(item_name)
+
+        with self.instrumentation.measure("pack_read") as measure:
+            data = pack.get(item_name)
+            measure.files_opened = 1
+            measure.bytes_read = len(data)
+            return data
+
+    def __pack_put(self, item_name, data):
+        if self.instrumentation is None:
+            self.pack.put(item_name, data)
+            return
+
+        with self.instrumentation.measure("pack_write") as measure:
+            self.pack.put(item_name, data)
+            measure.files_opened = 1
+            measure.bytes_written = len(data)
+
+    def __decode(self, item_name, data):
+        try:
+            return self.interpreters.read(io.BytesIO(data), item_name)
+        except Exception as ex:
+            raise Exception("Error loading packed value \"{}\" of {}: {}".format(item_name, self.folder_root, ex))
+
+    def __pack_items(self):
+        if self.pack is not None:
+            items = self.pack.items()
+
+            if self.instrumentation is not None:
+                items = self.instrumentation.measure_iterator("pack_read", items, size=lambda item: len(item[1]),
+                                                              files_opened=1)
+
+            for name, data in items:
+                yield name, self.__decode(name, data)
+
+    def mmap(self, item):
+        """
+        Maps the raw content of a file into memory, read-only, without copying it. Pages are loaded lazily on access.
+        The result should be used as a context manager:
+
+            with pyfolder.mmap("model.bin") as content:
+                header = content[:16]
+
+        :param item: relative URI of the file.
+        :return: mmap object (or an empty memoryview if the file is empty).
+        """
+        if ".." in item:
+            raise KeyError(item)
+
+        path = self.__path(item)
+
+        try:
+            is_file = stat.S_ISREG(self.__stat(path).st_mode)
+        except (FileNotFoundError, NotADirectoryError):
+            is_file = False
+
+        if not is_file:
+            raise KeyError(item)
+
+        if self.descriptors is None:
+            return map_file(path)
+
+        with self.__open(path, "rb") as f:
+            return map_open_file(f)
 
     def __setitem__(self, key, value):
+        if self.instrumentation is None:
+            self.__set(key, value)
+            return
+
+        with self.instrumentation.measure("setitem"):
+            self.__set(key, value)
+
+    def __set(self, key, value):
+        if ".." in key or key == ".":
+            raise KeyError("Invalid key {}".format(key))
+
+        father, item_name = self.__get_uri_item_name(key)
+        father.__check_not_internal(item_name, key)
+
+        uri = os.path.join(father.folder_root, item_name)
+
+        if not self.allow_override:
+            # Constant-time existence checks, regardless of the amount of elements in the folder.
+            if self.__exists(uri) or (father.pack is not None and item_name in father.pack):
+                raise Exception("File {} already exists and can't be overridden (flag not set)".format(uri))
+
+        self.__prepare_folder(father.folder_root)
+
+        if father.pack is not None and not os.path.isdir(uri) and not self.__is_stream(item_name, value):
+            father.__save_packed(uri, item_name, value)
+            return
+
+        self.__save(uri, value)
+
+    def __check_not_internal(self, item_name, key):
+        # The files of the pack store can't be written or removed as elements of the folder.
+        if self.pack is not None and PackStore.is_internal(item_name):
+            raise KeyError("Invalid key {}".format(key))
+
+    def __prepare_folder(self, folder_root):
+        # Folders are only created when something is written into them.
+        create = self.auto_create_folder or self.shard_levels
+
+        if self.descriptors is not None:
+            # Opening the descriptor of the folder creates it if needed, and keeps it ready for the write
+            with self.descriptors.folder(self.descriptors.relative(folder_root), create=create):
+                return
+
+        if os.path.isdir(folder_root):
+            return
+
+        if not create:
+            raise FileNotFoundError(folder_root)
+
+        os.makedirs(folder_root, exist_ok=True)
+
+    def __is_stream(self, item_name, value):
+        # Streams are written to files as they are read, they are never buffered to be packed.
+        _, extension = self.interpreters.split_extension(item_name)
+        return isinstance(self.interpreters.interpreter_for_save(value, extension), StreamInterpreter)
+
+    def __save_packed(self, uri, item_name, value):
+        data = io.BytesIO()
+
+        try:
+            self.interpreters.write(data, item_name, value)
+        except Exception as ex:
+            raise Exception("Error saving file \"{}\": {}".format(uri, ex))
+
+        if data.tell() < self.pack_threshold:
+            self.__pack_put(item_name, data.getvalue())
+
+            if os.path.isfile(uri):
+                os.remove(uri)
+                self.interpreters.invalidate(uri)
+        else:
+            # Large values get a file of their own. The content is already encoded.
+            self.interpreters.invalidate(uri)
+
+            if self.instrumentation is None:
+                self.__write_file(uri, data.getbuffer())
+            else:
+                with self.instrumentation.measure("write") as measure:
+                    self.__write_file(uri, data.getbuffer())
+                    measure.bytes_written = data.tell()
+
+            self.pack.delete(item_name)
+
+    def __write_file(self, uri, buffer):
+        with self.__open(uri, "wb") as f:
+            f.write(buffer)
+
+    def open(self, key, mode="rb"):
+        """
+        Opens a file of the folder as a stream, for reading or writing it incrementally.
+        Writing modes follow the same rules as the assignment of elements: existing files can only be opened for
+        writing if the allow_override flag is set.
+        :param key: relative URI of the file.
+        :param mode: mode as in the built-in open().
+        :return: file object.
+        """
         if ".." in key or key == ".":
             raise KeyError("Invalid key {}".format(key))
 
+        if not any(c in mode for c in "wax+"):
+            try:
+                is_file = stat.S_ISREG(self.__stat(self.__path(key)).st_mode)
+            except (FileNotFoundError, NotADirectoryError):
+                is_file = False
+
+            if not is_file:
+                father, item_name = self.__get_uri_item_name(key)
+
+                if father.pack is None or item_name not in father.pack:
+                    raise KeyError(key)
+
+                # Packed values are read from memory, they are small by definition.
+                stream = io.BytesIO(father.__pack_get(father.pack, item_name))
+                return stream if "b" in mode else io.TextIOWrapper(stream)
+
+            return self.__open(self.__path(key), mode)
+
         father, item_name = self.__get_uri_item_name(key)
+        father.__check_not_internal(item_name, key)
+        uri = os.path.join(father.folder_root, item_name)
+        packed = father.pack is not None and item_name in father.pack
 
-        if not self.allow_override and item_name in father:
-            raise Exception("File {} already exists and can't be overridden (flag not set)".format(
-                os.path.join(father.folder_root, item_name)))
+        if not self.allow_override and (self.__exists(uri) or packed):
+            raise Exception("File {} already exists and can't be overridden (flag not set)".format(uri))
 
-        self.interpreters.save(os.path.join(father.folder_root, item_name), value)
+        self.__prepare_folder(father.folder_root)
+
+        if packed:
+            father.pack.delete(item_name)
+
+        self.interpreters.invalidate(uri)
+        return self.__open(uri, mode)
+
+    def read_chunks(self, key, chunk_size=1024*1024):
+        """
+        Reads the raw content of a file in chunks, without holding it entirely in memory.
+        :param key: relative URI of the file.
+        :param chunk_size: maximum size of each chunk, in bytes.
+        :return: generator of bytes.
+        """
+        f = self.open(key, "rb")
+
+        def chunks():
+            with f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    yield chunk
+
+        if self.instrumentation is not None:
+            return self.instrumentation.measure_iterator("read_chunks", chunks(), size=len)
+
+        return chunks()
 
     def __getitem__(self, item):
+        if self.instrumentation is None:
+            return self.__get(item)
+
+        with self.instrumentation.measure("getitem"):
+            return self.__get(item)
+
+    def __get(self, item):
         if ".." in item:
             raise KeyError("Invalid key {}".format(item))
 
@@ -98,77 +621,388 @@ class PyFolder(dict):
 
         father, item_name = self.__get_uri_item_name(item)
 
-        if not os.path.exists(os.path.join(father.folder_root, item_name)):
+        if father.pack is not None and item_name in father.pack:
+            return father.__unpack(item_name)
+
+        uri = os.path.join(father.folder_root, item_name)
+
+        try:
+            mode = self.__stat(uri).st_mode
+        except (FileNotFoundError, NotADirectoryError):
             raise KeyError(item)
 
-        if os.path.isfile(os.path.join(father.folder_root, item_name)):
-            content = self.interpreters.load(os.path.join(self.folder_root, item))
+        if stat.S_ISDIR(mode):
+            content = self.__child(uri)
         else:
-            content = PyFolder(os.path.join(father.folder_root, item_name),
-                                  auto_create_folder=self.auto_create_folder, interpret=self.interpret,
-                                  allow_override=self.allow_override,
-                                  allow_remove_folders_with_content=self.allow_remove_folders_with_content,
-                                        interpreters=self.interpreters)
+            content = self.__load(uri)
         return content
 
     def __get_uri_item_name(self, item):
-        if "/" in item:
-            items = item.split("/")
-
-            iterator = self
-
-            for path in items[:-1]:
-                iterator = PyFolder(os.path.join(iterator.folder_root, path),
-                                      auto_create_folder=self.auto_create_folder, interpret=self.interpret,
-                                      allow_override=self.allow_override,
-                                      allow_remove_folders_with_content=self.allow_remove_folders_with_content,
-                                        interpreters=self.interpreters)
-
-            result = iterator, items[-1]
+        # URIs are resolved as strings: only the handle of the last folder is needed, and it is not created until
+        # something is written into it.
+        if self.shard_levels:
+            result = self.__child(self.__shard_folder(item)), item
+        elif "/" in item:
+            folder, _, item_name = item.rpartition("/")
+            result = self.__child(os.path.join(self.folder_root, *folder.split("/"))), item_name
         else:
             result = self, item
 
         return result
 
     def items(self):
-        for file_name in os.listdir(self.folder_root):
+        """
+        :return: lazy view of the (name, content) tuples of the folder. The contents are loaded one by one, as they
+        are consumed.
+        """
+        return FolderItemsView(self, self.__iter_items)
+
+    def __iter_items(self):
+        for entry in self.scan():
 
-            if os.path.isfile(os.path.join(self.folder_root, file_name)):
-                content = self.interpreters.load(os.path.join(self.folder_root, file_name))
+            if entry.is_file():
+                content = self.__load(self.__entry_path(entry))
             else:
-                content = PyFolder(os.path.join(self.folder_root, file_name),
-                                      auto_create_folder=self.auto_create_folder, interpret=self.interpret,
-                                      allow_override=self.allow_override,
-                                      allow_remove_folders_with_content=self.allow_remove_folders_with_content,
-                                        interpreters=self.interpreters)
+                content = self.__child(os.path.join(self.folder_root, entry.name))
 
-            yield file_name, content
+            yield entry.name, content
+
+        for name, content in self.__pack_items():
+            yield name, content
+
+    def entries(self, kind=None):
+        """
+        Iterates over the elements of the folder as lazy handles, with their name, kind, size and modification time.
+        The content of each element is only loaded when the value of its handle is accessed, so the elements can be
+        filtered before reading them:
+
+            big_files = [entry.value for entry in pyfolder.entries("file") if entry.size > 1024]
+
+        :param kind: "file" or "folder" to iterate only over one kind of elements. None for both.
+        :return: generator of LazyEntry objects.
+        """
+        for entry in self.scan():
+            entry_kind = "file" if entry.is_file() else "folder"
+
+            if kind is not None and kind != entry_kind:
+                continue
+
+            if entry_kind == "file":
+                path = self.__entry_path(entry)
+                load = functools.partial(self.__load, path)
+            else:
+                path = os.path.join(self.folder_root, entry.name)
+                load = functools.partial(self.__child, path)
+
+            # Entries listed through a descriptor can't stat themselves once the listing is over
+            stat = entry.stat if self.descriptors is None else functools.partial(self.__stat, path)
+            yield LazyEntry(entry.name, entry_kind, load, stat=stat)
+
+        if self.pack is not None and kind != "folder":
+            for name in self.pack:
+                yield LazyEntry(name, "file", functools.partial(self.__unpack, name), size=self.pack.size(name))
 
     def files(self):
-        for file_name in os.listdir(self.folder_root):
-            if os.path.isfile(os.path.join(self.folder_root, file_name)):
-                yield file_name
+        for entry in self.scan():
+            if entry.is_file():
+                yield entry.name
+
+        if self.pack is not None:
+            for name in self.pack:
+                yield name
 
     def folders(self):
-        for folder in os.listdir(self.folder_root):
-            if os.path.isfile(os.path.join(self.folder_root, folder)):
+        for entry in self.scan():
+            if entry.is_file():
                 continue
-            yield folder
+            yield entry.name
 
     def files_items(self):
-        for file_name in self.files():
-            content = self.interpreters.load(os.path.join(self.folder_root, file_name))
-            yield file_name, content
+        for entry in self.scan():
+            if entry.is_file():
+                yield entry.name, self.__load(self.__entry_path(entry))
+
+        for name, content in self.__pack_items():
+            yield name, content
 
     def folders_items(self):
-        for folder_name in self.folders():
-            yield folder_name, PyFolder(os.path.join(self.folder_root, folder_name),
-                                      auto_create_folder=self.auto_create_folder, interpret=self.interpret,
-                                      allow_override=self.allow_override,
-                                      allow_remove_folders_with_content=self.allow_remove_folders_with_content,
-                                        interpreters=self.interpreters)
+        for entry in self.scan():
+            if entry.is_file():
+                continue
+            yield entry.name, self.__child(os.path.join(self.folder_root, entry.name))
+
+    def parallel_items(self, max_workers=None, executor="process", ordered=True, chunk_size=16):
+        """
+        Iterates over the elements like items(), reading and interpreting the files in a pool of workers.
+        See parallel_files_items() for the arguments.
+        """
+        entries = ((entry.name, self.__entry_path(entry), entry.is_file()) for entry in self.scan())
+
+        for file_name, is_file, content in self.__parallel_load(entries, max_workers, executor, ordered, chunk_size):
+            if not is_file:
+                content = self.__child(os.path.join(self.folder_root, file_name))
+
+            yield file_name, content
+
+        # Packed values are read in a single pass over the pack file
+        for name, content in self.__pack_items():
+            yield name, content
+
+    def parallel_files_items(self, max_workers=None, executor="process", ordered=True, chunk_size=16):
+        """
+        Iterates over the files like files_items(), reading and interpreting them in a pool of workers.
+        A pool of processes scales the decoding of CPU-bound formats (like JSON) with the amount of cores. A pool of
+        threads is enough for I/O-bound ones, and it is used as fallback when the interpreters can't be sent to other
+        processes (or their content can't be sent back, as with use_mmap), and with use_dir_fd.
+        Only a few chunks are in flight at a time, so the memory is bound regardless of the amount of files.
+
+        :param max_workers: amount of workers. None for the default of the executor.
+        :param executor: "process", "thread" or a concurrent.futures executor to use.
+        :param ordered: if set, the files are yielded in listing order. Otherwise, as soon as they are loaded.
+        :param chunk_size: amount of files sent together to a worker.
+        :return: generator of (file name, content) tuples.
+        """
+        entries = ((entry.name, self.__entry_path(entry), True) for entry in self.scan() if entry.is_file())
+
+        for file_name, _, content in self.__parallel_load(entries, max_workers, executor, ordered, chunk_size):
+            yield file_name, content
+
+        for name, content in self.__pack_items():
+            yield name, content
+
+    def __load_entry(self, entry):
+        file_name, path, is_file = entry
+        return file_name, is_file, self.__load(path) if is_file else None
+
+    def __parallel_load(self, entries, max_workers, executor, ordered, chunk_size):
+        load = functools.partial(_load_entry, self.interpreters)
+        owned_executor = None
+
+        if self.descriptors is not None:
+            # The files are read relative to the descriptors, which can't be sent to other processes
+            load = self.__load_entry
+
+            if executor == "process":
+                executor = "thread"
+        elif executor == "process":
+            try:
+                pickle.dumps(load)
+                processes_allowed = not self.use_mmap
+            except Exception:
+                processes_allowed = False
+
+            executor = "process" if processes_allowed else "thread"
+
+        if executor == "process":
+            executor = owned_executor = ProcessPoolExecutor(max_workers=max_workers)
+        elif executor == "thread":
+            executor = owned_executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        try:
+            for result in imap_chunked(load, entries, executor, chunk_size=chunk_size, ordered=ordered):
+                yield result
+        finally:
+            if owned_executor is not None:
+                owned_executor.shutdown(wait=False)
+
+    def __child(self, folder_root):
+        with self._children_lock:
+            child = self._children.get(folder_root)
+
+            if child is not None:
+                self._children.move_to_end(folder_root)
+                return child
+
+        # The folder is not created by the handle, but on the first write into it.
+        child = PyFolder(folder_root, auto_create_folder=False, interpret=self.interpret,
+                         allow_override=self.allow_override,
+                         allow_remove_folders_with_content=self.allow_remove_folders_with_content,
+                         interpreters=self.interpreters, use_mmap=self.use_mmap, storage=self.storage,
+                         pack_threshold=self.pack_threshold)
+
+        child.auto_create_folder = self.auto_create_folder
+        child._pack_stores = self._pack_stores
+        child.pack = self.__pack_store(folder_root)
+        child._children = self._children
+        child._children_lock = self._children_lock
+        child.descriptors = self.descriptors
+        child.instrumentation = self.instrumentation
+
+        with self._children_lock:
+            child = self._children.setdefault(folder_root, child)
+
+            while len(self._children) > CHILDREN_CACHE_SIZE:
+                self._children.popitem(last=False)
+
+        return child
+
+    def get_many(self, keys, max_workers=None, return_exceptions=False):
+        """
+        Retrieves several elements at once, reading and interpreting them in a pool of threads.
+        :param keys: iterable of relative URIs.
+        :param max_workers: maximum number of threads.
+        :param return_exceptions: if set, the error of a key (like a KeyError) is returned in its position instead of
+        the content. Otherwise, the first error is raised.
+        :return: list of contents, in the same order as the keys.
+        """
+        return map_ordered(self.__getitem__, keys, max_workers=max_workers, return_exceptions=return_exceptions)
+
+    def set_many(self, items, max_workers=None, return_exceptions=False):
+        """
+        Stores several elements at once, in a pool of threads.
+        :param items: dict or iterable of (relative URI, content) pairs.
+        :param max_workers: maximum number of threads.
+        :param return_exceptions: if set, the errors are returned in the position of their item instead of being raised.
+        :return: list with None for each stored item (or its error), in the same order as the items.
+        """
+        if isinstance(items, dict):
+            items = items.items()
+
+        return map_ordered(lambda item: self.__setitem__(*item), items, max_workers=max_workers,
+                           return_exceptions=return_exceptions)
+
+    def delete_many(self, keys, max_workers=None, return_exceptions=False):
+        """
+        Removes several elements at once, in a pool of threads.
+        :param keys: iterable of relative URIs.
+        :param max_workers: maximum number of threads.
+        :param return_exceptions: if set, the errors are returned in the position of their key instead of being raised.
+        :return: list with None for each removed key (or its error), in the same order as the keys.
+        """
+        return map_ordered(self.__delitem__, keys, max_workers=max_workers, return_exceptions=return_exceptions)
+
+    def copy_to(self, destination, skip="mtime", max_workers=None):
+        """
+        Copies the files of the folder (and of its subfolders) into another folder as raw bytes, without
+        interpreting them. The bytes are copied by the kernel when possible, in a pool of threads.
+        :param destination: PyFolder or path of the destination folder. Changed files that already exist in a
+        PyFolder can only be replaced if its allow_override flag is set.
+        :param skip: "mtime" to skip the files with the same size and modification time in the destination, "hash" to
+        skip the ones with the same content, or None to copy all of them.
+        :param max_workers: maximum number of threads copying files.
+        :return: dict with the amount of files "copied", "skipped" and "deleted".
+        """
+        return self.__transfer(transfer.copy_tree, destination, skip=skip, max_workers=max_workers)
+
+    def sync_to(self, destination, skip="mtime", delete=True, max_workers=None):
+        """
+        Mirrors the folder into another folder: the changed files are copied like in copy_to(), and the files and
+        folders of the destination that don't exist in this folder are removed.
+        :param delete: if not set, the elements that only exist in the destination are kept.
+        See copy_to() for the rest of arguments.
+        """
+        return self.__transfer(transfer.copy_tree, destination, skip=skip, delete=delete, max_workers=max_workers)
+
+    def move_to(self, destination, max_workers=None):
+        """
+        Moves the files and folders of this folder into another folder, which is created if needed. This folder is
+        kept, empty. Within the same filesystem the elements are just renamed (whole subfolders at once, if they
+        don't exist in the destination). Across filesystems they are copied like in copy_to() and then removed.
+        :param destination: PyFolder or path of the destination folder.
+        :param max_workers: maximum number of threads copying files across filesystems.
+        :return: dict with the amount of elements "moved" (renamed) and files "copied".
+        """
+        if not self.allow_override:
+            raise Exception("Files of {} can't be moved (flag not set)".format(self.folder_root))
+
+        try:
+            return self.__transfer(transfer.move_tree, destination, max_workers=max_workers)
+        finally:
+            self.interpreters.invalidate(self.folder_root, recursive=True)
+
+            if self.descriptors is not None:
+                self.descriptors.forget("")
+
+    def __transfer(self, function, destination, **kwargs):
+        destination_root = getattr(destination, "folder_root", destination)
+        allow_override = getattr(destination, "allow_override", True)
+
+        try:
+            return function(self.folder_root, destination_root, allow_override=allow_override, **kwargs)
+        finally:
+            if isinstance(destination, PyFolder):
+                destination.interpreters.invalidate(destination_root, recursive=True)
+
+                if destination.descriptors is not None:
+                    destination.descriptors.forget("")
+
+    def watch(self, backend="auto", interval=1.0, trust_cache=False):
+        """
+        Watches the changes of the folder and its subfolders, in a background thread. The content cached for the
+        elements changed is invalidated as soon as their change is read.
+        :param backend: "inotify", "poll" (comparison of periodic snapshots) or "auto" (inotify if available).
+        :param interval: seconds between snapshots when polling.
+        :param trust_cache: while the watcher runs, serve the cached content without validating it against the
+        file. External changes are seen once the watcher reads them (with polling, up to interval seconds later).
+        The content cached before is dropped, as its changes were not watched.
+        :return: Watcher, to be iterated (blocking or asynchronously) for the events. It must be closed.
+        """
+        trust_cache = trust_cache and self.interpreters.cache is not None
+
+        # The cache is trusted once the backend watches the tree, so no change goes unreported
+        return Watcher(self.folder_root, backend=backend, interval=interval, on_event=self.__on_change,
+                       on_start=self.__trust_cache if trust_cache else None,
+                       on_close=self.__untrust_cache if trust_cache else None, translate=self.__translate_event)
+
+    def __trust_cache(self):
+        self.interpreters.cache.trust()
+
+    def __untrust_cache(self):
+        if self.interpreters.cache is not None:
+            self.interpreters.cache.untrust()
+
+    def __on_change(self, event):
+        if event.kind == "overflow":
+            if self.interpreters.cache is not None:
+                self.interpreters.cache.clear()
+
+            if self.descriptors is not None:
+                self.descriptors.forget("")
+            return
+
+        for key in (event.key, event.destination):
+            if key is None:
+                continue
+
+            path = os.path.join(self.folder_root, *key.split("/"))
+            self.interpreters.invalidate(path, recursive=event.is_folder)
+
+            if event.is_folder and event.kind in ("deleted", "moved") and self.descriptors is not None:
+                self.descriptors.forget(self.descriptors.relative(path))
+
+    def __translate_event(self, event):
+        # Events are reported by key: shard folders and the files of the pack are internal
+        if event.key is None:
+            return event
+
+        if self.shard_levels:
+            if not self.__is_shard_uri(event.key):
+                return None
+
+            event = event._replace(key=event.key.rpartition("/")[2])
+
+            if event.destination is not None:
+                if not self.__is_shard_uri(event.destination):
+                    return event._replace(kind="deleted", destination=None)
+
+                event = event._replace(destination=event.destination.rpartition("/")[2])
+
+            return event
+
+        if self.pack is not None and PackStore.is_internal(event.key.rpartition("/")[2]):
+            return None
+
+        return event
 
     def __delitem__(self, key):
+        if self.instrumentation is None:
+            self.__del(key)
+            return
+
+        with self.instrumentation.measure("delitem"):
+            self.__del(key)
+
+    def __del(self, key):
         if ".." in key:
             raise KeyError("Invalid key {}".format(key))
 
@@ -181,38 +1015,165 @@ class PyFolder(dict):
             return
 
         father, item_name = self.__get_uri_item_name(key)
+        father.__check_not_internal(item_name, key)
 
-        if os.path.isfile(os.path.join(father.folder_root, item_name)):
-            os.remove(os.path.join(father.folder_root, item_name))
-        else:
+        if father.pack is not None and father.pack.delete(item_name):
+            return
+
+        uri = os.path.join(father.folder_root, item_name)
+
+        try:
+            mode = self.__stat(uri).st_mode
+        except (FileNotFoundError, NotADirectoryError):
+            raise KeyError(key)
+
+        if stat.S_ISDIR(mode):
             father[item_name].__delete(self.allow_remove_folders_with_content)
+        else:
+            self.__remove(uri)
 
     def __delete(self, force=False):
+        self.interpreters.invalidate(self.folder_root, recursive=True)
+
+        if self.descriptors is not None:
+            self.descriptors.forget(self.descriptors.relative(self.folder_root))
+
+        if self.pack is not None:
+            # The files of an empty pack don't count as content of the folder
+            if not force and len(self.pack) == 0:
+                self.pack.destroy()
+
+            self.__forget_pack_stores(self.folder_root)
+
         if force:
             shutil.rmtree(self.folder_root, ignore_errors=True)
         else:
             os.rmdir(self.folder_root)
 
-    def index(self, filename, max_depth=200):
-        matches = self.__index(filename, max_depth)
-        folder_root = self.folder_root
-        if not folder_root.endswith("/"): folder_root += "/"
+    def build_index(self):
+        """
+        Builds (or rebuilds) the persistent index of names from scratch. Requires the flag index_file to be set.
+        """
+        if self.file_index is None:
+            raise Exception("No index file was specified for {}".format(self.folder_root))
+
+        self.file_index.build()
+
+    def stats(self):
+        """
+        Retrieves the statistics of the operations measured so far. Requires the flag instrument to be set.
+        :return: dict with the "operations" (by name, like "getitem", "listing" or "load:JSONInterpreter": count, total,
+        mean, p50, p99 and max times in milliseconds, and the histogram of latencies), "bytes_read", "bytes_written"
+        and "files_opened".
+        """
+        if self.instrumentation is None:
+            raise Exception("Instrumentation is not enabled for {}".format(self.folder_root))
+
+        return self.instrumentation.stats()
+
+    def refresh_index(self):
+        """
+        Updates the persistent index, rescanning only the folders modified since they were last indexed.
+        """
+        if self.file_index is None:
+            raise Exception("No index file was specified for {}".format(self.folder_root))
+
+        self.file_index.refresh()
+
+    def index(self, filename, max_depth=200, refresh=True, glob=False, regex=False, workers=1):
+        """
+        Searches for files and folders by name.
+        If a persistent index was built, the search of exact names is answered by it. Otherwise the tree is walked.
+        :param filename: name of the file or folder to find. Interpreted as a shell-style wildcard if glob is set, or as
+        a regular expression if regex is set.
+        :param max_depth: maximum depth to search, being 1 the root folder.
+        :param refresh: if the index is in use, refresh it before the search so that it reflects the latest changes.
+        The refresh stats every indexed folder, so it takes time proportional to the amount of folders of the tree
+        (still far less than walking it). Otherwise, the index is trusted as it is and the search takes milliseconds:
+        keep it updated with refresh_index() (periodically, or when watch() reports changes) for the fastest lookups.
+        :param workers: number of threads reading folders when the tree is walked.
+        :return: list of relative URIs of the matches (or keys, in the sharded layout).
+        """
+        if self.instrumentation is None:
+            return self.__index(filename, max_depth, refresh, glob, regex, workers)
+
+        with self.instrumentation.measure("index") as measure:
+            result = self.__index(filename, max_depth, refresh, glob, regex, workers)
+            measure.entries = len(result)
+            return result
+
+    def __index(self, filename, max_depth, refresh, glob, regex, workers):
+        if self.file_index is not None and not glob and not regex and self.file_index.exists():
+            if refresh:
+                self.file_index.refresh()
+
+            if self.shard_levels:
+                return list(self.__shard_keys(self.file_index.lookup(filename, self.shard_levels + 1)))
+
+            return list(self.__without_internal(self.file_index.lookup(filename, max_depth)))
+
+        return list(self.iter_index(filename, max_depth=max_depth, glob=glob, regex=regex, workers=workers))
+
+    def iter_index(self, filename, max_depth=200, glob=False, regex=False, limit=None, workers=1):
+        """
+        Searches for files and folders by name, yielding the relative URIs of the matches as soon as they are found.
+        The tree is walked iteratively, so the depth is not bound to the recursion limit.
+        :param filename: name of the file or folder to find. See index() for the glob and regex flags.
+        :param max_depth: maximum depth to search, being 1 the root folder.
+        :param limit: stop the search after this amount of matches.
+        :param workers: number of threads reading folders in parallel. Useful on high-latency filesystems.
+        :return: generator of relative URIs (or keys, in the sharded layout, where max_depth is ignored).
+        """
+        if self.shard_levels:
+            matches = walker.name_matcher(filename, glob=glob, regex=regex)
+            keys = (key for key, entry in self.walk(workers=workers) if matches(key))
+            return itertools.islice(keys, limit)
+
+        if self.storage == "pack":
+            uris = walker.iter_index(self.folder_root, filename, max_depth=max_depth, glob=glob, regex=regex,
+                                     workers=workers, descriptors=self.descriptors)
+            return itertools.islice(self.__without_internal(uris), limit)
+
+        return walker.iter_index(self.folder_root, filename, max_depth=max_depth, glob=glob, regex=regex,
+                                 limit=limit, workers=workers, descriptors=self.descriptors)
+
+    def walk(self, max_depth=200, workers=1):
+        """
+        Walks the tree of the folder, yielding every file and folder as soon as it is read.
+        :param max_depth: maximum depth to walk, being 1 the root folder.
+        :param workers: number of threads reading folders in parallel.
+        In the sharded layout, only the files are yielded, by key, and max_depth is ignored.
+        With use_dir_fd, the folders are read relative to the descriptor of the root, and the paths of the entries
+        are only their names.
+        :return: generator of tuples (relative URI, os.DirEntry).
+        """
+        if self.shard_levels:
+            entries = walker.walk(self.folder_root, max_depth=self.shard_levels + 1, workers=workers,
+                                  descriptors=self.descriptors)
+            return ((uri.rpartition("/")[2], entry) for uri, entry in entries
+                    if self.__is_shard_uri(uri) and entry.is_file())
+
+        if self.storage == "pack":
+            # Like scan(), the files of the pack stores are not elements of the folders
+            entries = walker.walk(self.folder_root, max_depth=max_depth, workers=workers, descriptors=self.descriptors)
+            return ((uri, entry) for uri, entry in entries if not PackStore.is_internal(entry.name))
+
+        return walker.walk(self.folder_root, max_depth=max_depth, workers=workers, descriptors=self.descriptors)
 
-        return [match.replace(folder_root, "") for match in matches]
+    def __without_internal(self, uris):
+        if self.storage != "pack":
+            return uris
 
-    def __index(self, filename, max_depth):
-        matches = []
+        return (uri for uri in uris if not PackStore.is_internal(uri.rpartition("/")[2]))
 
-        if max_depth == 0:
-            return matches
+    def __is_shard_uri(self, uri):
+        path = uri.split("/")
+        return len(path) == self.shard_levels + 1 and all(self.__is_shard(name) for name in path[:-1])
 
-        for f in self.files():
-            if f == filename:
-                matches.append(os.path.join(self.folder_root, f))
+    def __shard_keys(self, uris):
+        for uri in uris:
+            if self.__is_shard_uri(uri):
+                yield uri.rpartition("/")[2]
 
-        for f, folder in self.folders_items():
-            if f == filename:
-                matches.append(os.path.join(self.folder_root, f))
-            matches += folder.__index(filename, max_depth-1)
 
-        return matches
+from pyfolder.aio import AsyncPyFolder
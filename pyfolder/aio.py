@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+import asyncio
+import functools
+
+from pyfolder import PyFolder
+
+__author__ = "Iván de Paz Centeno"
+
+
+class AsyncPyFolder(object):
+    """
+    Asyncio interface of a PyFolder. Every operation is run in an executor, so the event loop is never blocked by the
+    disk I/O or by the interpretation of the content.
+    """
+
+    def __init__(self, folder, executor=None, max_concurrency=None, **kwargs):
+        """
+        :param folder: PyFolder to wrap, or path to the folder root (a PyFolder is then built with the kwargs).
+        :param executor: concurrent.futures executor running the operations. None for the default one of the loop.
+        :param max_concurrency: maximum number of operations running at the same time. None for no limit.
+        """
+        if not isinstance(folder, PyFolder):
+            folder = PyFolder(folder, **kwargs)
+
+        self.pyfolder = folder
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+
+        # Created on first use, as it must be bound to the running loop.
+        self._semaphore = None
+
+    def __str__(self):
+        return "Async {}".format(self.pyfolder.folder_root)
+
+    def __repr__(self):
+        return str(self)
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Runs a blocking function in the executor, honoring the concurrency limit.
+        """
+        call = functools.partial(function, *args, **kwargs)
+
+        if self.max_concurrency is None:
+            return await asyncio.get_event_loop().run_in_executor(self.executor, call)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            return await asyncio.get_event_loop().run_in_executor(self.executor, call)
+
+    async def get(self, key, default=None):
+        try:
+            return await self.run(self.pyfolder.__getitem__, key)
+        except KeyError:
+            return default
+
+    async def getitem(self, key):
+        return await self.run(self.pyfolder.__getitem__, key)
+
+    async def set(self, key, value):
+        await self.run(self.pyfolder.__setitem__, key, value)
+
+    async def delete(self, key):
+        await self.run(self.pyfolder.__delitem__, key)
+
+    async def contains(self, key):
+        return await self.run(self.pyfolder.__contains__, key)
+
+    async def len(self):
+        return await self.run(self.pyfolder.__len__)
+
+    async def keys(self):
+        return await self.run(list, self.pyfolder)
+
+    async def index(self, filename, **kwargs):
+        return await self.run(self.pyfolder.index, filename, **kwargs)
+
+    async def get_many(self, keys, return_exceptions=False):
+        """
+        Retrieves several elements, overlapping their I/O.
+        :return: list of contents in the same order as the keys. See asyncio.gather() for return_exceptions.
+        """
+        return await asyncio.gather(*[self.getitem(key) for key in keys], return_exceptions=return_exceptions)
+
+    async def set_many(self, items, return_exceptions=False):
+        if isinstance(items, dict):
+            items = items.items()
+
+        return await asyncio.gather(*[self.set(key, value) for key, value in items],
+                                    return_exceptions=return_exceptions)
+
+    async def delete_many(self, keys, return_exceptions=False):
+        return await asyncio.gather(*[self.delete(key) for key in keys], return_exceptions=return_exceptions)
+
+    def __aiter__(self):
+        return self.__iterate(self.pyfolder.__iter__)
+
+    def items(self):
+        return self.__iterate(self.pyfolder.items)
+
+    def files(self):
+        return self.__iterate(self.pyfolder.files)
+
+    def folders(self):
+        return self.__iterate(self.pyfolder.folders)
+
+    def files_items(self):
+        return self.__iterate(self.pyfolder.files_items)
+
+    def folders_items(self):
+        return self.__iterate(self.pyfolder.folders_items)
+
+    async def __iterate(self, generator_function):
+        # Each step of the blocking generator (listing and interpretation included) runs in the executor.
+        finished = object()
+        generator = await self.run(lambda: iter(generator_function()))
+
+        try:
+            while True:
+                element = await self.run(next, generator, finished)
+
+                if element is finished:
+                    break
+
+                yield element
+        finally:
+            await self.run(generator.close)
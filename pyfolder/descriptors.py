@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+__author__ = "Iván de Paz Centeno"
+
+
+def dir_fd_supported():
+    """
+    Checks if the platform supports the operations relative to directory descriptors needed by DirectoryDescriptors.
+    """
+    return os.open in os.supports_dir_fd and os.stat in os.supports_dir_fd and os.unlink in os.supports_dir_fd \
+        and os.mkdir in os.supports_dir_fd and os.scandir in getattr(os, "supports_fd", ())
+
+
+class DirectoryDescriptors(object):
+    """
+    Open descriptors of the folders of a tree.
+
+    The descriptor of the root is pinned for the lifetime of the object, so the tree keeps working if any of its
+    ancestors is renamed. The folders below are opened relative to their closest open ancestor, and their
+    descriptors are kept in a LRU of max_open entries. Descriptors in use are never closed by the eviction.
+    """
+
+    def __init__(self, folder_root, max_open=64):
+        self.folder_root = folder_root
+        self.max_open = max_open
+
+        self._root_fd = None
+        self._descriptors = OrderedDict()    # relative folder -> [descriptor, users]
+        self._lock = threading.Lock()
+
+    def relative(self, path):
+        """
+        Relative folder of a path inside the tree. Paths of the tree are built by joining to its root.
+        """
+        return path[len(self.folder_root):].lstrip(os.sep)
+
+    @contextmanager
+    def folder(self, relative, create=False):
+        """
+        Provides the descriptor of a folder of the tree. It must not be used outside the context.
+        :param relative: relative folder, "" for the root.
+        :param create: create the missing folders of the path.
+        """
+        with self._lock:
+            if self._root_fd is None:
+                self._root_fd = self.__open(self.folder_root, None, create)
+
+            if not relative:
+                # The root is never evicted
+                descriptor = None
+                fd = self._root_fd
+            else:
+                descriptor = self.__acquire(relative, create)
+                fd = descriptor[0]
+
+        try:
+            yield fd
+        finally:
+            if descriptor is not None:
+                with self._lock:
+                    descriptor[1] -= 1
+
+                    if descriptor[1] == 0 and self._descriptors.get(relative) is not descriptor:
+                        # Evicted (or forgotten) while it was in use
+                        os.close(descriptor[0])
+
+                    self.__evict()
+
+    def reopen(self, relative):
+        """
+        Opens a new descriptor of a folder, with a directory position of its own. Listings must use one: the
+        duplicates made by os.scandir() share the position with the original, so overlapping listings of the cached
+        descriptor would corrupt each other.
+        The folder is resolved from the descriptor of the root, without caching the descriptors of the folders in
+        between, so whole trees can be walked without churning the LRU.
+        :return: descriptor, to be closed by the caller.
+        """
+        with self.folder("") as fd:
+            return os.open(relative or ".", os.O_RDONLY | os.O_DIRECTORY, dir_fd=fd)
+
+    @contextmanager
+    def scandir(self, relative):
+        """
+        Lists a folder of the tree through a descriptor of its own (see reopen()). The paths of the entries are only
+        their names.
+        """
+        fd = self.reopen(relative)
+
+        try:
+            iterator = os.scandir(fd)
+        finally:
+            # The iterator holds a duplicate of it
+            os.close(fd)
+
+        with iterator:
+            yield iterator
+
+    def stat(self, relative, follow_symlinks=True):
+        """
+        Stats an element of the tree, resolved from the descriptor of the root.
+        """
+        with self.folder("") as fd:
+            return os.stat(relative or ".", dir_fd=fd, follow_symlinks=follow_symlinks)
+
+    def forget(self, relative):
+        """
+        Closes the descriptors of a folder and of all its subfolders, after they are removed or renamed.
+        """
+        prefix = relative + os.sep
+
+        with self._lock:
+            for key in [key for key in self._descriptors if key == relative or key.startswith(prefix) or not relative]:
+                descriptor = self._descriptors.pop(key)
+
+                if descriptor[1] == 0:
+                    os.close(descriptor[0])
+
+            if not relative and self._root_fd is not None:
+                os.close(self._root_fd)
+                self._root_fd = None
+
+    def close(self):
+        """
+        Closes all the descriptors.
+        """
+        self.forget("")
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __len__(self):
+        return len(self._descriptors)
+
+    @staticmethod
+    def __open(name, dir_fd, create):
+        try:
+            return os.open(name, os.O_RDONLY | os.O_DIRECTORY, dir_fd=dir_fd)
+        except FileNotFoundError:
+            if not create:
+                raise
+
+        try:
+            os.mkdir(name, dir_fd=dir_fd)
+        except FileExistsError:
+            pass
+
+        return os.open(name, os.O_RDONLY | os.O_DIRECTORY, dir_fd=dir_fd)
+
+    def __acquire(self, relative, create):
+        descriptor = self._descriptors.get(relative)
+
+        if descriptor is None:
+            # Opened from the closest ancestor that is already open
+            parent, _, name = relative.rpartition(os.sep)
+
+            if parent:
+                parent_descriptor = self.__acquire(parent, create)
+
+                try:
+                    fd = self.__open(name, parent_descriptor[0], create)
+                finally:
+                    parent_descriptor[1] -= 1
+            else:
+                fd = self.__open(name, self._root_fd, create)
+
+            descriptor = self._descriptors[relative] = [fd, 0]
+
+        self._descriptors.move_to_end(relative)
+        descriptor[1] += 1
+        self.__evict()
+        return descriptor
+
+    def __evict(self):
+        excess = len(self._descriptors) - self.max_open
+
+        if excess <= 0:
+            return
+
+        for key in [key for key, descriptor in self._descriptors.items() if descriptor[1] == 0][:excess]:
+            os.close(self._descriptors.pop(key)[0])
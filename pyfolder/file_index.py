@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+import os
+import sqlite3
+import stat
+import time
+from contextlib import contextmanager
+
+__author__ = "Iván de Paz Centeno"
+
+# Folders modified less than this amount of seconds before being scanned are rescanned on the next refresh, as
+# further changes within the same mtime granularity would not be noticed.
+RACY_SECONDS = 2
+
+
+class FileIndex(object):
+    """
+    Persistent index of the names of a folder tree, stored in a SQLite database.
+
+    It maps every file and folder name to its relative URIs, so that lookups don't need to walk the tree. The index is
+    kept up to date incrementally: only the folders whose mtime changed since the last scan are scanned again.
+    """
+
+    def __init__(self, folder_root, index_file, descriptors=None):
+        """
+        :param folder_root: root of the indexed tree.
+        :param index_file: path of the SQLite database.
+        :param descriptors: DirectoryDescriptors of the tree, to scan it relative to the descriptor of its root
+        instead of by path.
+        """
+        self.folder_root = folder_root
+        self.index_file = index_file
+        self.descriptors = descriptors
+
+        # The database (and its journal) may live inside the indexed tree; in that case they must not be indexed.
+        self._index_folder, self._index_name = os.path.split(os.path.abspath(index_file))
+
+    def exists(self):
+        return os.path.exists(self.index_file)
+
+    def build(self):
+        """
+        Builds the index from scratch, walking the whole tree.
+        """
+        with self.__connect() as connection:
+            connection.execute("DROP TABLE IF EXISTS entries")
+            connection.execute("DROP TABLE IF EXISTS folders")
+            connection.execute("CREATE TABLE entries (name TEXT, uri TEXT PRIMARY KEY, parent TEXT, depth INTEGER)")
+            connection.execute("CREATE TABLE folders (uri TEXT PRIMARY KEY, mtime_ns INTEGER, depth INTEGER)")
+            connection.execute("CREATE INDEX entries_name ON entries (name)")
+            connection.execute("CREATE INDEX entries_parent ON entries (parent)")
+
+            self.__scan_tree(connection, "", 0)
+
+    def refresh(self):
+        """
+        Updates the index by rescanning only the folders that changed since they were last scanned.
+        Every indexed folder is stat'ed, so its cost grows with the amount of folders of the tree (but only the changed
+        ones are read). Builds the index if it does not exist.
+        """
+        if not self.exists():
+            self.build()
+            return
+
+        with self.__connect() as connection:
+            for uri, mtime_ns, depth in connection.execute("SELECT uri, mtime_ns, depth FROM folders").fetchall():
+                try:
+                    folder_stat = self.__stat(uri)
+                    current_mtime_ns = folder_stat.st_mtime_ns if stat.S_ISDIR(folder_stat.st_mode) else None
+                except OSError:
+                    current_mtime_ns = None
+
+                if current_mtime_ns is None:
+                    self.__forget(connection, uri)
+                elif current_mtime_ns != mtime_ns:
+                    self.__scan_folder(connection, uri, depth, rescan=True)
+
+    def lookup(self, name, max_depth=200):
+        """
+        Looks up a file or folder name in the index.
+        :param name: name to look up.
+        :param max_depth: maximum depth of the matches, being 1 the root folder.
+        :return: list of relative URIs of the matches.
+        """
+        with self.__connect() as connection:
+            rows = connection.execute("SELECT uri FROM entries WHERE name = ? AND depth <= ? ORDER BY uri",
+                                      (name, max_depth)).fetchall()
+
+        return [uri for uri, in rows]
+
+    @contextmanager
+    def __connect(self):
+        connection = sqlite3.connect(self.index_file)
+
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def __path(self, uri):
+        return os.path.join(self.folder_root, *uri.split("/")) if uri else self.folder_root
+
+    def __relative(self, uri):
+        return self.descriptors.relative(self.__path(uri))
+
+    def __stat(self, uri):
+        if self.descriptors is None:
+            return os.stat(self.__path(uri))
+
+        return self.descriptors.stat(self.__relative(uri))
+
+    def __scandir(self, uri):
+        if self.descriptors is None:
+            return os.scandir(self.__path(uri))
+
+        return self.descriptors.scandir(self.__relative(uri))
+
+    def __scan_tree(self, connection, uri, depth):
+        pending = [(uri, depth)]
+
+        while pending:
+            uri, depth = pending.pop()
+            pending += self.__scan_folder(connection, uri, depth)
+
+    def __scan_folder(self, connection, uri, depth, rescan=False):
+        path = self.__path(uri)
+        mtime_ns = self.__stat(uri).st_mtime_ns
+        skip_index_files = os.path.abspath(path) == self._index_folder
+
+        if time.time() - mtime_ns / 1e9 < RACY_SECONDS:
+            mtime_ns = None
+
+        known_folders = set()
+
+        if rescan:
+            known_folders = {row[0] for row in connection.execute("SELECT uri FROM folders WHERE uri IN "
+                                                                   "(SELECT uri FROM entries WHERE parent = ?)",
+                                                                   (uri,))}
+            connection.execute("DELETE FROM entries WHERE parent = ?", (uri,))
+
+        rows = []
+        subfolders = []
+
+        with self.__scandir(uri) as iterator:
+            for entry in iterator:
+                if skip_index_files and entry.name.startswith(self._index_name):
+                    continue
+
+                entry_uri = uri + "/" + entry.name if uri else entry.name
+                rows.append((entry.name, entry_uri, uri, depth + 1))
+
+                if entry.is_dir():
+                    subfolders.append(entry_uri)
+
+        connection.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)", rows)
+        connection.execute("INSERT OR REPLACE INTO folders VALUES (?, ?, ?)", (uri, mtime_ns, depth))
+
+        if rescan:
+            # Folders that disappeared are dropped; new ones are scanned entirely.
+            for folder_uri in known_folders.difference(subfolders):
+                self.__forget(connection, folder_uri)
+
+            for folder_uri in set(subfolders).difference(known_folders):
+                self.__scan_tree(connection, folder_uri, depth + 1)
+
+            return []
+
+        return [(folder_uri, depth + 1) for folder_uri in subfolders]
+
+    def __forget(self, connection, uri):
+        pattern = uri.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "/%"
+
+        connection.execute("DELETE FROM entries WHERE parent = ? OR parent LIKE ? ESCAPE '\\'", (uri, pattern))
+        connection.execute("DELETE FROM folders WHERE uri = ? OR uri LIKE ? ESCAPE '\\'", (uri, pattern))
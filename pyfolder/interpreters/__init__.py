@@ -23,12 +23,51 @@
 #OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #SOFTWARE.
 
+import bz2
+import gzip
+import io
 import json
+import lzma
+import mmap
+import os
+import pickle
+import struct
+import sys
+from collections.abc import Iterator
+from contextlib import ExitStack
+from itertools import chain
+
+from pyfolder.interpreters.cache import ContentCache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 __author__ = "Iván de Paz Centeno"
 
 class Interpreter(object):
 
+    # Whether the content loaded by this interpreter can be kept by the ContentCache of the Interpreters.
+    cacheable = True
+
+    # Extensions (without the initial ".") and exact types handled by this interpreter. When declared as tuples by the
+    # same class that defines can_load() (or can_save()), Interpreters dispatches to it through a dictionary lookup, and
+    # they must agree with the predicate. Otherwise (None, mutable lists, or predicates overridden by a subclass), the
+    # interpreter is queried through can_load() and can_save().
+    extensions = None
+    types = None
+
     def can_load(self, extension):
         """
         Checks if the extension matches this interpreter.
@@ -61,66 +100,378 @@ class Interpreter(object):
         """
         pass
 
+    def read(self, stream):
+        """
+        Loads the content from a stream instead of a file. Required to be layered under a CompressedInterpreter.
+        :param stream: binary file-like object, positioned at the beginning of the content.
+        :return: content interpreted.
+        """
+        raise NotImplementedError("{} can't read from streams".format(type(self).__name__))
+
+    def write(self, stream, object):
+        """
+        Saves the object into a stream instead of a file. Required to be layered under a CompressedInterpreter.
+        :param stream: binary file-like object.
+        :param object: object to save
+        """
+        raise NotImplementedError("{} can't write to streams".format(type(self).__name__))
+
 
 class Interpreters(object):
 
-    def __init__(self):
+    def __init__(self, cache=None):
+        """
+        :param cache: optional ContentCache to keep the loaded content between calls.
+        """
         self.interpreter_list = []
+        self.cache = cache
+
+        # Optional pyfolder.stats.Instrumentation recording the loads and saves.
+        self.instrumentation = None
+
+        # Dispatch tables, extension -> position and type -> position of the first interpreter declaring it.
+        # Interpreters that don't declare them are kept apart in order to be queried by their predicates.
+        self._load_table = {}
+        self._save_table = {}
+        self._load_predicates = []
+        self._save_predicates = []
+
+        # Extension -> CompressedInterpreter, applied as layers on top of the rest of interpreters.
+        self._compression_table = {}
+
+    def __getstate__(self):
+        # The cache is local to the process: copies sent to other processes (as in a process pool) don't take it.
+        state = self.__dict__.copy()
+        state["cache"] = None
+        state["instrumentation"] = None
+        return state
 
     def register(self, interpreter):
+        if isinstance(interpreter, CompressedInterpreter):
+            for extension in interpreter.extensions:
+                self._compression_table.setdefault(extension.lower(), interpreter)
+            return
+
+        position = len(self.interpreter_list)
         self.interpreter_list.append(interpreter)
 
+        if self.__declares(interpreter, "extensions", "can_load"):
+            for extension in interpreter.extensions:
+                self._load_table.setdefault(extension.lower(), position)
+        else:
+            self._load_predicates.append(position)
+
+        if self.__declares(interpreter, "types", "can_save"):
+            for object_type in interpreter.types:
+                self._save_table.setdefault(object_type, position)
+        else:
+            self._save_predicates.append(position)
+
+    @staticmethod
+    def __declares(interpreter, attribute, predicate):
+        # The declared values only stand for the predicate if both are defined together, and they can't change once
+        # registered.
+        if not isinstance(getattr(interpreter, attribute), (tuple, frozenset)):
+            return False
+
+        def owner(name):
+            return next(o for o in (interpreter,) + type(interpreter).__mro__ if name in getattr(o, "__dict__", ()))
+
+        return owner(attribute) is owner(predicate)
+
+    def interpreter_for_load(self, extension):
+        """
+        Finds the interpreter that loads the given extension. The first registered interpreter matching it wins.
+        :param extension: extension to load, without the initial ".".
+        :return: the interpreter, or None if none of them matches.
+        """
+        return self.__dispatch(self._load_table.get(extension.lower()), self._load_predicates,
+                               lambda interpreter: interpreter.can_load(extension))
+
+    def interpreter_for_save(self, object, extension=None):
+        """
+        Finds the interpreter that saves the given object. The first registered interpreter matching it wins.
+        :param object: object to save.
+        :param extension: extension of the destination file, if known. The interpreter declaring the extension takes
+        precedence as long as it can save the object (for example, a dict saved into a ".pkl" file is pickled).
+        :return: the interpreter, or None if none of them matches.
+        """
+        position = self._load_table.get(extension.lower()) if extension else None
+
+        if position is not None and self.interpreter_list[position].can_save(object):
+            return self.interpreter_list[position]
+
+        return self.__dispatch(self._save_table.get(type(object)), self._save_predicates,
+                               lambda interpreter: interpreter.can_save(object))
+
+    def __dispatch(self, position, predicates, predicate):
+        # Interpreters registered before the one found in the table still have priority if their predicate matches.
+        for predicate_position in predicates:
+            if position is not None and predicate_position > position:
+                break
+
+            if predicate(self.interpreter_list[predicate_position]):
+                return self.interpreter_list[predicate_position]
+
+        return self.interpreter_list[position] if position is not None else None
+
+    def invalidate(self, uri, recursive=False):
+        """
+        Drops the cached content of the given file (or folder if recursive), if any.
+        """
+        if self.cache is not None:
+            self.cache.invalidate(uri, recursive=recursive)
+
     def load(self, uri):
+        if self.instrumentation is None:
+            return self.__cached_load(uri)
+
+        with self.instrumentation.measure("load") as measure:
+            return self.__cached_load(uri, measure)
+
+    def __cached_load(self, uri, measure=None):
+        if self.cache is None:
+            return self.__load(uri, measure=measure)
+
+        trusted = self.cache.trusted
+
+        if trusted:
+            # The changes of the files are reported by a watcher, no need to stat them
+            found, result = self.cache.get(uri, None)
+
+            if found:
+                if measure is not None:
+                    measure.interpreter = "cache"
+                return result
+
         try:
-            extension = uri.split(".")[-1]
-        except IndexError as ex:
-            extension = ""
+            signature = self.cache.signature(uri)
+        except OSError:
+            # Let the interpreters report the error
+            return self.__load(uri, measure=measure)
 
-        loaded = False
-        result = b""
+        if not trusted:
+            found, result = self.cache.get(uri, signature)
 
-        for interpreter in self.interpreter_list:
-            if interpreter.can_load(extension):
-                error = None
-                try:
-                    result = interpreter.load(uri)
-                    loaded = True
+            if found and measure is not None:
+                measure.interpreter = "cache"
 
-                except Exception as ex:
-                    error = str(ex)
+        if not found:
+            result, interpreter = self.__load(uri, return_interpreter=True, measure=measure)
 
-                if error:
-                    raise Exception("Error loading file \"{}\": {}".format(uri, error))
+            if interpreter.cacheable:
+                result = self.cache.put(uri, signature, result)
 
+        return result
+
+    def split_extension(self, uri):
+        """
+        Splits the extensions of the file name of an URI into the compression layers and the extension of the content.
+        For example, "data.json.gz" is split into ([gzip interpreter], "json") if a gzip interpreter is registered.
+        :param uri: URI of the file.
+        :return: tuple (list of CompressedInterpreter from the outermost to the innermost, extension of the content)
+        """
+        parts = os.path.basename(uri).split(".")
+        layers = []
+
+        while len(parts) > 2 or (len(parts) == 2 and parts[0]):
+            layer = self._compression_table.get(parts[-1].lower())
+
+            if layer is None:
                 break
 
-        if not loaded:
+            layers.append(layer)
+            parts.pop()
+
+        return layers, parts[-1] if len(parts) > 1 else ""
+
+    def read(self, stream, uri):
+        """
+        Loads the content of a stream, interpreting it as the file of the given URI (by its extensions).
+        :param stream: binary file-like object.
+        :param uri: URI (or file name) from which the interpreter is chosen.
+        :return: content interpreted.
+        """
+        if self.instrumentation is None:
+            return self.__read(stream, uri)[0]
+
+        with self.instrumentation.measure("read") as measure:
+            start = self.__position(stream)
+            result, interpreter = self.__read(stream, uri)
+            measure.interpreter = type(interpreter).__name__
+            measure.bytes_read += self.__io_bytes(stream, start)
+            return result
+
+    def write(self, stream, uri, object):
+        """
+        Saves the object into a stream, encoding it as the file of the given URI (by its extensions).
+        :param stream: binary file-like object.
+        :param uri: URI (or file name) from which the compression layers are chosen.
+        :param object: object to save.
+        """
+        if self.instrumentation is None:
+            self.__write(stream, uri, object)
+            return
+
+        with self.instrumentation.measure("write") as measure:
+            start = self.__position(stream)
+            measure.interpreter = type(self.__write(stream, uri, object)).__name__
+            measure.bytes_written += self.__io_bytes(stream, start)
+
+    @staticmethod
+    def __position(stream):
+        # In-memory buffers (like the values of the pack storage) are not I/O: their bytes are counted by their owner.
+        if isinstance(stream, io.BytesIO):
+            return None
+
+        try:
+            return stream.tell()
+        except (AttributeError, OSError, ValueError):
+            return None
+
+    @classmethod
+    def __io_bytes(cls, stream, start):
+        end = cls.__position(stream) if start is not None else None
+        return end - start if end is not None else 0
+
+    def __write(self, stream, uri, object):
+        layers, extension = self.split_extension(uri)
+        interpreter = self.interpreter_for_save(object, extension)
+
+        if interpreter is None:
+            raise Exception("Can't save the object \"{}\": {}".format(object, "Unknown type"))
+
+        with ExitStack() as stack:
+            for layer in layers:
+                stream = stack.enter_context(layer.open(stream, "wb"))
+
+            interpreter.write(stream, object)
+
+        return interpreter
+
+    def __read(self, stream, uri):
+        layers, extension = self.split_extension(uri)
+        interpreter = self.interpreter_for_load(extension)
+
+        if interpreter is None:
             raise FileNotFoundError(uri)
 
+        return self.__read_layers(stream, layers, interpreter), interpreter
+
+    @staticmethod
+    def __read_layers(stream, layers, interpreter):
+        with ExitStack() as stack:
+            for layer in layers:
+                stream = stack.enter_context(layer.open(stream, "rb"))
+
+            return interpreter.read(stream)
+
+    def __load(self, uri, return_interpreter=False, measure=None):
+        layers, extension = self.split_extension(uri)
+        interpreter = self.interpreter_for_load(extension)
+
+        if interpreter is None:
+            raise FileNotFoundError(uri)
+
+        error = None
+        try:
+            if layers:
+                with open(uri, "rb") as f:
+                    result = self.__read_layers(f, layers, interpreter)
+            else:
+                result = interpreter.load(uri)
+        except Exception as ex:
+            error = str(ex)
+
+        if error:
+            raise Exception("Error loading file \"{}\": {}".format(uri, error))
+
+        if measure is not None:
+            measure.interpreter = type(interpreter).__name__
+            measure.files_opened += 1
+            measure.bytes_read += os.path.getsize(uri)
+
+        if return_interpreter:
+            return result, interpreter
+
         return result
 
     def save(self, uri, object):
-        saved = False
+        if self.instrumentation is None:
+            self.__save(uri, object)
+            return
 
-        for interpreter in self.interpreter_list:
-            if interpreter.can_save(object):
-                error = None
-                try:
-                    result = interpreter.save(uri, object)
-                    saved = True
-                except Exception as ex:
-                    error = str(ex)
+        with self.instrumentation.measure("save") as measure:
+            measure.interpreter = type(self.__save(uri, object)).__name__
+            measure.files_opened += 1
+            measure.bytes_written += os.path.getsize(uri)
 
-                if error:
-                    raise Exception("Error saving file \"{}\": {}".format(uri, error))
-
-                break
+    def __save(self, uri, object):
+        self.invalidate(uri)
+        layers, extension = self.split_extension(uri)
+        interpreter = self.interpreter_for_save(object, extension)
 
-        if not saved:
+        if interpreter is None:
             raise Exception("Can't save the object \"{}\": {}".format(object, "Unknown type"))
 
+        error = None
+        try:
+            if layers:
+                with open(uri, "wb") as f:
+                    # Not measured on its own: the save already counts the bytes of the file
+                    self.__write(f, uri, object)
+            else:
+                interpreter.save(uri, object)
+        except Exception as ex:
+            error = str(ex)
+
+        if error:
+            raise Exception("Error saving file \"{}\": {}".format(uri, error))
+
+        return interpreter
+
+
+def map_file(uri):
+    """
+    Maps a file into memory, read-only. Its pages are loaded lazily on access and shared with other processes mapping
+    the same file through the page cache.
+    The returned mmap supports slicing and the buffer protocol (memoryview(m) is zero-copy), and must be closed when no
+    longer needed, preferably by using it as a context manager.
+    :param uri: path to the file.
+    :return: mmap object, or an empty read-only memoryview if the file is empty (empty files can't be mapped). Both
+    can be used as context managers.
+    """
+    with open(uri, "rb") as f:
+        return map_open_file(f)
+
+
+def map_open_file(f):
+    """
+    Maps a file already open for reading, as map_file() does. The mapping outlives the file object.
+    :param f: file object with a descriptor.
+    :return: mmap object, or an empty read-only memoryview if the file is empty.
+    """
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(b"")
+        raise
+
 
 class BinaryInterpreter(Interpreter):
+    types = (bytes,)
+
+    def __init__(self, use_mmap=False):
+        """
+        :param use_mmap: if set, files are loaded as read-only mmap objects instead of being read into memory.
+        See map_file() for their lifetime.
+        """
+        self.use_mmap = use_mmap
+
+        # Mapped files are bound to their file descriptor, they can't be cached.
+        self.cacheable = not use_mmap
+
     def can_load(self, extension):
         # The binary interpreter matches any extension
         return True
@@ -130,6 +481,9 @@ class BinaryInterpreter(Interpreter):
         return type(object) is bytes
 
     def load(self, uri):
+        if self.use_mmap:
+            return map_file(uri)
+
         with open(uri, "rb") as f:
             content = f.read()
         return content
@@ -138,30 +492,102 @@ class BinaryInterpreter(Interpreter):
         with open(uri, "wb") as f:
             f.write(object)
 
+    def read(self, stream):
+        return stream.read()
+
+    def write(self, stream, object):
+        stream.write(object)
+
 
 class JSONInterpreter(Interpreter):
+    # Any extension ending in "json" is matched (as in "geojson"), so it is dispatched through can_load().
+    types = (dict, list)
+
+    def __init__(self, indent=4, backend="auto"):
+        """
+        :param indent: indentation of the saved files. None for compact output (smaller and faster to encode).
+        :param backend: JSON library to use: "json" (standard library), "orjson", "ujson", or "auto" for the fastest
+        one installed. The fast backends fall back to the standard library for what they can't handle (like integers
+        over 64 bits), and orjson is only used to encode when the indent is None or 2, the ones it supports.
+        Note that, unlike the standard library, orjson and ujson encode NaN and infinite floats as null.
+        """
+        if backend == "auto":
+            backend = "orjson" if orjson is not None else "ujson" if ujson is not None else "json"
+
+        if backend not in ("json", "orjson", "ujson"):
+            raise Exception("Unknown JSON backend {}".format(backend))
+
+        if {"orjson": orjson, "ujson": ujson}.get(backend, json) is None:
+            raise Exception("JSON backend {} is not installed".format(backend))
+
+        self.indent = indent
+        self.backend = backend
+
     def can_load(self, extension):
         return extension.lower().endswith("json")
 
     def can_save(self, object):
         return type(object) is dict or type(object) is list
 
+    def loads(self, data):
+        """
+        Decodes a JSON document.
+        :param data: encoded document, as bytes.
+        """
+        try:
+            if self.backend == "orjson":
+                return orjson.loads(data)
+
+            if self.backend == "ujson":
+                return ujson.loads(data)
+        except ValueError:
+            pass
+
+        return json.loads(data)
+
+    def dumps(self, object):
+        """
+        Encodes an object as a JSON document.
+        :return: encoded document, as bytes.
+        """
+        try:
+            if self.backend == "orjson" and self.indent in (None, 2):
+                return orjson.dumps(object, option=orjson.OPT_INDENT_2 if self.indent else 0)
+
+            if self.backend == "ujson":
+                return ujson.dumps(object, indent=self.indent or 0, escape_forward_slashes=False).encode("utf-8")
+        except (TypeError, ValueError, OverflowError):
+            pass
+
+        separators = (",", ":") if self.indent is None else None
+        return json.dumps(object, indent=self.indent, separators=separators).encode("utf-8")
+
     def load(self, uri):
-        with open(uri, "r") as f:
-            content = json.load(f)
+        # Read as bytes: the parsers decode them on their own
+        with open(uri, "rb") as f:
+            content = self.loads(f.read())
         return content
 
     def save(self, uri, object):
-        with open(uri, "w") as f:
-            json.dump(object, f, indent=4)
+        content = self.dumps(object)
+
+        with open(uri, "wb") as f:
+            f.write(content)
+
+    def read(self, stream):
+        return self.loads(stream.read())
+
+    def write(self, stream, object):
+        stream.write(self.dumps(object))
 
 
 class TextInterpreter(Interpreter):
-    def __init__(self):
-        self.extensions = ["txt", "csv", "conf", "ini"]
+    # Subclasses handle more extensions by declaring their own tuple.
+    extensions = ("txt", "csv", "conf", "ini")
+    types = (str,)
 
     def can_load(self, extension):
-        return any([extension.lower() == e for e in self.extensions])
+        return extension.lower() in self.extensions
 
     def can_save(self, object):
         # The binary interpreter can only save bytes objects
@@ -175,3 +601,324 @@ class TextInterpreter(Interpreter):
     def save(self, uri, object):
         with open(uri, "w") as f:
             f.write(object)
+
+    def read(self, stream):
+        text_stream = io.TextIOWrapper(stream)
+
+        try:
+            return text_stream.read()
+        finally:
+            text_stream.detach()
+
+    def write(self, stream, object):
+        text_stream = io.TextIOWrapper(stream)
+
+        try:
+            text_stream.write(object)
+            text_stream.flush()
+        finally:
+            text_stream.detach()
+
+
+class NumpyInterpreter(Interpreter):
+    """
+    Saves NumPy arrays as .npy files (or .npz if the file name says so) and loads them back, optionally memory-mapped.
+    Dicts of arrays (by name) can be saved into .npz files, and are loaded back as dicts. A single array saved into a
+    .npz file is stored under the name "arr_0", and loaded back as the array.
+    Only usable if NumPy is installed: check it with NumpyInterpreter.available().
+    """
+    # Subclasses of ndarray (like the memmap of the mapped files) and dicts of arrays are matched through can_save().
+    extensions = ("npy", "npz")
+
+    def __init__(self, mmap_mode=None):
+        """
+        :param mmap_mode: mode to memory-map the .npy files ("r", "r+", "c"), as in numpy.load(). Mapped arrays are
+        paged in lazily instead of being read. None to read them into memory.
+        """
+        if numpy is None:
+            raise Exception("NumPy is not installed")
+
+        self.mmap_mode = mmap_mode
+
+        # Mapped arrays are bound to their file, they can't be cached.
+        self.cacheable = mmap_mode is None
+
+    @staticmethod
+    def available():
+        return numpy is not None
+
+    def can_load(self, extension):
+        return extension.lower() in self.extensions
+
+    def can_save(self, object):
+        return isinstance(object, numpy.ndarray) or self.__is_archive(object)
+
+    @staticmethod
+    def __is_archive(object):
+        return isinstance(object, dict) and len(object) > 0 and \
+            all(isinstance(name, str) and isinstance(array, numpy.ndarray) for name, array in object.items())
+
+    def load(self, uri):
+        if uri.lower().endswith(".npz"):
+            with open(uri, "rb") as f:
+                return self.read(f)
+
+        return numpy.load(uri, mmap_mode=self.mmap_mode, allow_pickle=False)
+
+    def save(self, uri, object):
+        is_archive = uri.lower().endswith(".npz")
+
+        if not is_archive and isinstance(object, dict):
+            raise Exception("Dicts of arrays can only be saved into .npz files")
+
+        with open(uri, "wb") as f:
+            if is_archive and not isinstance(object, dict):
+                numpy.savez(f, object)
+            else:
+                self.write(f, object)
+
+    def read(self, stream):
+        content = numpy.load(stream, allow_pickle=False)
+
+        if isinstance(content, numpy.lib.npyio.NpzFile):
+            # The arrays of .npz files are read eagerly, as the archive is bound to the stream.
+            with content:
+                content = {name: content[name] for name in content.files}
+
+            if list(content) == ["arr_0"]:
+                content = content["arr_0"]
+
+        return content
+
+    def write(self, stream, object):
+        if isinstance(object, dict):
+            numpy.savez(stream, **object)
+        else:
+            numpy.save(stream, object, allow_pickle=False)
+
+
+class RestrictedUnpickler(pickle.Unpickler):
+    """
+    Unpickler that only builds the classes of an allowlist, so that loading a tampered file can't execute arbitrary
+    code through the reconstruction of other classes.
+    """
+
+    def __init__(self, file, allowed_classes, **kwargs):
+        super().__init__(file, **kwargs)
+        self.allowed_classes = allowed_classes
+
+    def find_class(self, module, name):
+        if self.allowed_classes is not None and "{}.{}".format(module, name) not in self.allowed_classes:
+            raise pickle.UnpicklingError("Class {}.{} is not allowed to be unpickled".format(module, name))
+
+        return super().find_class(module, name)
+
+
+class PickleInterpreter(Interpreter):
+    """
+    Saves any Python object into .pkl files with the pickle protocol 5.
+
+    Objects pickling their memory as pickle.PickleBuffer (like NumPy arrays) are written out-of-band: their memory is
+    written straight to the file after the pickle stream, without intermediate copies, and handed back as writable
+    buffers when loading.
+
+    Unpickling can execute arbitrary code. Never load .pkl files from untrusted sources. As a safeguard, only a set of
+    harmless builtin classes (SAFE_CLASSES) plus the given allowed_classes are built when loading; trust_all disables
+    this restriction entirely.
+
+    Standard pickle files (written by pickle.dump(), for example) are also loaded, with the same restriction.
+
+    It is only chosen for files with the .pkl extension, never by the type of the object. Requires Python 3.8 onwards.
+    """
+    extensions = ("pkl",)
+    types = ()
+
+    MAGIC = b"PYFPKL5\n"
+    SAFE_CLASSES = frozenset("builtins." + name for name in [
+        "set", "frozenset", "complex", "bytearray", "bytes", "range", "slice", "list", "dict", "tuple", "int",
+        "float", "str", "bool"
+    ]).union([
+        "collections.OrderedDict", "collections.deque", "collections.Counter", "collections.defaultdict",
+        "datetime.date", "datetime.datetime", "datetime.time", "datetime.timedelta", "datetime.timezone",
+        "decimal.Decimal", "fractions.Fraction", "uuid.UUID"
+    ])
+
+    def __init__(self, allowed_classes=(), trust_all=False):
+        """
+        :param allowed_classes: additional classes allowed to be unpickled, either as classes or as "module.name".
+        :param trust_all: if set, any class can be unpickled. Only for files from trusted sources.
+        """
+        if sys.version_info < (3, 8):
+            raise Exception("The pickle protocol 5 requires Python 3.8 onwards")
+
+        self.allowed_classes = None if trust_all else self.SAFE_CLASSES.union(
+            c if isinstance(c, str) else "{}.{}".format(c.__module__, c.__qualname__) for c in allowed_classes)
+
+    def can_load(self, extension):
+        return extension.lower() in self.extensions
+
+    def can_save(self, object):
+        return True
+
+    def load(self, uri):
+        with open(uri, "rb") as f:
+            return self.read(f)
+
+    def save(self, uri, object):
+        with open(uri, "wb") as f:
+            self.write(f, object)
+
+    def read(self, stream):
+        header = stream.read(len(self.MAGIC) + 12)
+
+        if not header.startswith(self.MAGIC):
+            # A standard pickle stream, without out-of-band buffers
+            if stream.seekable():
+                stream.seek(-len(header), io.SEEK_CUR)
+            else:
+                stream = io.BytesIO(header + stream.read())
+
+            return RestrictedUnpickler(stream, self.allowed_classes).load()
+
+        buffer_count, data_size = struct.unpack("<IQ", header[len(self.MAGIC):])
+        sizes = struct.unpack("<{}Q".format(buffer_count), stream.read(8 * buffer_count))
+        data = stream.read(data_size)
+
+        # A single writable block for all the buffers, sliced without copies.
+        block = bytearray(sum(sizes))
+        view = memoryview(block)
+        read = 0
+        while read < len(block):
+            chunk_read = stream.readinto(view[read:])
+            if not chunk_read:
+                raise Exception("Truncated pickle file")
+            read += chunk_read
+
+        buffers = []
+        offset = 0
+        for size in sizes:
+            buffers.append(view[offset:offset + size])
+            offset += size
+
+        return RestrictedUnpickler(io.BytesIO(data), self.allowed_classes, buffers=buffers).load()
+
+    def write(self, stream, object):
+        buffers = []
+
+        def buffer_callback(buffer):
+            # Non-contiguous buffers can't be exposed raw: they are kept in-band.
+            try:
+                buffers.append(buffer.raw())
+            except BufferError:
+                return True
+            return False
+
+        data = pickle.dumps(object, protocol=5, buffer_callback=buffer_callback)
+
+        stream.write(self.MAGIC + struct.pack("<IQ", len(buffers), len(data)))
+        stream.write(struct.pack("<{}Q".format(len(buffers)), *[buffer.nbytes for buffer in buffers]))
+        stream.write(data)
+
+        for buffer in buffers:
+            stream.write(buffer)
+
+
+class StreamInterpreter(Interpreter):
+    """
+    Saves file-like objects (anything with a read() method) and iterators of chunks (like generators) incrementally,
+    so their content never needs to be held in memory at once. Chunks can be either bytes or str.
+    It does not load files: use PyFolder.open() or PyFolder.read_chunks() to read them as streams.
+    """
+    # Never selected for loading
+    extensions = ()
+
+    def __init__(self, chunk_size=1024*1024):
+        self.chunk_size = chunk_size
+
+    def can_load(self, extension):
+        return False
+
+    def can_save(self, object):
+        return hasattr(object, "read") or isinstance(object, Iterator)
+
+    def save(self, uri, object):
+        with open(uri, "wb") as f:
+            self.write(f, object)
+
+    def write(self, stream, object):
+        if hasattr(object, "read"):
+            chunks = iter(lambda: object.read(self.chunk_size), object.read(0))
+        else:
+            chunks = object
+
+        first_chunk = next(chunks, b"")
+        text_stream = io.TextIOWrapper(stream) if type(first_chunk) is str else None
+
+        try:
+            for chunk in chain([first_chunk], chunks):
+                (text_stream or stream).write(chunk)
+        finally:
+            if text_stream is not None:
+                text_stream.flush()
+                text_stream.detach()
+
+
+class CompressedInterpreter(Interpreter):
+    """
+    Layer that transparently compresses the content saved by the rest of interpreters, for files with a compound
+    extension like "data.json.gz" or "log.txt.xz". The content is compressed and decompressed as a stream.
+    The interpreter of the content is chosen as usual (by the inner extension when loading, by the object type when
+    saving), and it must implement read() and write().
+    """
+    types = ()
+
+    def __init__(self, level):
+        """
+        :param level: compression level.
+        """
+        self.level = level
+
+    def can_load(self, extension):
+        return extension.lower() in self.extensions
+
+    def can_save(self, object):
+        return False
+
+    def open(self, stream, mode):
+        """
+        Opens a compressed file object over a binary stream.
+        :param stream: underlying binary stream. It is not closed when the returned file object is closed.
+        :param mode: "rb" or "wb".
+        :return: file object.
+        """
+        pass
+
+
+class GzipInterpreter(CompressedInterpreter):
+    extensions = ("gz",)
+
+    def __init__(self, level=9):
+        super().__init__(level)
+
+    def open(self, stream, mode):
+        return gzip.GzipFile(fileobj=stream, mode=mode, compresslevel=self.level)
+
+
+class BZ2Interpreter(CompressedInterpreter):
+    extensions = ("bz2",)
+
+    def __init__(self, level=9):
+        super().__init__(level)
+
+    def open(self, stream, mode):
+        return bz2.BZ2File(stream, mode=mode, compresslevel=self.level)
+
+
+class LZMAInterpreter(CompressedInterpreter):
+    extensions = ("xz",)
+
+    def __init__(self, level=6):
+        super().__init__(level)
+
+    def open(self, stream, mode):
+        return lzma.LZMAFile(stream, mode=mode, preset=self.level if "w" in mode else None)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+__author__ = "Iván de Paz Centeno"
+
+IMMUTABLE_TYPES = (str, bytes, int, float, complex, bool, type(None), frozenset)
+
+
+class ContentCache(object):
+    """
+    LRU cache for the content loaded by the interpreters.
+
+    Entries are keyed by the absolute path of the file and validated against its (inode, size, mtime_ns) signature
+    on every access, so a file modified externally is never served stale. The size of the file on disk is used as the
+    cost of an entry; the least recently used entries are evicted when the sum exceeds `max_bytes`.
+
+    Cached values are shared between accesses. In order to avoid callers corrupting them, mutable values (dicts and
+    lists loaded by the JSONInterpreter, for example) are deep-copied when returned if `copy_on_return` is set
+    (default). If it is unset, the cached object itself is returned and it must be treated as read-only by the caller.
+
+    While the cache is `trusted`, the entries are served without validating their signature. This is only safe while
+    every change of the files is reported through invalidate(), as a folder watcher does. Each trust() must be paired
+    with an untrust(): the cache is trusted while any of them is pending. The entries cached before a trust() are
+    dropped, as the changes that happened before it were not reported.
+    """
+
+    def __init__(self, max_bytes=64*1024*1024, copy_on_return=True):
+        self.max_bytes = max_bytes
+        self.copy_on_return = copy_on_return
+        self._trust_count = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def trusted(self):
+        return self._trust_count > 0
+
+    def trust(self):
+        """
+        Serves the entries without validating their signatures, until the matching untrust(). It must be called once
+        the changes are being reported: the entries cached until then are dropped.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self._trust_count += 1
+
+    def untrust(self):
+        with self._lock:
+            self._trust_count = max(0, self._trust_count - 1)
+
+    @staticmethod
+    def signature(uri):
+        """
+        Retrieves the signature used to validate the cached content of a file.
+        :param uri: path to the file.
+        :return: tuple (inode, size, mtime_ns)
+        """
+        stat = os.stat(uri)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def get(self, uri, signature):
+        """
+        Retrieves the content cached for the given file.
+        :param uri: path to the file.
+        :param signature: current signature of the file, as returned by signature(). None to skip the validation.
+        :return: tuple (found, content). Content is None if not found.
+        """
+        key = os.path.abspath(uri)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or (signature is not None and entry[0] != signature):
+                if entry is not None:
+                    self.__remove(key)
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            content = entry[1]
+
+        return True, self.__copy(content)
+
+    def put(self, uri, signature, content):
+        """
+        Stores the content of a file. Files bigger than the byte budget are not stored.
+        :param uri: path to the file.
+        :param signature: signature of the file when the content was read.
+        :param content: content to cache.
+        :return: the content to hand to the caller.
+        """
+        key = os.path.abspath(uri)
+        size = signature[1]
+
+        if size > self.max_bytes:
+            return content
+
+        with self._lock:
+            if key in self._entries:
+                self.__remove(key)
+
+            self._entries[key] = (signature, content)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                self.__remove(next(iter(self._entries)))
+                self.evictions += 1
+
+        return self.__copy(content)
+
+    def invalidate(self, uri, recursive=False):
+        """
+        Drops the content cached for a file.
+        :param uri: path to the file.
+        :param recursive: if True, everything cached under the path (considered a folder) is also dropped.
+        """
+        key = os.path.abspath(uri)
+
+        with self._lock:
+            if key in self._entries:
+                self.__remove(key)
+
+            if recursive:
+                prefix = os.path.join(key, "")
+                for child in [k for k in self._entries if k.startswith(prefix)]:
+                    self.__remove(child)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """
+        Retrieves the counters of the cache.
+        :return: dict with the hits, misses, evictions, entries and bytes of the cache.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def __remove(self, key):
+        signature, _ = self._entries.pop(key)
+        self.current_bytes -= signature[1]
+
+    def __copy(self, content):
+        if not self.copy_on_return or isinstance(content, IMMUTABLE_TYPES):
+            return content
+
+        return copy.deepcopy(content)
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+import os
+import struct
+import threading
+
+__author__ = "Iván de Paz Centeno"
+
+PACK_PREFIX = ".pyfolder.pack"
+INDEX_NAME = PACK_PREFIX + ".idx"
+
+# Records of the index log: a one-byte operation followed by its fields and the UTF-8 encoded key (or file name).
+#   F: data file in use, (name length), name. Always the first record of the log.
+#   S: set, (key length, offset, size), key.
+#   D: delete, (key length), key.
+RECORD_FORMATS = {b"F": struct.Struct("<H"), b"S": struct.Struct("<HQQ"), b"D": struct.Struct("<H")}
+
+
+class PackStore(object):
+    """
+    Append-only storage of small values inside a folder.
+
+    The values are appended to a single data file, and an index log (also append-only) records the offset and size of
+    each key. Overwritten and deleted values leave dead space behind, which compact() reclaims by rewriting the live
+    values into a new data file.
+
+    The index is replayed from the log on first use, and again whenever the log grows or is replaced, so several
+    PackStore instances (and processes) over the same folder see each other's writes. Writes must come from a single
+    process at a time.
+    """
+
+    def __init__(self, folder_root):
+        self.folder_root = folder_root
+        self.index_path = os.path.join(folder_root, INDEX_NAME)
+
+        self._entries = {}
+        self._data_name = None
+        self._index_signature = None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def is_internal(name):
+        """
+        Checks if a file name belongs to the files of the store.
+        """
+        return name.startswith(PACK_PREFIX)
+
+    def __len__(self):
+        with self._lock:
+            self.__refresh()
+            return len(self._entries)
+
+    def __iter__(self):
+        with self._lock:
+            self.__refresh()
+            return iter(list(self._entries))
+
+    def __contains__(self, key):
+        with self._lock:
+            self.__refresh()
+            return key in self._entries
+
+    def get(self, key):
+        """
+        Retrieves the raw value of a key.
+        :return: bytes of the value.
+        """
+        with self._lock:
+            self.__refresh()
+            offset, size = self._entries[key]
+
+            # Opened under the lock, so a concurrent compact() can't remove the data file before. Once open, the file
+            # remains readable even if it is removed.
+            f = open(os.path.join(self.folder_root, self._data_name), "rb")
+
+        with f:
+            f.seek(offset)
+            return f.read(size)
+
+    def items(self):
+        """
+        Retrieves the raw values of every key, reading the data file once and in order.
+        :return: generator of (key, bytes) tuples.
+        """
+        with self._lock:
+            self.__refresh()
+
+            if self._data_name is None:
+                return
+
+            entries = sorted(self._entries.items(), key=lambda entry: entry[1][0])
+            f = open(os.path.join(self.folder_root, self._data_name), "rb")
+
+        with f:
+            for key, (offset, size) in entries:
+                f.seek(offset)
+                yield key, f.read(size)
+
+    def size(self, key):
+        """
+        :return: size in bytes of the raw value of a key.
+        """
+        with self._lock:
+            self.__refresh()
+            return self._entries[key][1]
+
+    def put(self, key, data):
+        """
+        Stores the raw value of a key, replacing the previous one.
+        :param data: bytes of the value.
+        """
+        with self._lock:
+            self.__refresh()
+
+            if self._data_name is None:
+                self.__start(PACK_PREFIX + ".0")
+
+            with open(os.path.join(self.folder_root, self._data_name), "ab") as f:
+                offset = f.tell()
+                f.write(data)
+
+            self.__append(b"S", key, offset, len(data))
+            self._entries[key] = (offset, len(data))
+
+    def delete(self, key):
+        """
+        Removes a key.
+        :return: True if the key existed, False otherwise.
+        """
+        with self._lock:
+            self.__refresh()
+
+            if key not in self._entries:
+                return False
+
+            self.__append(b"D", key)
+            del self._entries[key]
+            return True
+
+    def stats(self):
+        """
+        :return: dict with the amount of keys, the bytes of live values and the total bytes of the data file.
+        """
+        with self._lock:
+            self.__refresh()
+            data_bytes = os.path.getsize(os.path.join(self.folder_root, self._data_name)) if self._data_name else 0
+
+            return {
+                "keys": len(self._entries),
+                "live_bytes": sum(size for _, size in self._entries.values()),
+                "data_bytes": data_bytes,
+            }
+
+    def compact(self):
+        """
+        Rewrites the live values into a new data file, reclaiming the space of the overwritten and deleted ones.
+        The new index replaces the old one atomically.
+        """
+        with self._lock:
+            self.__refresh()
+
+            if self._data_name is None:
+                return
+
+            old_data_path = os.path.join(self.folder_root, self._data_name)
+            generation = int(self._data_name.rpartition(".")[2]) + 1
+            new_data_name = "{}.{}".format(PACK_PREFIX, generation)
+            new_entries = {}
+
+            with open(old_data_path, "rb") as source, \
+                    open(os.path.join(self.folder_root, new_data_name), "wb") as destination:
+                for key, (offset, size) in self._entries.items():
+                    source.seek(offset)
+                    new_entries[key] = (destination.tell(), size)
+                    destination.write(source.read(size))
+
+            temporary_index_path = self.index_path + ".tmp"
+
+            with open(temporary_index_path, "wb") as f:
+                f.write(self.__record(b"F", new_data_name))
+
+                for key, (offset, size) in new_entries.items():
+                    f.write(self.__record(b"S", key, offset, size))
+
+            os.replace(temporary_index_path, self.index_path)
+            os.remove(old_data_path)
+
+            self._entries = new_entries
+            self._data_name = new_data_name
+            self._index_signature = None
+            self.__refresh()
+
+    def destroy(self):
+        """
+        Removes the files of the store, which must not hold any key.
+        """
+        with self._lock:
+            self.__refresh()
+
+            if self._entries:
+                raise Exception("The pack of {} still holds values".format(self.folder_root))
+
+            for name in os.listdir(self.folder_root):
+                if self.is_internal(name):
+                    os.remove(os.path.join(self.folder_root, name))
+
+            self._entries = {}
+            self._data_name = None
+            self._index_signature = None
+
+    def __start(self, data_name):
+        open(os.path.join(self.folder_root, data_name), "ab").close()
+        self.__append(b"F", data_name)
+        self._data_name = data_name
+
+    @staticmethod
+    def __record(operation, name, *fields):
+        encoded_name = name.encode("utf-8")
+        return operation + RECORD_FORMATS[operation].pack(len(encoded_name), *fields) + encoded_name
+
+    def __append(self, operation, name, *fields):
+        with open(self.index_path, "ab") as f:
+            f.write(self.__record(operation, name, *fields))
+
+        stat = os.stat(self.index_path)
+        self._index_signature = (stat.st_ino, stat.st_size)
+
+    def __refresh(self):
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            self._entries = {}
+            self._data_name = None
+            self._index_signature = None
+            return
+
+        signature = self._index_signature
+
+        if signature == (stat.st_ino, stat.st_size):
+            return
+
+        if signature is None or signature[0] != stat.st_ino or signature[1] > stat.st_size:
+            # New or replaced (compacted) index: replay it entirely
+            self._entries = {}
+            self._data_name = None
+            position = 0
+        else:
+            position = signature[1]
+
+        with open(self.index_path, "rb") as f:
+            f.seek(position)
+            log = f.read()
+
+        position += self.__replay(log)
+        self._index_signature = (stat.st_ino, position)
+
+    def __replay(self, log):
+        position = 0
+
+        while position < len(log):
+            operation = log[position:position + 1]
+            record_format = RECORD_FORMATS.get(operation)
+
+            if record_format is None or position + 1 + record_format.size > len(log):
+                break
+
+            fields = record_format.unpack_from(log, position + 1)
+            name_start = position + 1 + record_format.size
+            name_end = name_start + fields[0]
+
+            if name_end > len(log):
+                # Record being written (or truncated by a crash)
+                break
+
+            name = log[name_start:name_end].decode("utf-8")
+
+            if operation == b"F":
+                self._data_name = name
+            elif operation == b"S":
+                self._entries[name] = fields[1:]
+            else:
+                self._entries.pop(name, None)
+
+            position = name_end
+
+        return position
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+
+__author__ = "Iván de Paz Centeno"
+
+
+def map_ordered(function, arguments, max_workers=None, return_exceptions=False):
+    """
+    Applies a function to every argument in a pool of threads, keeping the order of the results.
+    :param function: function to apply. It receives a single argument.
+    :param arguments: iterable of arguments.
+    :param max_workers: maximum number of threads. None for the default of ThreadPoolExecutor.
+    :param return_exceptions: if set, the exception raised for an argument is returned in its position of the results.
+    Otherwise, the first exception (in order of the arguments) is raised once all of them finish.
+    :return: list of results, in the same order as the arguments.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(function, argument) for argument in arguments]
+
+    results = []
+
+    for future in futures:
+        exception = future.exception()
+
+        if exception is None:
+            results.append(future.result())
+        elif return_exceptions:
+            results.append(exception)
+        else:
+            raise exception
+
+    return results
+
+
+def imap_chunked(function, arguments, executor, chunk_size=16, ordered=True, max_pending=None):
+    """
+    Lazily applies a function to every argument in an executor, sending the arguments in chunks.
+    Only max_pending chunks are in flight at any time, so the arguments are consumed (and the results held in memory)
+    as fast as the caller consumes the results.
+    :param function: function to apply. It must be picklable if the executor is a ProcessPoolExecutor.
+    :param arguments: iterable of arguments.
+    :param executor: concurrent.futures executor.
+    :param chunk_size: amount of arguments sent together to a worker.
+    :param ordered: if set, the results are yielded in the order of the arguments. Otherwise, as soon as they finish.
+    :param max_pending: maximum amount of chunks in flight. By default, twice the workers of the executor.
+    :return: generator of results.
+    """
+    if max_pending is None:
+        max_pending = 2 * getattr(executor, "_max_workers", 1)
+
+    arguments = iter(arguments)
+    pending = deque()
+
+    def submit():
+        chunk = list(islice(arguments, chunk_size))
+
+        if chunk:
+            pending.append(executor.submit(_apply, function, chunk))
+
+        return bool(chunk)
+
+    try:
+        while len(pending) < max_pending and submit():
+            pass
+
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    pending.remove(future)
+
+            for future in done:
+                for result in future.result():
+                    yield result
+
+                submit()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _apply(function, chunk):
+    return [function(argument) for argument in chunk]
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+import threading
+import time
+from contextlib import contextmanager, ExitStack
+
+__author__ = "Iván de Paz Centeno"
+
+# Latencies are counted in buckets of powers of two microseconds: the bucket i counts latencies below 2**i µs.
+HISTOGRAM_BUCKETS = 32
+
+
+class Measure(object):
+    """
+    Measures of a single operation. Hooks receive it once the operation finishes.
+    """
+    __slots__ = ("operation", "interpreter", "elapsed", "bytes_read", "bytes_written", "files_opened", "entries")
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.interpreter = None
+        self.elapsed = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.files_opened = 0
+        self.entries = 0
+
+    def __repr__(self):
+        return "<Measure {} {:.3f} ms>".format(self.operation, self.elapsed * 1000)
+
+
+class OperationStats(object):
+    __slots__ = ("count", "total_seconds", "max_seconds", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+        self.histogram[min(HISTOGRAM_BUCKETS - 1, int(elapsed * 1000000).bit_length())] += 1
+
+    def percentile(self, ratio):
+        """
+        Estimates a percentile of the latencies, as the upper bound of the bucket in which it falls.
+        :return: latency in seconds.
+        """
+        target = ratio * self.count
+        accumulated = 0
+
+        for bucket, count in enumerate(self.histogram):
+            accumulated += count
+
+            if count and accumulated >= target:
+                return min(2 ** bucket / 1000000, self.max_seconds)
+
+        return self.max_seconds
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total_seconds * 1000,
+            "mean_ms": self.total_seconds * 1000 / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": self.max_seconds * 1000,
+            "histogram_us": {2 ** bucket: count for bucket, count in enumerate(self.histogram) if count},
+        }
+
+
+class Instrumentation(object):
+    """
+    Records the counts, times and latency histograms of the operations of PyFolder and its Interpreters, and the
+    bytes and files they read and write.
+
+    Operations are recorded by name ("getitem", "listing", "load"...), and the ones done by an interpreter also as
+    "<operation>:<interpreter class>". Two kinds of hooks can be plugged:
+        - add_hook(function): the function is called with the Measure of each operation once it finishes.
+        - add_context(factory): factory(operation name) must return a context manager, entered around the operation
+          (for example, to open a tracing span).
+
+    When PyFolder is not instrumented, the operations only pay for a check of the instrumentation attribute.
+    """
+
+    def __init__(self):
+        self._hooks = []
+        self._contexts = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clears all the recorded statistics.
+        """
+        with self._lock:
+            self._operations = {}
+            self._bytes_read = 0
+            self._bytes_written = 0
+            self._files_opened = 0
+
+    def add_hook(self, hook):
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def add_context(self, factory):
+        self._contexts.append(factory)
+
+    def remove_context(self, factory):
+        self._contexts.remove(factory)
+
+    @contextmanager
+    def measure(self, operation):
+        """
+        Measures an operation. The yielded Measure can be completed with the bytes and files involved.
+        """
+        with ExitStack() as stack:
+            for factory in self._contexts:
+                stack.enter_context(factory(operation))
+
+            measure = Measure(operation)
+            start = time.perf_counter()
+
+            try:
+                yield measure
+            finally:
+                measure.elapsed = time.perf_counter() - start
+                self.record(measure)
+
+    def measure_iterator(self, operation, iterator, size=None, files_opened=0):
+        """
+        Measures an operation that produces an iterator, like a listing. Only the time spent producing the elements
+        is measured, not the time spent by the consumer between them.
+        :param size: function returning the bytes read to produce an element, if any.
+        :param files_opened: files opened by the iterator.
+        :return: generator with the elements of the iterator.
+        """
+        clock = time.perf_counter
+
+        with ExitStack() as stack:
+            for factory in self._contexts:
+                stack.enter_context(factory(operation))
+
+            measure = Measure(operation)
+            measure.files_opened = files_opened
+            iterator = iter(iterator)
+
+            try:
+                while True:
+                    start = clock()
+
+                    try:
+                        element = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        measure.elapsed += clock() - start
+
+                    measure.entries += 1
+
+                    if size is not None:
+                        measure.bytes_read += size(element)
+
+                    yield element
+            finally:
+                self.record(measure)
+
+    def record(self, measure):
+        """
+        Adds a finished measure to the statistics and hands it to the hooks.
+        """
+        names = [measure.operation]
+
+        if measure.interpreter is not None:
+            names.append("{}:{}".format(measure.operation, measure.interpreter))
+
+        with self._lock:
+            for name in names:
+                stats = self._operations.get(name)
+
+                if stats is None:
+                    stats = self._operations[name] = OperationStats()
+
+                stats.add(measure.elapsed)
+
+            self._bytes_read += measure.bytes_read
+            self._bytes_written += measure.bytes_written
+            self._files_opened += measure.files_opened
+
+        for hook in self._hooks:
+            hook(measure)
+
+    def stats(self):
+        """
+        Retrieves a snapshot of the statistics.
+        :return: dict with the "operations" (by name: count, total, mean, p50, p99 and max times in milliseconds, and
+        the histogram of latencies by upper bound in microseconds), "bytes_read", "bytes_written" and "files_opened".
+        """
+        with self._lock:
+            return {
+                "operations": {name: stats.snapshot() for name, stats in sorted(self._operations.items())},
+                "bytes_read": self._bytes_read,
+                "bytes_written": self._bytes_written,
+                "files_opened": self._files_opened,
+            }
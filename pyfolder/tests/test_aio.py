@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+import asyncio
+import os
+import shutil
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from pyfolder import AsyncPyFolder, PyFolder
+
+__author__ = 'Iván de Paz Centeno'
+
+
+class TestAsyncPyFolder(unittest.TestCase):
+    """
+    Unitary tests for the AsyncPyFolder class.
+    """
+    def setUp(self):
+        self.folder = "examples"
+        self.test_folders = os.path.join(self.folder, "subdir")
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_async_pyfolder_mapping(self):
+        """
+        AsyncPyFolder mirrors the mapping operations of PyFolder
+        :return:
+        """
+        pyfolder = AsyncPyFolder(self.test_folders, allow_override=True)
+
+        async def scenario():
+            await pyfolder.set("foo.json", {"m": "hi"})
+            await pyfolder.set("foo/bar.txt", "bar")
+
+            self.assertEqual(await pyfolder.get("foo.json"), {"m": "hi"})
+            self.assertIsNone(await pyfolder.get("unknown"))
+            self.assertTrue(await pyfolder.contains("foo/bar.txt"))
+            self.assertFalse(await pyfolder.contains("unknown"))
+            self.assertEqual(await pyfolder.len(), 2)
+
+            with self.assertRaises(KeyError):
+                await pyfolder.getitem("unknown")
+
+            await pyfolder.delete("foo.json")
+            self.assertFalse(await pyfolder.contains("foo.json"))
+
+        self.run_async(scenario())
+
+    def test_async_pyfolder_iterate(self):
+        """
+        AsyncPyFolder can be iterated asynchronously
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders)
+        pyfolder["foo"] = b"bar"
+        pyfolder["foo2"] = b"bar2"
+        pyfolder["foo3/foo"] = b"bar"
+
+        async_pyfolder = AsyncPyFolder(pyfolder, max_concurrency=2)
+
+        async def collect(iterator):
+            return [element async for element in iterator]
+
+        self.assertEqual(sorted(self.run_async(collect(async_pyfolder))), ["foo", "foo2", "foo3"])
+        self.assertEqual(sorted(self.run_async(collect(async_pyfolder.files_items()))),
+                         [("foo", b"bar"), ("foo2", b"bar2")])
+        self.assertEqual([name for name, _ in self.run_async(collect(async_pyfolder.items()))
+                          if name == "foo3"], ["foo3"])
+
+    def test_async_pyfolder_batch_operations(self):
+        """
+        AsyncPyFolder is able to process several elements concurrently
+        :return:
+        """
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            pyfolder = AsyncPyFolder(self.test_folders, executor=executor, max_concurrency=3)
+            items = {"foo{}.json".format(i): {"i": i} for i in range(10)}
+
+            self.run_async(pyfolder.set_many(items))
+            self.assertEqual(self.run_async(pyfolder.get_many(list(items))), list(items.values()))
+
+            results = self.run_async(pyfolder.get_many(["foo1.json", "unknown"], return_exceptions=True))
+            self.assertEqual(results[0], {"i": 1})
+            self.assertIsInstance(results[1], KeyError)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,16 +23,27 @@
 #OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #SOFTWARE.
 
+import bz2
+import gzip
 import json
+import lzma
 import os
+import pickle
 import shutil
+import sys
 import unittest
-from pyfolder import BinaryInterpreter, JSONInterpreter, TextInterpreter, Interpreters
+from collections import namedtuple
+from pyfolder import BinaryInterpreter, JSONInterpreter, TextInterpreter, Interpreters, ContentCache
+from pyfolder.interpreters import Interpreter, GzipInterpreter, BZ2Interpreter, LZMAInterpreter, NumpyInterpreter, \
+    PickleInterpreter
 
 
 __author__ = 'Iván de Paz Centeno'
 
 
+Point = namedtuple("Point", ["x", "y"])
+
+
 class TestInterpreters(unittest.TestCase):
     """
     Unitary tests for the Interpreters classes.
@@ -62,6 +73,31 @@ class TestInterpreters(unittest.TestCase):
         content2 = interpreter.load(os.path.join(self.folder, "example"))
         self.assertEqual(content, content2)
 
+    def test_binary_interpreter_mmap(self):
+        """
+        BinaryInterpreter is able to map files into memory
+        """
+        interpreter = BinaryInterpreter(use_mmap=True)
+        self.assertFalse(interpreter.cacheable)
+
+        interpreter.save(os.path.join(self.folder, "example"), b"this is a bytes object")
+
+        with interpreter.load(os.path.join(self.folder, "example")) as content:
+            self.assertEqual(content[:4], b"this")
+            self.assertEqual(bytes(memoryview(content)[-6:]), b"object")
+
+            with self.assertRaises(TypeError):
+                content[0] = 1
+
+        interpreter.save(os.path.join(self.folder, "empty"), b"")
+        self.assertEqual(interpreter.load(os.path.join(self.folder, "empty")), b"")
+
+        # Empty files can't be mapped, but their content is used the same way
+        with interpreter.load(os.path.join(self.folder, "empty")) as content:
+            self.assertEqual(len(content), 0)
+            self.assertEqual(bytes(memoryview(content)), b"")
+            self.assertTrue(memoryview(content).readonly)
+
     def test_json_interpreter(self):
         """
         JSONInterpreter works as expected
@@ -81,6 +117,120 @@ class TestInterpreters(unittest.TestCase):
         content2 = interpreter.load(os.path.join(self.folder, "example.json"))
         self.assertEqual(content, content2)
 
+    def test_json_interpreter_backends(self):
+        """
+        JSONInterpreter encodes and decodes with every available backend
+        """
+        from pyfolder.interpreters import orjson, ujson
+
+        backends = ["json"] + [name for name, module in [("orjson", orjson), ("ujson", ujson)] if module is not None]
+        content = {"this": ["is", "a", {"json": "object"}], "big": 2**70, "path": "a/b"}
+
+        for backend in backends:
+            for indent in [None, 2, 4]:
+                interpreter = JSONInterpreter(indent=indent, backend=backend)
+                interpreter.save(os.path.join(self.folder, "example.json"), content)
+                self.assertEqual(interpreter.load(os.path.join(self.folder, "example.json")), content)
+
+                with open(os.path.join(self.folder, "example.json"), "rb") as f:
+                    data = f.read()
+
+                self.assertEqual(b"\n" in data, indent is not None)
+                self.assertEqual(json.loads(data.decode("utf-8")), content)
+
+        with self.assertRaises(Exception):
+            JSONInterpreter(backend="unknown")
+
+    @unittest.skipUnless(NumpyInterpreter.available(), "NumPy is not installed")
+    def test_numpy_interpreter(self):
+        """
+        NumpyInterpreter works as expected
+        """
+        import numpy
+
+        interpreter = NumpyInterpreter()
+        content = numpy.arange(12, dtype=numpy.float32).reshape(3, 4)
+
+        self.assertTrue(interpreter.can_save(content))
+        self.assertFalse(interpreter.can_save([1, 2]))
+        self.assertTrue(interpreter.can_load("npy"))
+        self.assertTrue(interpreter.can_load("npz"))
+
+        interpreter.save(os.path.join(self.folder, "example.npy"), content)
+        numpy.testing.assert_array_equal(interpreter.load(os.path.join(self.folder, "example.npy")), content)
+
+        interpreter.save(os.path.join(self.folder, "example.npz"), content)
+        numpy.testing.assert_array_equal(interpreter.load(os.path.join(self.folder, "example.npz")), content)
+
+        # Dicts of arrays are saved by name into .npz files
+        archive = {"a": content, "b": numpy.zeros(3)}
+        self.assertTrue(interpreter.can_save(archive))
+        self.assertFalse(interpreter.can_save({"a": [1, 2]}))
+        interpreter.save(os.path.join(self.folder, "archive.npz"), archive)
+        loaded = interpreter.load(os.path.join(self.folder, "archive.npz"))
+        self.assertEqual(sorted(loaded), ["a", "b"])
+        numpy.testing.assert_array_equal(loaded["a"], content)
+        numpy.testing.assert_array_equal(loaded["b"], numpy.zeros(3))
+
+        with self.assertRaises(Exception):
+            interpreter.save(os.path.join(self.folder, "archive.npy"), archive)
+
+        interpreter = NumpyInterpreter(mmap_mode="r")
+        self.assertFalse(interpreter.cacheable)
+        mapped = interpreter.load(os.path.join(self.folder, "example.npy"))
+        self.assertIsInstance(mapped, numpy.memmap)
+        numpy.testing.assert_array_equal(mapped, content)
+
+    @unittest.skipUnless(sys.version_info >= (3, 8), "The pickle protocol 5 requires Python 3.8")
+    def test_pickle_interpreter(self):
+        """
+        PickleInterpreter works as expected
+        """
+        interpreter = PickleInterpreter(allowed_classes=[Point])
+
+        content = {"tuple": (1, 2), "set": {3}, "point": Point(1, 2)}
+
+        self.assertTrue(interpreter.can_load("pkl"))
+        self.assertFalse(interpreter.can_load("json"))
+
+        interpreter.save(os.path.join(self.folder, "example.pkl"), content)
+        self.assertEqual(interpreter.load(os.path.join(self.folder, "example.pkl")), content)
+
+        # Buffers are written out-of-band, after the pickle stream
+        interpreter.save(os.path.join(self.folder, "buffer.pkl"), [pickle.PickleBuffer(bytearray(b"x" * 100000))])
+
+        with open(os.path.join(self.folder, "buffer.pkl"), "rb") as f:
+            self.assertEqual(f.read()[-100000:], b"x" * 100000)
+
+        buffer, = interpreter.load(os.path.join(self.folder, "buffer.pkl"))
+        self.assertEqual(bytes(buffer), b"x" * 100000)
+        self.assertFalse(memoryview(buffer).readonly)
+
+        # Classes out of the allowlist are not loaded
+        with self.assertRaises(pickle.UnpicklingError):
+            PickleInterpreter().load(os.path.join(self.folder, "example.pkl"))
+
+        self.assertEqual(PickleInterpreter(trust_all=True).load(os.path.join(self.folder, "example.pkl")), content)
+
+        # Standard pickle files are loaded too, with the same restrictions
+        with open(os.path.join(self.folder, "standard.pkl"), "wb") as f:
+            pickle.dump(content, f)
+
+        self.assertEqual(interpreter.load(os.path.join(self.folder, "standard.pkl")), content)
+
+        # Also from streams that can't seek back
+        read_fd, write_fd = os.pipe()
+
+        with open(write_fd, "wb") as f:
+            f.write(pickle.dumps(content))
+
+        with open(read_fd, "rb") as f:
+            self.assertFalse(f.seekable())
+            self.assertEqual(interpreter.read(f), content)
+
+        with self.assertRaises(pickle.UnpicklingError):
+            PickleInterpreter().load(os.path.join(self.folder, "standard.pkl"))
+
     def test_text_interpreter(self):
         """
         TextInterpreter works as expected
@@ -146,5 +296,197 @@ class TestInterpreters(unittest.TestCase):
         with self.assertRaises(Exception):
             interpreters.load("unknown")
 
+    def test_interpreters_dispatch(self):
+        """
+        Interpreters dispatch by extension and type keeping the registration priority
+        """
+        class UpperTextInterpreter(Interpreter):
+            # Only implements the predicates
+            def can_load(self, extension):
+                return extension == "up"
+
+            def can_save(self, object):
+                return type(object) is str and object.isupper()
+
+        text, json_interpreter, binary = TextInterpreter(), JSONInterpreter(), BinaryInterpreter()
+        upper = UpperTextInterpreter()
+
+        interpreters = Interpreters()
+        interpreters.register(upper)
+        interpreters.register(text)
+        interpreters.register(json_interpreter)
+        interpreters.register(binary)
+
+        self.assertIs(interpreters.interpreter_for_load("TXT"), text)
+        self.assertIs(interpreters.interpreter_for_load("up"), upper)
+        self.assertIs(interpreters.interpreter_for_load("geojson"), json_interpreter)
+        self.assertIs(interpreters.interpreter_for_load("bin"), binary)
+
+        self.assertIs(interpreters.interpreter_for_save("UPPER"), upper)
+        self.assertIs(interpreters.interpreter_for_save("lower"), text)
+        self.assertIs(interpreters.interpreter_for_save([]), json_interpreter)
+        self.assertIs(interpreters.interpreter_for_save(b""), binary)
+        self.assertIsNone(interpreters.interpreter_for_save(55))
+
+        # The first registered interpreter for an extension wins
+        text2 = TextInterpreter()
+        interpreters.register(text2)
+        self.assertIs(interpreters.interpreter_for_load("txt"), text)
+
+    def test_interpreters_overridden_predicates(self):
+        """
+        Predicates overridden by subclasses are honoured over the declared extensions and types
+        """
+        class MarkdownInterpreter(TextInterpreter):
+            def can_load(self, extension):
+                return extension.lower() == "md" or super().can_load(extension)
+
+        class BytearrayInterpreter(BinaryInterpreter):
+            def can_save(self, object):
+                return type(object) in (bytes, bytearray)
+
+        text = TextInterpreter()
+        interpreters = Interpreters()
+        interpreters.register(MarkdownInterpreter())
+        interpreters.register(text)
+        interpreters.register(BytearrayInterpreter())
+
+        with open(os.path.join(self.folder, "example.md"), "w") as f:
+            f.write("# title")
+
+        self.assertEqual(interpreters.load(os.path.join(self.folder, "example.md")), "# title")
+
+        interpreters.save(os.path.join(self.folder, "example"), bytearray(b"bytes"))
+        self.assertEqual(interpreters.load(os.path.join(self.folder, "example")), b"bytes")
+
+        # The text extensions are looked up in the table, and subclasses can declare more of them
+        class LogInterpreter(TextInterpreter):
+            extensions = TextInterpreter.extensions + ("log",)
+
+        log = LogInterpreter()
+        interpreters = Interpreters()
+        interpreters.register(text)
+        interpreters.register(log)
+        interpreters.register(BinaryInterpreter())
+
+        self.assertIn("txt", interpreters._load_table)
+        self.assertIs(interpreters.interpreter_for_load("txt"), text)
+        self.assertIs(interpreters.interpreter_for_load("log"), log)
+
+    def test_interpreters_compression(self):
+        """
+        Compressed interpreters are layered over the rest of interpreters
+        """
+        interpreters = Interpreters()
+        interpreters.register(JSONInterpreter())
+        interpreters.register(TextInterpreter())
+        interpreters.register(BinaryInterpreter())
+        interpreters.register(GzipInterpreter(level=1))
+        interpreters.register(BZ2Interpreter())
+        interpreters.register(LZMAInterpreter())
+
+        layers, extension = interpreters.split_extension("folder.d/data.json.gz")
+        self.assertEqual(([type(layer) for layer in layers], extension), ([GzipInterpreter], "json"))
+        layers, extension = interpreters.split_extension("data.txt.xz.bz2")
+        self.assertEqual(([type(layer) for layer in layers], extension), ([BZ2Interpreter, LZMAInterpreter], "txt"))
+        self.assertEqual(interpreters.split_extension("data.gz")[1], "")
+        self.assertEqual(interpreters.split_extension(".gz")[1], "gz")
+
+        content = {"content": "content!" * 100}
+
+        for name, value, open_function in [("example.json.gz", content, gzip.open),
+                                           ("example.txt.bz2", "content!" * 100, bz2.open),
+                                           ("example.xz", b"content!" * 100, lzma.open)]:
+            uri = os.path.join(self.folder, name)
+            interpreters.save(uri, value)
+            self.assertEqual(interpreters.load(uri), value)
+            self.assertLess(os.path.getsize(uri), 100)
+
+            with open_function(uri, "rb") as f:
+                self.assertTrue(len(f.read()) >= 800)
+
+        # Stacked layers
+        uri = os.path.join(self.folder, "example.txt.xz.gz")
+        interpreters.save(uri, "content!")
+        self.assertEqual(interpreters.load(uri), "content!")
+
+        with gzip.open(uri, "rb") as f:
+            self.assertEqual(lzma.decompress(f.read()), b"content!")
+
+    @unittest.skipUnless(sys.version_info >= (3, 8), "The pickle protocol 5 requires Python 3.8")
+    def test_interpreters_extension_precedence(self):
+        """
+        The interpreter declaring the extension of the file is preferred to save the object
+        """
+        interpreters = Interpreters()
+        interpreters.register(JSONInterpreter())
+        interpreters.register(PickleInterpreter())
+        interpreters.register(BinaryInterpreter())
+
+        interpreters.save(os.path.join(self.folder, "example.pkl"), {"content": (1, 2)})
+        self.assertEqual(interpreters.load(os.path.join(self.folder, "example.pkl")), {"content": (1, 2)})
+
+        interpreters.save(os.path.join(self.folder, "example.json"), {"content": (1, 2)})
+        self.assertEqual(interpreters.load(os.path.join(self.folder, "example.json")), {"content": [1, 2]})
+
+        # Pickle is never chosen by type
+        with self.assertRaises(Exception):
+            interpreters.save(os.path.join(self.folder, "example"), (1, 2))
+
+    def test_interpreters_cache(self):
+        """
+        Interpreters serve the cached content until the file changes
+        """
+        interpreters = Interpreters(cache=ContentCache())
+        interpreters.register(JSONInterpreter())
+        interpreters.register(BinaryInterpreter())
+
+        uri = os.path.join(self.folder, "example.json")
+        interpreters.save(uri, {"content": [1, 2]})
+
+        self.assertEqual(interpreters.load(uri), {"content": [1, 2]})
+        self.assertEqual(interpreters.load(uri), {"content": [1, 2]})
+        self.assertEqual(interpreters.cache.stats()["misses"], 1)
+        self.assertEqual(interpreters.cache.stats()["hits"], 1)
+
+        # Cached values can't be corrupted by the callers
+        interpreters.load(uri)["content"].append(3)
+        self.assertEqual(interpreters.load(uri), {"content": [1, 2]})
+
+        # External modifications are detected
+        with open(uri, "w") as f:
+            json.dump({"content": "modified!"}, f)
+        self.assertEqual(interpreters.load(uri), {"content": "modified!"})
+
+        # Saves invalidate the entry
+        interpreters.save(uri, {"content": "saved"})
+        self.assertEqual(interpreters.load(uri), {"content": "saved"})
+
+    def test_content_cache_eviction(self):
+        """
+        ContentCache evicts the least recently used entries when the byte budget is exceeded
+        """
+        interpreters = Interpreters(cache=ContentCache(max_bytes=10))
+        interpreters.register(BinaryInterpreter())
+
+        for name in ["a", "b", "c"]:
+            interpreters.save(os.path.join(self.folder, name), b"1234")
+
+        interpreters.load(os.path.join(self.folder, "a"))
+        interpreters.load(os.path.join(self.folder, "b"))
+        interpreters.load(os.path.join(self.folder, "a"))
+        interpreters.load(os.path.join(self.folder, "c"))
+
+        stats = interpreters.cache.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["bytes"], 8)
+
+        # "b" was the least recently used one
+        interpreters.load(os.path.join(self.folder, "a"))
+        self.assertEqual(interpreters.cache.stats()["hits"], 2)
+        interpreters.load(os.path.join(self.folder, "b"))
+        self.assertEqual(interpreters.cache.stats()["misses"], 4)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -22,12 +22,16 @@
 #LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 #OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #SOFTWARE.
+import gzip
 import json
 import os
 import shutil
+import sys
 import unittest
+from collections import OrderedDict
 
-from pyfolder import PyFolder
+from pyfolder import PyFolder, NumpyInterpreter
+from pyfolder.descriptors import dir_fd_supported
 
 __author__ = 'Iván de Paz Centeno'
 
@@ -126,6 +130,166 @@ class TestPyFolder(unittest.TestCase):
         with self.assertRaises(KeyError):
             a = pyfolder["UNKNOWN"]
 
+    def test_pyfolder_compressed_elements(self):
+        """
+        PyFolder is able to compress elements transparently
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders, transparent_compression=True)
+
+        pyfolder["foo.json.gz"] = {"m": "hi"}
+        pyfolder["foo.txt.xz"] = "hi"
+        pyfolder["foo.gz"] = (chunk for chunk in [b"h", b"i"])
+
+        self.assertEqual(pyfolder["foo.json.gz"], {"m": "hi"})
+        self.assertEqual(pyfolder["foo.txt.xz"], "hi")
+        self.assertEqual(pyfolder["foo.gz"], b"hi")
+
+        # Raw content when not enabled
+        pyfolder = PyFolder(self.test_folders)
+        self.assertEqual(gzip.decompress(pyfolder["foo.gz"]), b"hi")
+
+    @unittest.skipUnless(NumpyInterpreter.available(), "NumPy is not installed")
+    def test_pyfolder_numpy_elements(self):
+        """
+        PyFolder is able to store NumPy arrays
+        :return:
+        """
+        import numpy
+
+        pyfolder = PyFolder(self.test_folders)
+        pyfolder["foo.npy"] = numpy.ones((4, 4))
+        numpy.testing.assert_array_equal(pyfolder["foo.npy"], numpy.ones((4, 4)))
+
+        pyfolder["foo.npz"] = {"a": numpy.ones(2), "b": numpy.zeros(3)}
+        self.assertEqual(sorted(pyfolder["foo.npz"]), ["a", "b"])
+        numpy.testing.assert_array_equal(pyfolder["foo.npz"]["b"], numpy.zeros(3))
+
+        pyfolder = PyFolder(self.test_folders, use_mmap=True, allow_override=True)
+        mapped = pyfolder["foo.npy"]
+        self.assertIsInstance(mapped, numpy.memmap)
+
+        # Mapped arrays can be saved under any name, as other arrays
+        pyfolder["foo2"] = mapped
+        pyfolder["foo3.npz"] = mapped
+        numpy.testing.assert_array_equal(pyfolder["foo3.npz"], numpy.ones((4, 4)))
+
+    @unittest.skipUnless(sys.version_info >= (3, 8), "The pickle protocol 5 requires Python 3.8")
+    def test_pyfolder_pickled_elements(self):
+        """
+        PyFolder is able to pickle elements if allowed
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders)
+
+        with self.assertRaises(Exception):
+            pyfolder["foo.pkl"] = (1, {2})
+
+        pyfolder = PyFolder(self.test_folders, allow_pickle=True, pickle_classes=["collections.OrderedDict"])
+        pyfolder["foo.pkl"] = (1, {2})
+        pyfolder["foo2.pkl"] = {"m": "hi"}
+        pyfolder["foo3.pkl"] = OrderedDict(m="hi")
+
+        self.assertEqual(pyfolder["foo.pkl"], (1, {2}))
+        self.assertEqual(pyfolder["foo2.pkl"], {"m": "hi"})
+        self.assertEqual(pyfolder["foo3.pkl"], OrderedDict(m="hi"))
+
+        # Only .pkl files are pickled
+        with self.assertRaises(Exception):
+            pyfolder["foo"] = (1, {2})
+
+    def test_pyfolder_streams_elements(self):
+        """
+        PyFolder is able to read and write elements as streams
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders)
+
+        pyfolder["foo/big.bin"] = (bytes([i]) * 1000 for i in range(10))
+        self.assertEqual(os.path.getsize(os.path.join(self.test_folders, "foo", "big.bin")), 10000)
+
+        chunks = list(pyfolder.read_chunks("foo/big.bin", chunk_size=4096))
+        self.assertEqual([len(chunk) for chunk in chunks], [4096, 4096, 1808])
+        self.assertEqual(b"".join(chunks), pyfolder["foo/big.bin"])
+
+        with open(os.path.join(self.test_folders, "foo", "big.bin"), "rb") as f:
+            pyfolder["big_copy.bin"] = f
+        self.assertEqual(pyfolder["big_copy.bin"], pyfolder["foo/big.bin"])
+
+        pyfolder["text.txt"] = iter(["hello ", "world"])
+        self.assertEqual(pyfolder["text.txt"], "hello world")
+
+        with pyfolder.open("foo/other.txt", "w") as f:
+            f.write("streamed")
+        self.assertEqual(pyfolder["foo/other.txt"], "streamed")
+
+        with pyfolder.open("foo/other.txt") as f:
+            self.assertEqual(f.read(), b"streamed")
+
+        with self.assertRaises(Exception):
+            pyfolder.open("foo/other.txt", "w")
+
+        with self.assertRaises(KeyError):
+            pyfolder.read_chunks("foo/unknown")
+
+    def test_pyfolder_mmap_elements(self):
+        """
+        PyFolder is able to map elements into memory
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders)
+        pyfolder["foo/model.bin"] = b"header" + b"0" * 4096
+        pyfolder["foo.txt"] = "hi"
+
+        with pyfolder.mmap("foo/model.bin") as content:
+            self.assertEqual(content[:6], b"header")
+            self.assertEqual(len(content), 4102)
+
+        with self.assertRaises(KeyError):
+            pyfolder.mmap("foo/unknown.bin")
+
+        pyfolder = PyFolder(self.test_folders, use_mmap=True)
+
+        with pyfolder["foo/model.bin"] as content:
+            self.assertEqual(content[:6], b"header")
+
+        pyfolder["empty.bin"] = b""
+
+        with pyfolder["empty.bin"] as content, pyfolder.mmap("empty.bin") as mapped:
+            self.assertEqual(content, b"")
+            self.assertEqual(mapped, b"")
+
+        # Interpreted content is not affected
+        self.assertEqual(pyfolder["foo.txt"], "hi")
+        self.assertTrue(pyfolder["foo"].use_mmap)
+
+    def test_pyfolder_batch_operations(self):
+        """
+        PyFolder is able to retrieve, store and delete several elements at once
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders, allow_override=True)
+
+        pyfolder.set_many({"foo{}.json".format(i): {"i": i} for i in range(20)}, max_workers=4)
+        pyfolder.set_many([("foo/bar.txt", "bar"), ("foo/bar.bin", b"bar")])
+
+        keys = ["foo{}.json".format(i) for i in range(20)]
+        self.assertEqual(pyfolder.get_many(keys, max_workers=4), [{"i": i} for i in range(20)])
+
+        results = pyfolder.get_many(["foo/bar.txt", "unknown", "foo/bar.bin"], return_exceptions=True)
+        self.assertEqual(results[0], "bar")
+        self.assertIsInstance(results[1], KeyError)
+        self.assertEqual(results[2], b"bar")
+
+        with self.assertRaises(KeyError):
+            pyfolder.get_many(["foo/bar.txt", "unknown"])
+
+        pyfolder.delete_many(keys)
+        self.assertEqual(sorted(pyfolder), ["foo"])
+
+        results = pyfolder.set_many({"foo/bar.txt": 55}, return_exceptions=True)
+        self.assertIsInstance(results[0], Exception)
+
     def test_pyfolder_deletes_elements(self):
         """
         PyFolder accepts delete of elements
@@ -191,6 +355,27 @@ class TestPyFolder(unittest.TestCase):
         pyfolder["foo"] = b"foo"
         self.assertEqual(pyfolder["foo"], b"foo")
 
+    def test_pyfolder_cache(self):
+        """
+        PyFolder caches the content and invalidates it on writes and deletes
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders, allow_override=True, cache_size=1024)
+
+        pyfolder["foo.json"] = {"m": "hi"}
+        self.assertEqual(pyfolder["foo.json"], {"m": "hi"})
+        self.assertEqual(pyfolder["foo.json"], {"m": "hi"})
+        self.assertEqual(pyfolder.interpreters.cache.stats()["hits"], 1)
+
+        pyfolder["foo.json"] = {"m": "bye"}
+        self.assertEqual(pyfolder["foo.json"], {"m": "bye"})
+
+        del pyfolder["foo.json"]
+        self.assertEqual(pyfolder.interpreters.cache.stats()["entries"], 0)
+
+        with self.assertRaises(KeyError):
+            a = pyfolder["foo.json"]
+
     def test_pyfolder_contains_elements(self):
         """
         PyFolder accepts the "in" keyword to lookup for elements
@@ -206,6 +391,20 @@ class TestPyFolder(unittest.TestCase):
         self.assertIn("foo2", pyfolder)
         self.assertNotIn("foo3", pyfolder)
 
+        pyfolder["foo3/foo4/foo"] = b"bar"
+
+        self.assertIn("foo3", pyfolder)
+        self.assertIn("foo3/foo4", pyfolder)
+        self.assertIn("foo3/foo4/foo", pyfolder)
+        self.assertNotIn("foo3/foo4/foo5", pyfolder)
+        self.assertNotIn("foo3/../foo", pyfolder)
+        self.assertNotIn(".", pyfolder)
+        self.assertNotIn(5, pyfolder)
+
+        # Looking up a nested element does not create its folders
+        self.assertNotIn("foo5/foo", pyfolder)
+        self.assertFalse(os.path.exists(os.path.join(self.test_folders, "foo5")))
+
     def test_pyfolder_keys(self):
         """
         PyFolder is able to return its keys
@@ -219,6 +418,13 @@ class TestPyFolder(unittest.TestCase):
         self.assertTrue(all(x in pyfolder.keys() for x in ["foo", "foo2"]))
         self.assertEqual(len(pyfolder.keys()), 2)
 
+        # Keys are a lazy view that reflects the changes of the folder
+        keys = pyfolder.keys()
+        pyfolder["foo3"] = b"bar3"
+        self.assertEqual(len(keys), 3)
+        self.assertEqual(keys & {"foo", "foo4"}, {"foo"})
+        self.assertEqual(keys - {"foo"}, {"foo2", "foo3"})
+
     def test_pyfolder_values(self):
         """
         PyFolder successfully returns the values o its keys
@@ -232,6 +438,20 @@ class TestPyFolder(unittest.TestCase):
         self.assertTrue(all(x in pyfolder.values() for x in [b"bar", b"bar2"]))
         self.assertEqual(len(pyfolder.values()), 2)
 
+        # Values are loaded as they are consumed
+        loaded = []
+        load = pyfolder.interpreters.load
+        pyfolder.interpreters.load = lambda uri: loaded.append(uri) or load(uri)
+
+        values = pyfolder.values()
+        self.assertEqual(loaded, [])
+        next(iter(values))
+        self.assertEqual(len(loaded), 1)
+
+        self.assertIn(("foo", b"bar"), pyfolder.items())
+        self.assertNotIn(("foo", b"bar2"), pyfolder.items())
+        self.assertEqual(len(pyfolder.items()), 2)
+
     def test_pyfolder_iterate(self):
         """
         PyFolder can be iterated
@@ -274,6 +494,64 @@ class TestPyFolder(unittest.TestCase):
         for element, content in pyfolder.files_items():
             self.assertEqual(content, {"foo": b"bar", "foo2": b"bar2"}[element])
 
+    def test_pyfolder_iterate_in_parallel(self):
+        """
+        PyFolder is able to load the files in a pool of workers while iterating
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders)
+
+        for i in range(30):
+            pyfolder["foo{}.json".format(i)] = {"i": i}
+        pyfolder["foo/bar"] = b"bar"
+
+        expected = sorted(pyfolder.files_items(), key=lambda item: item[0])
+
+        for executor in ["process", "thread"]:
+            listing = list(pyfolder.parallel_files_items(max_workers=2, executor=executor, chunk_size=4))
+            self.assertEqual(listing, list(pyfolder.files_items()))
+
+            unordered = pyfolder.parallel_files_items(max_workers=2, executor=executor, ordered=False, chunk_size=4)
+            self.assertEqual(sorted(unordered, key=lambda item: item[0]), expected)
+
+        items = dict(pyfolder.parallel_items(max_workers=2, executor="thread"))
+        self.assertEqual(len(items), 31)
+        self.assertTrue(type(items["foo"]) is PyFolder)
+        self.assertEqual(items["foo3.json"], {"i": 3})
+
+    def test_pyfolder_iterate_entries(self):
+        """
+        PyFolder can be iterated with lazy handles of its elements
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders)
+
+        pyfolder["foo"] = b"bar"
+        pyfolder["foo2.json"] = {"a": 1}
+        pyfolder["foo3/foo"] = b"bar"
+
+        loaded = []
+        load = pyfolder.interpreters.load
+        pyfolder.interpreters.load = lambda uri: loaded.append(uri) or load(uri)
+
+        entries = {entry.name: entry for entry in pyfolder.entries()}
+        self.assertEqual(sorted(entries), ["foo", "foo2.json", "foo3"])
+        self.assertEqual(entries["foo"].kind, "file")
+        self.assertEqual(entries["foo3"].kind, "folder")
+        self.assertEqual(entries["foo"].size, 3)
+        self.assertIsNotNone(entries["foo2.json"].mtime)
+        self.assertEqual(loaded, [])
+
+        # Values are loaded once, on demand
+        self.assertFalse(entries["foo2.json"].loaded)
+        self.assertEqual(entries["foo2.json"].value, {"a": 1})
+        self.assertEqual(entries["foo2.json"].value, {"a": 1})
+        self.assertEqual(len(loaded), 1)
+        self.assertEqual(list(entries["foo3"].value), ["foo"])
+
+        self.assertEqual([entry.name for entry in pyfolder.entries("folder")], ["foo3"])
+        self.assertEqual(sorted(entry.name for entry in pyfolder.entries("file")), ["foo", "foo2.json"])
+
     def test_pyfolder_iterate_only_folders(self):
         """
         PyFolder is able to iterate only over folders.
@@ -292,6 +570,23 @@ class TestPyFolder(unittest.TestCase):
             self.assertTrue(type(content) is PyFolder)
             self.assertIn("foo", content)
 
+    def test_pyfolder_scan(self):
+        """
+        PyFolder streams its entries as os.DirEntry objects
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders)
+
+        pyfolder["foo"] = b"bar"
+        pyfolder["foo3/foo"] = b"bar"
+
+        entries = {entry.name: entry for entry in pyfolder.scan()}
+        self.assertEqual(set(entries), {"foo", "foo3"})
+        self.assertTrue(entries["foo"].is_file())
+        self.assertTrue(entries["foo3"].is_dir())
+        self.assertEqual(entries["foo"].path, os.path.join(self.test_folders, "foo"))
+        self.assertEqual(len(pyfolder), 2)
+
     def test_pyfolder_index(self):
         """
         PyFolder is able to find elements
@@ -308,5 +603,449 @@ class TestPyFolder(unittest.TestCase):
         self.assertIn("foo", indexes)
         self.assertIn("foo3/foo", indexes)
 
+    def test_pyfolder_iter_index(self):
+        """
+        PyFolder is able to stream the search of elements by name, glob or regex
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders)
+
+        pyfolder["foo.txt"] = "bar"
+        pyfolder["foo3/foo.json"] = {"m": "bar"}
+        pyfolder["foo3/foo4/foo.txt"] = "bar"
+
+        for workers in [1, 4]:
+            self.assertEqual(sorted(pyfolder.iter_index("foo.txt", workers=workers)), ["foo.txt", "foo3/foo4/foo.txt"])
+            self.assertEqual(sorted(pyfolder.iter_index("foo.*", glob=True, workers=workers)),
+                             ["foo.txt", "foo3/foo.json", "foo3/foo4/foo.txt"])
+            self.assertEqual(sorted(pyfolder.iter_index(r"foo\d", regex=True, workers=workers)), ["foo3", "foo3/foo4"])
+            self.assertEqual(len(list(pyfolder.iter_index("foo*", glob=True, limit=2, workers=workers))), 2)
+            self.assertEqual(sorted(pyfolder.index("foo.txt", max_depth=2, workers=workers)), ["foo.txt"])
+
+        walked = {uri: entry.is_file() for uri, entry in pyfolder.walk()}
+        self.assertEqual(walked, {"foo.txt": True, "foo3": False, "foo3/foo.json": True, "foo3/foo4": False,
+                                  "foo3/foo4/foo.txt": True})
+
+    def test_pyfolder_index_deep_tree(self):
+        """
+        PyFolder search is not limited by the recursion limit
+        :return:
+        """
+        depth = 400
+        os.makedirs(os.path.join(self.test_folders, *["d"] * depth))
+
+        pyfolder = PyFolder(self.test_folders)
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(300)
+
+        try:
+            matches = pyfolder.index("d", max_depth=depth + 1)
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+
+        self.assertEqual(len(matches), depth)
+
+    def test_pyfolder_persistent_index(self):
+        """
+        PyFolder is able to find elements through a persistent index
+        :return:
+        """
+        index_file = os.path.join(self.folder, "index.db")
+        pyfolder = PyFolder(self.test_folders, allow_override=True, allow_remove_folders_with_content=True,
+                            index_file=index_file)
+
+        pyfolder["foo"] = b"bar"
+        pyfolder["foo3/foo"] = b"bar"
+        pyfolder["foo3/foo4/foo"] = b"bar"
+
+        # Not built yet: the tree is walked
+        self.assertFalse(os.path.exists(index_file))
+        self.assertEqual(sorted(pyfolder.index("foo")), ["foo", "foo3/foo", "foo3/foo4/foo"])
+
+        pyfolder.build_index()
+        self.assertTrue(os.path.exists(index_file))
+        self.assertEqual(pyfolder.index("foo"), ["foo", "foo3/foo", "foo3/foo4/foo"])
+        self.assertEqual(pyfolder.index("foo", max_depth=2), ["foo", "foo3/foo"])
+        self.assertEqual(pyfolder.index("foo4"), ["foo3/foo4"])
+
+        # Changes are picked up by the incremental refresh
+        pyfolder["foo5/foo6/foo"] = b"bar"
+        del pyfolder["foo3/foo4"]
+        self.assertEqual(pyfolder.index("foo"), ["foo", "foo3/foo", "foo5/foo6/foo"])
+        self.assertEqual(pyfolder.index("foo4"), [])
+
+        # Changes are not seen without refreshing
+        pyfolder["foo7"] = b"bar"
+        self.assertEqual(pyfolder.index("foo7", refresh=False), [])
+        pyfolder.refresh_index()
+        self.assertEqual(pyfolder.index("foo7", refresh=False), ["foo7"])
+
+    def test_pyfolder_resolves_nested_uris(self):
+        """
+        PyFolder resolves nested URIs without creating folders on reads
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders)
+
+        with self.assertRaises(KeyError):
+            _ = pyfolder["foo/bar/file"]
+
+        self.assertFalse(os.path.exists(os.path.join(self.test_folders, "foo")))
+
+        # Folders are created on writes
+        pyfolder["foo/bar/file"] = b"content"
+        self.assertTrue(os.path.isfile(os.path.join(self.test_folders, "foo", "bar", "file")))
+
+        # Handles of the subfolders are reused
+        self.assertIs(pyfolder["foo/bar"], pyfolder["foo"]["bar"])
+
+        stat_calls = []
+        original_stat = os.stat
+
+        def counted_stat(*args, **kwargs):
+            stat_calls.append(args)
+            return original_stat(*args, **kwargs)
+
+        os.stat = counted_stat
+
+        try:
+            self.assertEqual(pyfolder["foo/bar/file"], b"content")
+        finally:
+            os.stat = original_stat
+
+        self.assertEqual(len(stat_calls), 1)
+
+    @unittest.skipUnless(dir_fd_supported(), "dir_fd operations not supported")
+    def test_pyfolder_dir_fd(self):
+        """
+        PyFolder is able to work relative to directory descriptors
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders, allow_override=True, allow_remove_folders_with_content=True,
+                            use_dir_fd=True)
+        pyfolder.descriptors.max_open = 2
+
+        pyfolder["foo.json"] = {"a": 1}
+        pyfolder["foo/bar/baz.txt"] = "hi"
+        pyfolder["foo2/bar"] = b"bar"
+        pyfolder["foo3/bar"] = b"bar"
+
+        self.assertLessEqual(len(pyfolder.descriptors), 2)
+        self.assertEqual(pyfolder["foo.json"], {"a": 1})
+        self.assertEqual(pyfolder["foo/bar/baz.txt"], "hi")
+        self.assertEqual(pyfolder["foo"]["bar"]["baz.txt"], "hi")
+        self.assertIn("foo2/bar", pyfolder)
+        self.assertNotIn("foo2/baz", pyfolder)
+        self.assertEqual(sorted(pyfolder), ["foo", "foo.json", "foo2", "foo3"])
+        self.assertEqual(dict(pyfolder.files_items()), {"foo.json": {"a": 1}})
+        self.assertEqual(sorted(pyfolder["foo2"].files_items()), [("bar", b"bar")])
+
+        with pyfolder.open("foo/bar/baz.txt", "r") as f:
+            self.assertEqual(f.read(), "hi")
+
+        del pyfolder["foo3/bar"]
+        del pyfolder["foo2"]
+        self.assertEqual(sorted(pyfolder), ["foo", "foo.json", "foo3"])
+
+        # The folder keeps working after it is moved
+        moved_folder = os.path.join(self.folder, "moved")
+        os.rename(self.test_folders, moved_folder)
+        self.assertEqual(pyfolder["foo.json"], {"a": 1})
+        pyfolder["foo/new"] = b"new"
+        self.assertTrue(os.path.exists(os.path.join(moved_folder, "foo", "new")))
+
+        # Searches, parallel reads and maps also go through the descriptors
+        self.assertEqual(pyfolder.index("baz.txt"), ["foo/bar/baz.txt"])
+        self.assertEqual(list(pyfolder.iter_index("new")), ["foo/new"])
+        self.assertEqual(sorted(uri for uri, _ in pyfolder.walk()),
+                         ["foo", "foo.json", "foo/bar", "foo/bar/baz.txt", "foo/new", "foo3"])
+        self.assertEqual(sorted(pyfolder["foo"].parallel_files_items(max_workers=2)), [("new", b"new")])
+
+        with pyfolder.mmap("foo/new") as content:
+            self.assertEqual(bytes(content), b"new")
+
+        pyfolder.close()
+        self.assertEqual(len(pyfolder.descriptors), 0)
+
+        with self.assertRaises(Exception):
+            PyFolder(moved_folder, use_dir_fd=True, use_mmap=True)
+
+        # The persistent index refreshes relative to the descriptors
+        index_file = os.path.join(self.folder, "index.db")
+        pyfolder = PyFolder(moved_folder, use_dir_fd=True, index_file=index_file)
+        pyfolder.build_index()
+        os.rename(moved_folder, self.test_folders)
+        pyfolder["foo/other"] = b"other"
+        self.assertEqual(pyfolder.index("other"), ["foo/other"])
+        pyfolder.close()
+
+    @unittest.skipUnless(dir_fd_supported(), "dir_fd operations not supported")
+    def test_pyfolder_dir_fd_overlapping_listings(self):
+        """
+        Listings of the same folder relative to its descriptor don't interfere with each other
+        :return:
+        """
+        os.makedirs(self.test_folders)
+
+        for i in range(3000):
+            open(os.path.join(self.test_folders, "f{}".format(i)), "wb").close()
+
+        pyfolder = PyFolder(self.test_folders, use_dir_fd=True)
+        outer = []
+
+        for name in pyfolder:
+            if not outer:
+                self.assertEqual(len(pyfolder), 3000)
+            outer.append(name)
+
+        self.assertEqual(len(outer), 3000)
+        self.assertEqual(len(set(outer)), 3000)
+        pyfolder.close()
+
+    def test_pyfolder_pack_storage(self):
+        """
+        PyFolder is able to keep small values in a pack file
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders, allow_override=True, storage="pack", pack_threshold=64)
+
+        pyfolder["small.json"] = {"a": 1}
+        pyfolder["small.txt"] = "hi"
+        pyfolder["large"] = b"x" * 100
+        pyfolder["foo/small"] = b"bar"
+
+        # Only the large value and the folder are real files
+        self.assertEqual(sorted(name for name in os.listdir(self.test_folders) if not name.startswith(".")),
+                         ["foo", "large"])
+
+        self.assertEqual(pyfolder["small.json"], {"a": 1})
+        self.assertEqual(pyfolder["small.txt"], "hi")
+        self.assertEqual(pyfolder["large"], b"x" * 100)
+        self.assertEqual(pyfolder["foo/small"], b"bar")
+        self.assertEqual(pyfolder["foo"]["small"], b"bar")
+        self.assertEqual(sorted(pyfolder), ["foo", "large", "small.json", "small.txt"])
+        self.assertEqual(len(pyfolder), 4)
+        self.assertEqual(sorted(pyfolder.files()), ["large", "small.json", "small.txt"])
+        self.assertEqual(dict(pyfolder.files_items())["small.json"], {"a": 1})
+        self.assertIn("small.txt", pyfolder)
+        self.assertIn("foo/small", pyfolder)
+        self.assertNotIn("foo/large", pyfolder)
+
+        self.assertEqual({entry.name: entry.size for entry in pyfolder.entries("file")}["small.json"],
+                         len(pyfolder.open("small.json").read()))
+
+        with pyfolder.open("small.txt", "rb") as f:
+            self.assertEqual(f.read(), b"hi")
+
+        # Values move between the pack and their own file as they grow or shrink
+        pyfolder["large"] = b"y"
+        pyfolder["small.txt"] = "z" * 100
+        self.assertFalse(os.path.exists(os.path.join(self.test_folders, "large")))
+        self.assertTrue(os.path.exists(os.path.join(self.test_folders, "small.txt")))
+        self.assertEqual(pyfolder["large"], b"y")
+        self.assertEqual(pyfolder["small.txt"], "z" * 100)
+
+        del pyfolder["small.json"]
+        self.assertNotIn("small.json", pyfolder)
+
+        with self.assertRaises(KeyError):
+            _ = pyfolder["small.json"]
+
+        # Other instances see the same content
+        pyfolder2 = PyFolder(self.test_folders, storage="pack")
+        self.assertEqual(sorted(pyfolder2), ["foo", "large", "small.txt"])
+
+        with self.assertRaises(Exception):
+            pyfolder2["large"] = b"z"
+
+        # Compaction reclaims the space of the overwritten and deleted values
+        stats = pyfolder.pack.stats()
+        self.assertGreater(stats["data_bytes"], stats["live_bytes"])
+        pyfolder.compact()
+        stats = pyfolder.pack.stats()
+        self.assertEqual(stats["data_bytes"], stats["live_bytes"])
+        self.assertEqual(pyfolder["large"], b"y")
+        self.assertEqual(pyfolder2["large"], b"y")
+        self.assertEqual(len(pyfolder2), 3)
+
+        # The files of the pack can't be touched as elements, and are not found by searches
+        for name in (".pyfolder.pack.idx", ".pyfolder.pack.1", "foo/.pyfolder.pack.idx"):
+            with self.assertRaises(KeyError):
+                pyfolder[name] = b"x"
+
+            with self.assertRaises(KeyError):
+                pyfolder.open(name, "wb")
+
+            with self.assertRaises(KeyError):
+                del pyfolder[name]
+
+        self.assertEqual(sorted(pyfolder2), ["foo", "large", "small.txt"])
+        self.assertEqual(pyfolder.index(".pyfolder.pack.idx"), [])
+        self.assertEqual(list(pyfolder.iter_index(".pyfolder.pack*", glob=True)), [])
+        self.assertEqual(sorted(uri for uri, _ in pyfolder.walk()), ["foo", "small.txt"])
+
+        # Folders whose packed values were all deleted can be removed
+        pyfolder["sub/a"] = b"a"
+        del pyfolder["sub/a"]
+        self.assertEqual(len(pyfolder["sub"]), 0)
+        del pyfolder["sub"]
+        self.assertFalse(os.path.exists(os.path.join(self.test_folders, "sub")))
+
+        # Checks on missing folders don't create stores, and the stores are bounded
+        for i in range(1000):
+            self.assertNotIn("missing{}/x".format(i), pyfolder)
+
+        self.assertLess(len(pyfolder._pack_stores), 10)
+
+        for i in range(300):
+            pyfolder["folder{}/x".format(i)] = b"x"
+
+        self.assertLessEqual(len(pyfolder._pack_stores), 256)
+        self.assertEqual(pyfolder["folder0/x"], b"x")
+
+    def test_pyfolder_sharded_layout(self):
+        """
+        PyFolder is able to spread the keys in hash-named subfolders
+        :return:
+        """
+        index_file = os.path.join(self.folder, "index.db")
+        pyfolder = PyFolder(self.test_folders, allow_override=True, shard_levels=2, index_file=index_file)
+        keys = ["key{}.json".format(i) for i in range(20)]
+
+        for i, key in enumerate(keys):
+            pyfolder[key] = {"value": i}
+
+        # Only shard folders at the root
+        self.assertTrue(all(len(name) == 2 for name in os.listdir(self.test_folders)))
+        self.assertEqual(len(pyfolder), 20)
+        self.assertEqual(sorted(pyfolder), sorted(keys))
+        self.assertEqual(sorted(pyfolder.files()), sorted(keys))
+        self.assertEqual(list(pyfolder.folders()), [])
+        self.assertEqual(pyfolder["key3.json"], {"value": 3})
+        self.assertEqual(dict(pyfolder.items())["key4.json"], {"value": 4})
+        self.assertIn("key5.json", pyfolder)
+        self.assertNotIn("key50.json", pyfolder)
+        self.assertNotIn("a/key5.json", pyfolder)
+
+        with self.assertRaises(KeyError):
+            pyfolder["a/b"] = b"nested"
+
+        # Reads of missing keys don't create shard folders
+        shards = sorted(root for root, _, _ in os.walk(self.test_folders))
+
+        with self.assertRaises(KeyError):
+            _ = pyfolder["key50.json"]
+
+        self.assertEqual(sorted(root for root, _, _ in os.walk(self.test_folders)), shards)
+
+        self.assertEqual(pyfolder.index("key7.json"), ["key7.json"])
+        self.assertEqual(sorted(pyfolder.iter_index("key1*", glob=True)),
+                         sorted(["key1.json"] + ["key1{}.json".format(i) for i in range(10)]))
+        self.assertEqual(len(list(pyfolder.iter_index("key*", glob=True, limit=5))), 5)
+
+        pyfolder.build_index()
+        self.assertEqual(pyfolder.index("key7.json"), ["key7.json"])
+
+        del pyfolder["key7.json"]
+        self.assertNotIn("key7.json", pyfolder)
+        self.assertEqual(len(pyfolder), 19)
+        self.assertEqual(pyfolder.index("key7.json"), [])
+
+    def test_pyfolder_instrumentation(self):
+        """
+        Instrumented folders measure their operations and the loads and saves of their interpreters
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders)
+        pyfolder["foo.json"] = {"a": 1}
+        self.assertIsNone(pyfolder.instrumentation)
+        self.assertIsNone(pyfolder.interpreters.instrumentation)
+
+        with self.assertRaises(Exception):
+            pyfolder.stats()
+
+        measures = []
+        contexts = []
+
+        class Span(object):
+            def __init__(self, operation):
+                self.operation = operation
+
+            def __enter__(self):
+                contexts.append(self.operation)
+
+            def __exit__(self, *args):
+                return False
+
+        pyfolder = PyFolder(self.test_folders, allow_override=True, instrument=True)
+        pyfolder.instrumentation.add_hook(measures.append)
+        pyfolder.instrumentation.add_context(Span)
+
+        pyfolder["foo/bar.txt"] = "hello"
+        self.assertEqual(pyfolder["foo.json"], {"a": 1})
+        self.assertEqual(pyfolder["foo/bar.txt"], "hello")
+        self.assertIn("foo.json", pyfolder)
+        self.assertEqual(sorted(iter(pyfolder)), ["foo", "foo.json"])
+        del pyfolder["foo/bar.txt"]
+
+        stats = pyfolder.stats()
+        operations = stats["operations"]
+
+        self.assertEqual(operations["getitem"]["count"], 2)
+        self.assertEqual(operations["load"]["count"], 2)
+        self.assertEqual(operations["load:JSONInterpreter"]["count"], 1)
+        self.assertEqual(operations["load:TextInterpreter"]["count"], 1)
+        self.assertEqual(operations["save:TextInterpreter"]["count"], 1)
+        self.assertEqual(operations["setitem"]["count"], 1)
+        self.assertEqual(operations["delitem"]["count"], 1)
+        self.assertEqual(operations["contains"]["count"], 1)
+        self.assertEqual(operations["listing"]["count"], 1)
+        self.assertLessEqual(operations["getitem"]["p50_ms"], operations["getitem"]["max_ms"])
+        self.assertEqual(sum(operations["getitem"]["histogram_us"].values()), 2)
+
+        self.assertEqual(stats["bytes_written"], len("hello"))
+        self.assertEqual(stats["bytes_read"], os.path.getsize(os.path.join(self.test_folders, "foo.json")) + 5)
+        self.assertEqual(stats["files_opened"], 3)
+
+        self.assertEqual([measure.entries for measure in measures if measure.operation == "listing"], [2])
+        self.assertEqual(len(measures), sum(operation["count"] for name, operation in operations.items()
+                                            if ":" not in name))
+        self.assertEqual(sorted(contexts), sorted(measure.operation for measure in measures))
+
+        pyfolder.instrumentation.reset()
+        self.assertEqual(pyfolder.stats()["operations"], {})
+
+        # Streams are measured too
+        size = os.path.getsize(os.path.join(self.test_folders, "foo.json"))
+        self.assertEqual(len(b"".join(pyfolder.read_chunks("foo.json", chunk_size=4))), size)
+
+        stats = pyfolder.stats()
+        self.assertEqual(stats["operations"]["open"]["count"], 1)
+        self.assertEqual(stats["operations"]["read_chunks"]["count"], 1)
+        self.assertEqual((stats["bytes_read"], stats["files_opened"]), (size, 1))
+
+        # Compressed files are counted once, by their size on disk
+        pyfolder = PyFolder(self.test_folders, allow_override=True, instrument=True, transparent_compression=True)
+        pyfolder["c.json.gz"] = {"values": list(range(100))}
+        self.assertEqual(pyfolder["c.json.gz"], {"values": list(range(100))})
+
+        size = os.path.getsize(os.path.join(self.test_folders, "c.json.gz"))
+        stats = pyfolder.stats()
+        self.assertEqual((stats["bytes_written"], stats["bytes_read"], stats["files_opened"]), (size, size, 2))
+        self.assertNotIn("write", stats["operations"])
+
+        # As the rest of storages and ways to access the files
+        modes = [{"storage": "pack"}] + ([{"use_dir_fd": True}] if dir_fd_supported() else [])
+
+        for kwargs in modes:
+            shutil.rmtree(self.test_folders)
+            pyfolder = PyFolder(self.test_folders, allow_override=True, instrument=True, **kwargs)
+            pyfolder["foo/bar.txt"] = "hello"
+            self.assertEqual(pyfolder["foo/bar.txt"], "hello")
+            self.assertEqual(list(pyfolder["foo"].values()), ["hello"])
+
+            stats = pyfolder.stats()
+            self.assertEqual((stats["bytes_written"], stats["bytes_read"], stats["files_opened"]), (5, 10, 3), kwargs)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+import errno
+import os
+import shutil
+import unittest
+from contextlib import ExitStack
+from unittest import mock
+
+from pyfolder import PyFolder
+from pyfolder.transfer import copy_file
+
+__author__ = 'Iván de Paz Centeno'
+
+
+class TestTransfer(unittest.TestCase):
+    """
+    Unitary tests for the copy, move and sync operations of PyFolder.
+    """
+    def setUp(self):
+        self.folder = "examples"
+        self.source = os.path.join(self.folder, "source")
+        self.destination = os.path.join(self.folder, "destination")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def create_source(self):
+        pyfolder = PyFolder(self.source, allow_override=True)
+        pyfolder["foo"] = b"bar"
+        pyfolder["foo2/foo3/foo4"] = b"bar4"
+
+        # Copies are raw: the formatting of the file is kept
+        with open(os.path.join(self.source, "foo5.json"), "w") as f:
+            f.write('{"a":1}')
+
+        return pyfolder
+
+    def test_copy_to(self):
+        """
+        PyFolder copies its files into another folder, skipping the unchanged ones
+        :return:
+        """
+        pyfolder = self.create_source()
+        destination = PyFolder(self.destination)
+
+        self.assertEqual(pyfolder.copy_to(destination), {"copied": 3, "skipped": 0, "deleted": 0})
+        self.assertEqual(destination["foo2/foo3/foo4"], b"bar4")
+        self.assertEqual(destination["foo5.json"], {"a": 1})
+
+        with open(os.path.join(self.destination, "foo5.json")) as f:
+            self.assertEqual(f.read(), '{"a":1}')
+
+        self.assertEqual(pyfolder.copy_to(destination), {"copied": 0, "skipped": 3, "deleted": 0})
+        self.assertEqual(pyfolder.copy_to(destination, skip="hash"), {"copied": 0, "skipped": 3, "deleted": 0})
+
+        # Changed files can't be replaced in a destination without the override flag
+        pyfolder["foo"] = b"changed"
+
+        with self.assertRaises(Exception):
+            pyfolder.copy_to(destination)
+
+        destination = PyFolder(self.destination, allow_override=True, cache_size=1024)
+        self.assertEqual(destination["foo"], b"bar")
+        self.assertEqual(pyfolder.copy_to(destination)["copied"], 1)
+        self.assertEqual(destination["foo"], b"changed")
+
+        # Plain paths are accepted as destination
+        self.assertEqual(pyfolder.copy_to(self.destination, skip=None)["copied"], 3)
+
+    def test_sync_to(self):
+        """
+        PyFolder mirrors its files into another folder
+        :return:
+        """
+        pyfolder = self.create_source()
+        destination = PyFolder(self.destination, allow_override=True)
+        destination["extra"] = b"extra"
+        destination["foo2/extra/extra"] = b"extra"
+
+        self.assertEqual(pyfolder.sync_to(destination), {"copied": 3, "skipped": 0, "deleted": 2})
+        self.assertEqual(sorted(destination), ["foo", "foo2", "foo5.json"])
+        self.assertEqual(list(destination["foo2"]), ["foo3"])
+
+        self.assertEqual(pyfolder.sync_to(destination), {"copied": 0, "skipped": 3, "deleted": 0})
+
+        # Elements of the destination are only deleted with its override flag
+        destination["extra"] = b"extra"
+
+        with self.assertRaises(Exception):
+            pyfolder.sync_to(PyFolder(self.destination))
+
+        self.assertIn("extra", destination)
+
+        # Folders of the destination are replaced by the files of the source, and vice versa
+        shutil.rmtree(os.path.join(self.destination, "foo2"))
+        os.remove(os.path.join(self.destination, "foo"))
+        destination["foo/foo7"] = b"bar7"
+        destination["foo2"] = b"bar2"
+
+        with self.assertRaises(Exception):
+            pyfolder.copy_to(PyFolder(self.destination))
+
+        self.assertEqual(pyfolder.sync_to(destination), {"copied": 2, "skipped": 1, "deleted": 1})
+        self.assertEqual(destination["foo"], b"bar")
+        self.assertEqual(destination["foo2/foo3/foo4"], b"bar4")
+
+    def test_move_to(self):
+        """
+        PyFolder moves its files into another folder
+        :return:
+        """
+        pyfolder = self.create_source()
+        destination = PyFolder(self.destination, allow_override=True)
+        destination["foo2/foo6"] = b"bar6"
+
+        with self.assertRaises(Exception):
+            PyFolder(self.source).move_to(destination)
+
+        summary = pyfolder.move_to(destination)
+        self.assertEqual(summary["copied"], 0)
+        self.assertEqual(list(pyfolder), [])
+        self.assertEqual(sorted(destination), ["foo", "foo2", "foo5.json"])
+        self.assertEqual(sorted(destination["foo2"]), ["foo3", "foo6"])
+        self.assertEqual(destination["foo2/foo3/foo4"], b"bar4")
+
+    def test_move_to_replaces_conflicting_kinds(self):
+        """
+        Files replace folders of the destination when moved, and vice versa
+        :return:
+        """
+        pyfolder = self.create_source()
+        destination = PyFolder(self.destination, allow_override=True)
+        destination["foo/foo7"] = b"bar7"
+        destination["foo2/foo3"] = b"bar3"
+
+        with self.assertRaises(Exception):
+            pyfolder.move_to(PyFolder(self.destination))
+
+        self.assertEqual(pyfolder["foo"], b"bar")
+
+        pyfolder.move_to(destination)
+        self.assertEqual(list(pyfolder), [])
+        self.assertEqual(destination["foo"], b"bar")
+        self.assertEqual(destination["foo2/foo3/foo4"], b"bar4")
+        self.assertEqual(destination["foo5.json"], {"a": 1})
+
+    def test_copy_file_fallback(self):
+        """
+        Files are copied in user space when the kernel can't copy them
+        :return:
+        """
+        os.makedirs(self.folder)
+        source = os.path.join(self.folder, "source.bin")
+        destination = os.path.join(self.folder, "destination.bin")
+        content = os.urandom(3 * 1024 * 1024 + 1)
+
+        with open(source, "wb") as f:
+            f.write(content)
+
+        def unsupported(*args, **kwargs):
+            raise OSError(errno.EXDEV, "Cross-device link")
+
+        for patched in [[], ["copy_file_range"], ["copy_file_range", "sendfile"]]:
+            with ExitStack() as stack:
+                for name in patched:
+                    if hasattr(os, name):
+                        stack.enter_context(mock.patch.object(os, name, unsupported))
+
+                copy_file(source, destination)
+
+            with open(destination, "rb") as f:
+                self.assertEqual(f.read(), content)
+
+            self.assertEqual(os.stat(source).st_mtime_ns, os.stat(destination).st_mtime_ns)
+
+
+if __name__ == '__main__':
+    unittest.main()
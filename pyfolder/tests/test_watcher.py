@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+import asyncio
+import errno
+import os
+import shutil
+import time
+import unittest
+from unittest import mock
+
+from pyfolder import PyFolder
+from pyfolder.watcher import inotify_available, PollingBackend
+
+__author__ = 'Iván de Paz Centeno'
+
+
+class TestWatcher(unittest.TestCase):
+    """
+    Unitary tests for the watchers of PyFolder.
+    """
+    def setUp(self):
+        self.folder = "examples"
+        self.test_folders = os.path.join(self.folder, "subdir")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    @staticmethod
+    def collect(watcher, expected, timeout=5):
+        events = []
+        deadline = time.monotonic() + timeout
+
+        while not all(event in events for event in expected) and time.monotonic() < deadline:
+            events.extend((event.kind, event.key, event.destination) for event in watcher.read(timeout=0.1))
+
+        return events
+
+    def check_backend(self, backend):
+        pyfolder = PyFolder(self.test_folders, allow_override=True, allow_remove_folders_with_content=True,
+                            cache_size=1024)
+        pyfolder["foo.json"] = {"a": 1}
+        pyfolder["foo2/foo3"] = b"bar"
+
+        with pyfolder.watch(backend=backend, interval=0.05, trust_cache=True) as watcher:
+            self.assertTrue(pyfolder.interpreters.cache.trusted)
+            self.assertEqual(pyfolder["foo.json"], {"a": 1})
+
+            # External changes
+            time.sleep(0.01)
+
+            with open(os.path.join(self.test_folders, "foo.json"), "w") as f:
+                f.write('{"a": 2, "b": 3}')
+
+            os.makedirs(os.path.join(self.test_folders, "foo4", "foo5"))
+
+            with open(os.path.join(self.test_folders, "foo4", "foo5", "foo6"), "wb") as f:
+                f.write(b"bar")
+
+            events = self.collect(watcher, [("modified", "foo.json", None), ("created", "foo4", None),
+                                            ("created", "foo4/foo5/foo6", None)])
+            self.assertIn(("modified", "foo.json", None), events)
+            self.assertIn(("created", "foo4", None), events)
+            self.assertIn(("created", "foo4/foo5/foo6", None), events)
+
+            # The cached content was invalidated
+            self.assertEqual(pyfolder["foo.json"], {"a": 2, "b": 3})
+
+            os.rename(os.path.join(self.test_folders, "foo2"), os.path.join(self.test_folders, "foo7"))
+            os.remove(os.path.join(self.test_folders, "foo4", "foo5", "foo6"))
+
+            events = self.collect(watcher, [("moved", "foo2", "foo7"), ("deleted", "foo4/foo5/foo6", None)])
+            self.assertIn(("moved", "foo2", "foo7"), events)
+            self.assertIn(("deleted", "foo4/foo5/foo6", None), events)
+
+            # Folders moved are still watched under their new name
+            with open(os.path.join(self.test_folders, "foo7", "foo3"), "wb") as f:
+                f.write(b"changed")
+
+            self.assertIn(("modified", "foo7/foo3", None), self.collect(watcher, [("modified", "foo7/foo3", None)]))
+
+        self.assertFalse(pyfolder.interpreters.cache.trusted)
+
+        # The iteration ends once the watcher is closed and its events are consumed
+        list(watcher)
+        self.assertEqual(watcher.read(timeout=0), [])
+
+    @unittest.skipUnless(inotify_available(), "inotify not available")
+    def test_watcher_inotify(self):
+        """
+        PyFolder reports the changes of its files through inotify
+        :return:
+        """
+        self.check_backend("inotify")
+
+    def test_watcher_polling(self):
+        """
+        PyFolder reports the changes of its files by polling
+        :return:
+        """
+        self.check_backend("poll")
+
+    def test_watcher_polling_diff(self):
+        """
+        Snapshots are compared, reporting the moves of folders once
+        :return:
+        """
+        old = {"a": (True, 1, 0, 0), "a/b": (False, 2, 3, 0), "c": (False, 3, 3, 0), "d": (False, 4, 3, 0)}
+        new = {"e": (True, 1, 0, 0), "e/b": (False, 2, 3, 0), "c": (False, 3, 4, 1), "f": (False, 5, 3, 0)}
+
+        events = [(event.kind, event.key, event.destination) for event in PollingBackend.diff(old, new)]
+        self.assertEqual(events, [("moved", "a", "e"), ("modified", "c", None), ("deleted", "d", None),
+                                  ("created", "f", None)])
+
+    def test_watcher_error(self):
+        """
+        Errors of the backend are raised to the consumers, and the cache is not trusted anymore
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders, allow_override=True, cache_size=1024)
+        cache = pyfolder.interpreters.cache
+
+        # Changes made before the watcher existed are not served stale
+        pyfolder["a.json"] = {"v": 1}
+        self.assertEqual(pyfolder["a.json"], {"v": 1})
+
+        with open(os.path.join(self.test_folders, "a.json"), "w") as f:
+            f.write('{"v": 2}')
+
+        with pyfolder.watch(backend="poll", interval=0.05, trust_cache=True):
+            self.assertEqual(pyfolder["a.json"], {"v": 2})
+
+        with pyfolder.watch(backend="poll", interval=0.05, trust_cache=True) as watcher:
+            # Closing one of the watchers keeps the cache trusted for the other
+            with pyfolder.watch(backend="poll", interval=0.05, trust_cache=True):
+                self.assertTrue(cache.trusted)
+
+            self.assertTrue(cache.trusted)
+
+        self.assertFalse(cache.trusted)
+
+        def fail(timeout):
+            raise OSError(errno.ENOSPC, "No space left on device")
+
+        watcher = pyfolder.watch(backend="poll", interval=0.05, trust_cache=True)
+
+        with mock.patch.object(watcher.backend, "poll", side_effect=fail):
+            watcher._thread.join(5)
+
+        self.assertTrue(watcher.closed)
+        self.assertFalse(cache.trusted)
+
+        with self.assertRaises(OSError):
+            watcher.read(timeout=1)
+
+        with self.assertRaises(OSError):
+            list(watcher)
+
+        watcher.close()
+
+    def test_watcher_async(self):
+        """
+        The changes can be iterated asynchronously
+        :return:
+        """
+        pyfolder = PyFolder(self.test_folders, allow_override=True)
+        loop = asyncio.new_event_loop()
+
+        async def scenario():
+            with pyfolder.watch(interval=0.05) as watcher:
+                await asyncio.sleep(0.01)
+                pyfolder["foo"] = b"bar"
+
+                async for event in watcher:
+                    if event.key == "foo":
+                        return event.kind
+
+        try:
+            self.assertEqual(loop.run_until_complete(asyncio.wait_for(scenario(), 5)), "created")
+        finally:
+            loop.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
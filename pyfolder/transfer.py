@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+import errno
+import hashlib
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from pyfolder import walker
+from pyfolder.parallel import imap_chunked
+
+__author__ = "Iván de Paz Centeno"
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Errors of copy_file_range() and sendfile() meaning that the kernel can't copy between these two files.
+_UNSUPPORTED_COPY_ERRORS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSOCK, errno.ETXTBSY}
+
+
+def _kernel_copy(source_fd, destination_fd, size):
+    # Only falls back when nothing was copied yet, so that the offsets of both files are still at the start.
+    for name in ("copy_file_range", "sendfile"):
+        function = getattr(os, name, None)
+
+        if function is None:
+            continue
+
+        copied = 0
+
+        try:
+            while copied < size:
+                if name == "copy_file_range":
+                    sent = os.copy_file_range(source_fd, destination_fd, size - copied)
+                else:
+                    sent = os.sendfile(destination_fd, source_fd, copied, min(size - copied, 1 << 30))
+
+                if sent == 0:
+                    # The source shrank while being copied
+                    break
+
+                copied += sent
+        except OSError as ex:
+            if copied > 0 or ex.errno not in _UNSUPPORTED_COPY_ERRORS:
+                raise
+
+            continue
+
+        return True
+
+    return False
+
+
+def copy_file(source, destination):
+    """
+    Copies the raw content of a file, without interpreting it. The bytes are copied by the kernel when possible
+    (copy_file_range(), which may share the blocks on filesystems supporting it, or sendfile()), without passing
+    through Python. The modification time is copied as well.
+    :param source: path of the file to copy.
+    :param destination: path of the copy.
+    """
+    with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+        size = os.fstat(source_file.fileno()).st_size
+
+        if size == 0 or not _kernel_copy(source_file.fileno(), destination_file.fileno(), size):
+            shutil.copyfileobj(source_file, destination_file, COPY_BUFFER_SIZE)
+
+    shutil.copystat(source, destination)
+
+
+def file_hash(uri):
+    """
+    :return: BLAKE2 digest of the content of a file.
+    """
+    digest = hashlib.blake2b()
+
+    with open(uri, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.digest()
+
+
+def is_unchanged(source, destination, skip):
+    """
+    Checks if a file was already copied.
+    :param skip: "mtime" to compare sizes and modification times, "hash" to compare sizes and contents, None to
+    always consider the file changed.
+    """
+    if skip is None:
+        return False
+
+    try:
+        destination_stat = os.stat(destination)
+    except FileNotFoundError:
+        return False
+
+    source_stat = os.stat(source)
+
+    if source_stat.st_size != destination_stat.st_size:
+        return False
+
+    if skip == "mtime":
+        return source_stat.st_mtime_ns == destination_stat.st_mtime_ns
+
+    if skip == "hash":
+        return file_hash(source) == file_hash(destination)
+
+    raise Exception("Unknown skip criterion \"{}\"".format(skip))
+
+
+def _check_override(destination, allow_override):
+    if not allow_override and os.path.lexists(destination):
+        raise Exception("File {} already exists and can't be overridden (flag not set)".format(destination))
+
+
+def _copy_task(task):
+    source, destination, skip, allow_override = task
+
+    if is_unchanged(source, destination, skip):
+        return "skipped"
+
+    _check_override(destination, allow_override)
+    copy_file(source, destination)
+    return "copied"
+
+
+def _run(function, tasks, max_workers, summary):
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for result in imap_chunked(function, tasks, executor, chunk_size=32, ordered=False):
+            summary[result] += 1
+
+    return summary
+
+
+def copy_tree(source_root, destination_root, skip="mtime", allow_override=True, delete=False, max_workers=None):
+    """
+    Copies the raw files of a tree into another one, in a pool of threads. Folders are created as they are found.
+    :param source_root: root of the tree to copy.
+    :param destination_root: root of the destination tree. Created if it doesn't exist.
+    :param skip: criterion to skip the files already copied. See is_unchanged().
+    :param allow_override: if not set, changed files that exist in the destination raise an exception, and so do the
+    elements to delete.
+    :param delete: remove the files and folders of the destination that don't exist in the source.
+    :param max_workers: maximum number of threads copying files.
+    :return: dict with the amount of files "copied", "skipped" and "deleted".
+    """
+    os.makedirs(destination_root, exist_ok=True)
+
+    def tasks():
+        # The walk is breadth-first: folders are created before their files are yielded.
+        for uri, entry in walker.walk(source_root, max_depth=sys.maxsize):
+            destination = os.path.join(destination_root, *uri.split("/"))
+
+            if entry.is_dir():
+                if os.path.isfile(destination) and not os.path.islink(destination):
+                    _check_override(destination, allow_override)
+                    os.remove(destination)
+
+                os.makedirs(destination, exist_ok=True)
+            else:
+                if os.path.isdir(destination) and not os.path.islink(destination):
+                    _check_override(destination, allow_override)
+                    shutil.rmtree(destination)
+
+                yield entry.path, destination, skip, allow_override
+
+    summary = _run(_copy_task, tasks(), max_workers, {"copied": 0, "skipped": 0, "deleted": 0})
+
+    if delete:
+        summary["deleted"] = _delete_extraneous(source_root, destination_root, allow_override)
+
+    return summary
+
+
+def _delete_extraneous(source_root, destination_root, allow_override):
+    deleted = 0
+
+    # Removed folders are skipped by the walk when their turn to be read comes.
+    for uri, entry in walker.walk(destination_root, max_depth=sys.maxsize):
+        if os.path.lexists(os.path.join(source_root, *uri.split("/"))):
+            continue
+
+        if not allow_override:
+            raise Exception("File {} can't be deleted (flag not set)".format(entry.path))
+
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path)
+        else:
+            os.remove(entry.path)
+
+        deleted += 1
+
+    return deleted
+
+
+def _move_task(task):
+    source, destination, _, allow_override = task
+    _check_override(destination, allow_override)
+    copy_file(source, destination)
+    os.remove(source)
+    return "copied"
+
+
+def move_tree(source_root, destination_root, allow_override=True, max_workers=None):
+    """
+    Moves the files of a tree into another one. The source root is kept, empty.
+    Within the same filesystem, each element is renamed: folders that don't exist in the destination are moved
+    entirely at once. Otherwise, the files are copied (in a pool of threads) and removed.
+    :param source_root: root of the tree to move.
+    :param destination_root: root of the destination tree. Created if it doesn't exist.
+    :param allow_override: if not set, files that exist in the destination raise an exception.
+    :param max_workers: maximum number of threads copying files across filesystems.
+    :return: dict with the amount of elements "moved" (renamed) and files "copied".
+    """
+    os.makedirs(destination_root, exist_ok=True)
+    summary = {"moved": 0, "copied": 0}
+    cross_device = []
+    merged_folders = []
+    pending = [(source_root, destination_root)]
+
+    while pending:
+        source_folder, destination_folder = pending.pop()
+
+        with os.scandir(source_folder) as iterator:
+            entries = list(iterator)
+
+        for entry in entries:
+            destination = os.path.join(destination_folder, entry.name)
+            is_dir = entry.is_dir(follow_symlinks=False)
+
+            if is_dir and os.path.isdir(destination):
+                # Both exist: their contents are merged
+                pending.append((entry.path, destination))
+                merged_folders.append(entry.path)
+                continue
+
+            _check_override(destination, allow_override)
+
+            if os.path.isdir(destination) and not os.path.islink(destination):
+                # A folder where the source has a file
+                shutil.rmtree(destination)
+            elif is_dir and os.path.lexists(destination):
+                # A file where the source has a folder
+                os.remove(destination)
+
+            try:
+                os.replace(entry.path, destination)
+                summary["moved"] += 1
+            except OSError as ex:
+                if ex.errno != errno.EXDEV:
+                    raise
+
+                cross_device.append((entry.path, destination, is_dir))
+
+    for source, destination, is_dir in cross_device:
+        if is_dir:
+            summary["copied"] += copy_tree(source, destination, skip=None, allow_override=allow_override,
+                                           max_workers=max_workers)["copied"]
+            shutil.rmtree(source)
+
+    files = [(source, destination, None, allow_override) for source, destination, is_dir in cross_device if not is_dir]
+    _run(_move_task, files, max_workers, summary)
+
+    # Deepest folders first
+    for folder in reversed(merged_folders):
+        try:
+            os.rmdir(folder)
+        except OSError:
+            pass
+
+    return summary
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+from collections.abc import KeysView, ValuesView, ItemsView
+
+__author__ = "Iván de Paz Centeno"
+
+_NOT_LOADED = object()
+
+
+class FolderKeysView(KeysView):
+    """
+    Lazy view of the names of a folder. The folder is listed on each iteration, and membership is checked directly
+    against the filesystem.
+    """
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, self._mapping.folder_root)
+
+
+class FolderValuesView(ValuesView):
+    """
+    Lazy view of the contents of a folder. The contents are loaded one by one, as they are consumed.
+    """
+    def __init__(self, mapping, iterate_items):
+        """
+        :param mapping: folder of the view.
+        :param iterate_items: function returning a generator of the (name, content) tuples of the folder.
+        """
+        super().__init__(mapping)
+        self._iterate_items = iterate_items
+
+    def __iter__(self):
+        for _, value in self._iterate_items():
+            yield value
+
+    def __contains__(self, value):
+        for content in self:
+            if content is value or content == value:
+                return True
+
+        return False
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, self._mapping.folder_root)
+
+
+class FolderItemsView(ItemsView):
+    """
+    Lazy view of the (name, content) tuples of a folder. The contents are loaded one by one, as they are consumed.
+    """
+    def __init__(self, mapping, iterate_items):
+        """
+        :param mapping: folder of the view.
+        :param iterate_items: function returning a generator of the (name, content) tuples of the folder.
+        """
+        super().__init__(mapping)
+        self._iterate_items = iterate_items
+
+    def __iter__(self):
+        for item in self._iterate_items():
+            yield item
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, self._mapping.folder_root)
+
+
+class LazyEntry(object):
+    """
+    Handle of a file or folder found while listing a folder. Its content is only loaded when its value is accessed
+    for the first time, and kept for the next accesses.
+    """
+    __slots__ = ("name", "kind", "_load", "_stat", "_stat_result", "_size", "_value")
+
+    def __init__(self, name, kind, load, stat=None, size=None):
+        """
+        :param name: name of the element.
+        :param kind: "file" or "folder".
+        :param load: function returning the content of the element.
+        :param stat: function returning the os.stat_result of the element, or None if it has no file of its own.
+        :param size: size of the element, if it is known without stat.
+        """
+        self.name = name
+        self.kind = kind
+        self._load = load
+        self._stat = stat
+        self._stat_result = None
+        self._size = size
+        self._value = _NOT_LOADED
+
+    def is_file(self):
+        return self.kind == "file"
+
+    def is_folder(self):
+        return self.kind == "folder"
+
+    def stat(self):
+        """
+        :return: os.stat_result of the element (retrieved once), or None if it is not stored as a file of its own.
+        """
+        if self._stat_result is None and self._stat is not None:
+            self._stat_result = self._stat()
+
+        return self._stat_result
+
+    @property
+    def size(self):
+        if self._size is None:
+            self._size = self.stat().st_size
+
+        return self._size
+
+    @property
+    def mtime(self):
+        stat = self.stat()
+        return stat.st_mtime if stat is not None else None
+
+    @property
+    def loaded(self):
+        return self._value is not _NOT_LOADED
+
+    @property
+    def value(self):
+        if self._value is _NOT_LOADED:
+            self._value = self._load()
+
+        return self._value
+
+    def __repr__(self):
+        return "<{} {} ({})>".format(type(self).__name__, self.name, self.kind)
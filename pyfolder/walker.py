@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+import fnmatch
+import functools
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+__author__ = "Iván de Paz Centeno"
+
+
+def name_matcher(pattern, glob=False, regex=False):
+    """
+    Builds a function that matches names against the given pattern.
+    :param pattern: name to match. Interpreted as a shell-style wildcard if glob is set, or as a regular expression
+    (string or compiled) if regex is set. Otherwise the name must be equal to the pattern.
+    :return: function that receives a name and returns True if it matches.
+    """
+    if glob and regex:
+        raise Exception("Only one of glob or regex can be set")
+
+    if regex:
+        return re.compile(pattern).fullmatch
+
+    if glob:
+        return re.compile(fnmatch.translate(pattern)).match
+
+    return pattern.__eq__
+
+
+def walk(folder_root, max_depth=200, workers=1, descriptors=None):
+    """
+    Walks a folder tree without recursion, yielding the entries as soon as their folder is read.
+    With more than one worker, the folders are read in parallel by a thread pool (the reads release the GIL); in that
+    case the order of the entries is not deterministic.
+
+    Folders that can't be read (for example, removed during the walk) are skipped.
+
+    :param folder_root: root of the tree to walk.
+    :param max_depth: maximum depth to walk, being 1 the root folder.
+    :param workers: number of threads reading folders.
+    :param descriptors: DirectoryDescriptors of the tree, to read the folders relative to the descriptor of its root
+    instead of by path. The paths of the entries are only their names, then.
+    :return: generator of tuples (relative URI, os.DirEntry).
+    """
+    if max_depth <= 0:
+        return
+
+    if descriptors is None:
+        read_folder = _read_folder
+    else:
+        read_folder = functools.partial(_read_folder_at, descriptors, descriptors.relative(folder_root))
+
+    if workers <= 1:
+        pending = deque([(folder_root, "", 1)])
+
+        while pending:
+            path, uri, depth = pending.popleft()
+            entries = read_folder(path, uri)
+
+            for result in _walk_entries(entries, uri, depth, max_depth, pending.append):
+                yield result
+
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {}
+
+    def submit(folder):
+        path, uri, depth = folder
+        futures[executor.submit(read_folder, path, uri)] = (uri, depth)
+
+    try:
+        submit((folder_root, "", 1))
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                uri, depth = futures.pop(future)
+
+                for result in _walk_entries(future.result(), uri, depth, max_depth, submit):
+                    yield result
+    finally:
+        # Reached on exhaustion, but also when the consumer stops early: pending reads are discarded.
+        for future in futures:
+            future.cancel()
+
+        executor.shutdown(wait=False)
+
+
+def iter_index(folder_root, pattern, max_depth=200, glob=False, regex=False, limit=None, workers=1, descriptors=None):
+    """
+    Searches files and folders by name, yielding the relative URIs of the matches as soon as they are found.
+    :param folder_root: root of the tree to search.
+    :param pattern: name to search. See name_matcher() for the glob and regex flags.
+    :param max_depth: maximum depth to search, being 1 the root folder.
+    :param limit: stop after this amount of matches. None for no limit.
+    :param workers: number of threads reading folders.
+    :param descriptors: see walk().
+    :return: generator of relative URIs.
+    """
+    if limit is not None and limit <= 0:
+        return
+
+    matches = name_matcher(pattern, glob=glob, regex=regex)
+    found = 0
+    walker = walk(folder_root, max_depth=max_depth, workers=workers, descriptors=descriptors)
+
+    try:
+        for uri, entry in walker:
+            if matches(entry.name):
+                yield uri
+                found += 1
+
+                if found == limit:
+                    break
+    finally:
+        walker.close()
+
+
+def _read_folder(path, uri):
+    try:
+        with os.scandir(path) as iterator:
+            return list(iterator)
+    except OSError:
+        return []
+
+
+def _read_folder_at(descriptors, root_relative, path, uri):
+    try:
+        with descriptors.scandir(os.path.join(root_relative, *uri.split("/"))) as iterator:
+            return list(iterator)
+    except OSError:
+        return []
+
+
+def _walk_entries(entries, uri, depth, max_depth, enqueue):
+    for entry in entries:
+        entry_uri = uri + "/" + entry.name if uri else entry.name
+
+        if depth < max_depth and entry.is_dir():
+            enqueue((entry.path, entry_uri, depth + 1))
+
+        yield entry_uri, entry
@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#MIT License
+#
+#Copyright (c) 2017 Iván de Paz Centeno
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+from collections import namedtuple
+
+from pyfolder import walker
+
+__author__ = "Iván de Paz Centeno"
+
+# A change in the watched tree.
+#   kind: "created", "modified", "deleted", "moved" or "overflow" (events were lost: everything may have changed).
+#   key: relative URI of the element ("/" separated). None for "overflow".
+#   is_folder: whether the element is a folder.
+#   destination: new relative URI of a moved element. None for the rest of kinds.
+Event = namedtuple("Event", ["kind", "key", "is_folder", "destination"])
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR | \
+             IN_DONT_FOLLOW
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        return None
+
+    return libc
+
+
+_libc = _load_libc()
+
+
+def inotify_available():
+    """
+    Checks if the inotify API of Linux can be used.
+    """
+    return _libc is not None
+
+
+def _join(uri, name):
+    return uri + "/" + name if uri else name
+
+
+class InotifyBackend(object):
+    """
+    Reports the changes of a tree through inotify. Every folder of the tree is watched, and folders created or moved
+    into the tree are watched as soon as they appear.
+    """
+
+    def __init__(self, folder_root):
+        self.folder_root = folder_root
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        self._folders = {}     # watch descriptor -> relative URI of the folder
+        self._watches = {}     # relative URI of the folder -> watch descriptor
+        self.__watch_tree("")
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def poll(self, timeout):
+        """
+        Waits for changes.
+        :param timeout: maximum time to wait, in seconds.
+        :return: list of events. Empty if nothing changed in the given time.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        return self.__parse(data)
+
+    def __watch(self, uri):
+        path = os.path.join(self.folder_root, *uri.split("/")) if uri else self.folder_root
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+
+        if wd < 0:
+            error = ctypes.get_errno()
+
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                # Removed before being watched
+                return False
+
+            raise OSError(error, "{}: {}".format(os.strerror(error), path))
+
+        self._folders[wd] = uri
+        self._watches[uri] = wd
+        return True
+
+    def __watch_tree(self, uri, events=None):
+        # Watches a folder and its subfolders. The elements found are reported as created if events is given, as they
+        # could have been created before the watch was in place.
+        if not self.__watch(uri):
+            return
+
+        path = os.path.join(self.folder_root, *uri.split("/")) if uri else self.folder_root
+
+        for entry_uri, entry in walker.walk(path, max_depth=sys.maxsize):
+            entry_uri = _join(uri, entry_uri)
+            is_folder = entry.is_dir(follow_symlinks=False)
+
+            if events is not None:
+                events.append(Event("created", entry_uri, is_folder, None))
+
+            if is_folder:
+                self.__watch(entry_uri)
+
+    def __forget_tree(self, uri):
+        prefix = uri + "/"
+
+        for folder in [folder for folder in self._watches if folder == uri or folder.startswith(prefix)]:
+            wd = self._watches.pop(folder)
+            self._folders.pop(wd, None)
+            _libc.inotify_rm_watch(self.fd, wd)
+
+    def __rename_tree(self, uri, destination):
+        prefix = uri + "/"
+
+        for folder in [folder for folder in self._watches if folder == uri or folder.startswith(prefix)]:
+            wd = self._watches.pop(folder)
+            new_folder = destination + folder[len(uri):]
+            self._watches[new_folder] = wd
+            self._folders[wd] = new_folder
+
+    def __parse(self, data):
+        events = []
+        moves = {}    # cookie -> (uri, is_folder) of the elements moved from a folder of the tree
+        position = 0
+
+        while position + EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, position)
+            name_start = position + EVENT_HEADER.size
+            name = os.fsdecode(data[name_start:name_start + length].rstrip(b"\0"))
+            position = name_start + length
+
+            if mask & IN_Q_OVERFLOW:
+                events.append(Event("overflow", None, True, None))
+                continue
+
+            if mask & IN_IGNORED:
+                folder = self._folders.pop(wd, None)
+
+                if folder is not None and self._watches.get(folder) == wd:
+                    del self._watches[folder]
+                continue
+
+            folder = self._folders.get(wd)
+
+            if folder is None or not name:
+                continue
+
+            uri = _join(folder, name)
+            is_folder = bool(mask & IN_ISDIR)
+
+            if mask & IN_CREATE:
+                events.append(Event("created", uri, is_folder, None))
+
+                if is_folder:
+                    self.__watch_tree(uri, events)
+            elif mask & (IN_MODIFY | IN_CLOSE_WRITE):
+                # Writes are reported as they happen (so the content cached in between is invalidated) and when the
+                # file is closed. Consecutive ones are reported once.
+                if not self.__coalesce(events, uri):
+                    events.append(Event("modified", uri, is_folder, None))
+            elif mask & IN_DELETE:
+                events.append(Event("deleted", uri, is_folder, None))
+            elif mask & IN_MOVED_FROM:
+                # Placeholder, resolved when its pair is found
+                moves[cookie] = (uri, is_folder, len(events))
+                events.append(None)
+            elif mask & IN_MOVED_TO:
+                origin = moves.pop(cookie, None)
+
+                if origin is None:
+                    # Moved into the tree
+                    events.append(Event("created", uri, is_folder, None))
+
+                    if is_folder:
+                        self.__watch_tree(uri, events)
+                else:
+                    events[origin[2]] = Event("moved", origin[0], is_folder, uri)
+
+                    if is_folder:
+                        self.__rename_tree(origin[0], uri)
+
+        # Moved out of the tree
+        for uri, is_folder, index in moves.values():
+            events[index] = Event("deleted", uri, is_folder, None)
+
+            if is_folder:
+                self.__forget_tree(uri)
+
+        return events
+
+    @staticmethod
+    def __coalesce(events, uri):
+        # Consecutive writes of the same file are reported once
+        return bool(events) and events[-1] is not None and events[-1][:2] == ("modified", uri)
+
+
+class PollingBackend(object):
+    """
+    Reports the changes of a tree by comparing snapshots of its metadata, taken periodically.
+    Moves are detected by the inode of the elements.
+    """
+
+    def __init__(self, folder_root):
+        self.folder_root = folder_root
+        self._snapshot = self.__take_snapshot()
+
+    def close(self):
+        pass
+
+    def poll(self, timeout):
+        """
+        Waits for the given time and compares the tree against the previous snapshot.
+        :return: list of events.
+        """
+        if timeout:
+            threading.Event().wait(timeout)
+
+        snapshot = self.__take_snapshot()
+        events = self.diff(self._snapshot, snapshot)
+        self._snapshot = snapshot
+        return events
+
+    def __take_snapshot(self):
+        snapshot = {}
+
+        for uri, entry in walker.walk(self.folder_root, max_depth=sys.maxsize):
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+
+            snapshot[uri] = (entry.is_dir(follow_symlinks=False), stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        return snapshot
+
+    @staticmethod
+    def diff(old, new):
+        """
+        Compares two snapshots.
+        :return: list of events, sorted by key.
+        """
+        events = []
+        removed = {}
+
+        for uri in sorted(old.keys() - new.keys()):
+            removed[old[uri][:2]] = uri
+
+        moves = {}
+
+        for uri in sorted(new.keys() - old.keys()):
+            origin = removed.pop(new[uri][:2], None)
+
+            if origin is None:
+                events.append(Event("created", uri, new[uri][0], None))
+            else:
+                moves[origin] = uri
+
+        for origin in removed.values():
+            events.append(Event("deleted", origin, old[origin][0], None))
+
+        for origin, destination in moves.items():
+            # The elements of a moved folder are not reported on their own
+            origin_folder, _, origin_name = origin.rpartition("/")
+            destination_folder, _, destination_name = destination.rpartition("/")
+
+            if origin_name != destination_name or moves.get(origin_folder) != destination_folder or not origin_folder:
+                events.append(Event("moved", origin, new[destination][0], destination))
+
+        for uri in sorted(old.keys() & new.keys()):
+            if old[uri][:2] != new[uri][:2]:
+                # Replaced by another element
+                events.append(Event("deleted", uri, old[uri][0], None))
+                events.append(Event("created", uri, new[uri][0], None))
+            elif not new[uri][0] and old[uri][2:] != new[uri][2:]:
+                events.append(Event("modified", uri, False, None))
+
+        events.sort(key=lambda event: event.key)
+        return events
+
+
+class Watcher(object):
+    """
+    Watches the changes of a folder tree in a background thread.
+
+    The events can be consumed with a blocking iterator:
+
+        for event in watcher:
+            print(event.kind, event.key)
+
+    or asynchronously:
+
+        async for event in watcher:
+            print(event.kind, event.key)
+
+    Events are also handed to the on_event callback as soon as they are read, from the background thread.
+    """
+
+    def __init__(self, folder_root, backend="auto", interval=1.0, on_event=None, on_start=None, on_close=None,
+                 translate=None):
+        """
+        :param folder_root: root of the tree to watch.
+        :param backend: "inotify", "poll" or "auto" (inotify if available, polling otherwise).
+        :param interval: seconds between snapshots when polling. Also the maximum time for close() to take effect.
+        :param on_event: function called with each event, from the background thread.
+        :param on_start: function called once the changes are being watched, before any event is read.
+        :param on_close: function called once the watcher stops, either closed or due to an error. Only called if
+        on_start was.
+        :param translate: function called with each event after on_event, returning the event to hand to the
+        consumers (or None to drop it).
+        """
+        if backend == "auto":
+            backend = "inotify" if inotify_available() else "poll"
+
+        if backend == "inotify":
+            if not inotify_available():
+                raise Exception("inotify is not available on this platform")
+
+            self.backend = InotifyBackend(folder_root)
+        elif backend == "poll":
+            self.backend = PollingBackend(folder_root)
+        else:
+            raise Exception("Unknown watcher backend \"{}\"".format(backend))
+
+        self.folder_root = folder_root
+        self.interval = interval
+        self.on_event = on_event
+        self.on_close = on_close
+        self.translate = translate
+
+        self._events = queue.Queue()
+        self._error = None
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self.__run, name="pyfolder-watcher", daemon=True)
+
+        if on_start is not None:
+            try:
+                on_start()
+            except Exception:
+                self.backend.close()
+                raise
+
+        self._thread.start()
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+    def __run(self):
+        try:
+            while not self._closed.is_set():
+                for event in self.backend.poll(self.interval):
+                    if self.on_event is not None:
+                        self.on_event(event)
+
+                    if self.translate is not None:
+                        event = self.translate(event)
+
+                    if event is not None:
+                        self._events.put(event)
+        except Exception as ex:
+            # Raised to the consumers once the events read before are consumed
+            self._error = ex
+        finally:
+            self._closed.set()
+
+            try:
+                self.backend.close()
+            finally:
+                if self.on_close is not None:
+                    self.on_close()
+
+                self._events.put(None)
+
+    def close(self):
+        """
+        Stops watching. Pending events can still be read.
+        """
+        if self._closed.is_set():
+            return
+
+        self._closed.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def read(self, timeout=None):
+        """
+        Retrieves the events available, waiting for the first one.
+        :param timeout: maximum time to wait for the first event, in seconds. None to wait indefinitely.
+        :return: list of events. Empty if the timeout expired or the watcher is closed.
+        If the watcher stopped due to an error, it is raised once the events read before are consumed.
+        """
+        events = []
+
+        try:
+            event = self._events.get(timeout=timeout)
+        except queue.Empty:
+            return events
+
+        while event is not None:
+            events.append(event)
+
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                return events
+
+        # The end mark is kept for the rest of readers
+        self._events.put(None)
+
+        if not events and self._error is not None:
+            raise self._error
+
+        return events
+
+    def __iter__(self):
+        while True:
+            events = self.read()
+
+            if not events:
+                return
+
+            for event in events:
+                yield event
+
+    async def __aiter__(self):
+        loop = asyncio.get_event_loop()
+
+        while True:
+            # Waits in an executor for a while, so the loop notices the cancellation of the iteration
+            events = await loop.run_in_executor(None, self.read, self.interval)
+
+            for event in events:
+                yield event
+
+            if not events and self.closed:
+                return
@@ -34,8 +34,8 @@ def readme():
         return f.read()
 
 
-if sys.version_info < (3, 4, 1):
-    sys.exit('Python < 3.4.1 is not supported!')
+if sys.version_info < (3, 6):
+    sys.exit('Python < 3.6 is not supported!')
 
 
 setup(name='pyfolder',
@@ -49,14 +49,15 @@ setup(name='pyfolder',
       packages=setuptools.find_packages(),
       install_requires=[
       ],
+      extras_require={
+          'numpy': ['numpy'],
+      },
       classifiers=[
           'Environment :: Console',
           'Intended Audience :: Developers',
           'Intended Audience :: Education',
           'Intended Audience :: Science/Research',
           'Natural Language :: English',
-          'Programming Language :: Python :: 3.4',
-          'Programming Language :: Python :: 3.5',
           'Programming Language :: Python :: 3.6',
           'Programming Language :: Python :: 3.7',
       ],